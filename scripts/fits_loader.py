@@ -0,0 +1,116 @@
+# Fast loader for multi-HDU FITS spectrum files
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from astropy.io import fits
+
+# Each spectrum is stored in its own binary table HDU. The PrimaryHDU
+# holds no spectral data, and the final HDU is skipped (as it always has
+# been by plot_from_fits.py).
+COL_NAMES = ['auto0_real', 'auto1_real', 'cross_real', 'cross_imag']
+
+
+def _hdu_layout(F, col_names):
+    """
+    Walks the HDU headers once and records where each spectrum lives
+    in the file, without ever constructing a FITS_rec.
+
+    Inputs:
+        - F: astropy HDUList opened with memmap=True
+        - col_names (list of str): columns to locate
+    Returns:
+        - offsets: array of byte offsets of each HDU's data block
+        - rec_dtype: big-endian record dtype shared by all HDUs
+        - nrows (int): number of table rows per HDU
+    """
+    offsets = []
+    rec_dtype, nrows = None, None
+    for i in range(1, len(F)-1): # ignore PrimaryHDU
+        hdu = F[i]
+        if rec_dtype is None:
+            rec_dtype = hdu.columns.dtype.newbyteorder('>') # FITS is big-endian
+            nrows = hdu.header['NAXIS2']
+            assert rec_dtype.itemsize == hdu.header['NAXIS1'], 'Unsupported (padded) table rows.'
+            for col in col_names:
+                assert col in rec_dtype.names, 'Column {0} not in file. Got {1}.'.format(col, rec_dtype.names)
+        else:
+            assert hdu.columns.dtype.newbyteorder('>') == rec_dtype and hdu.header['NAXIS2'] == nrows, \
+                'HDU {0} has a different table layout than HDU 1.'.format(i)
+        offsets.append(hdu.fileinfo()['datLoc'])
+    return np.array(offsets, dtype='int64'), rec_dtype, nrows
+
+
+def _fill(mm, out, offsets, rec_dtype, nrows, col_name, start, stop):
+    """
+    Copies the spectra of HDUs [start, stop) into out[start:stop].
+    When the HDUs are equally spaced in the file (the usual case) the
+    whole range is copied through a single strided view of the memmap;
+    otherwise one view per HDU is used.
+
+    Inputs:
+        - mm: uint8 memmap of the whole file
+        - out: preallocated output array of shape (nspec, nchan)
+        - offsets, rec_dtype, nrows: output of _hdu_layout
+        - col_name (str): column to copy
+        - start, stop (int): range of output rows to fill
+    """
+    col_dtype, col_offset = rec_dtype.fields[col_name][:2]
+    base = col_dtype.base
+    nsub = int(np.prod(col_dtype.shape)) # >1 for vector (e.g. '2048D') columns
+    strides = (rec_dtype.itemsize, base.itemsize)
+    steps = np.diff(offsets[start:stop])
+    if stop - start > 1 and np.all(steps == steps[0]):
+        view = np.ndarray(shape=(stop-start, nrows, nsub), dtype=base, buffer=mm,
+                          offset=offsets[start]+col_offset, strides=(steps[0],)+strides)
+        out[start:stop].reshape(view.shape)[...] = view
+        return
+    for i in range(start, stop):
+        view = np.ndarray(shape=(nrows, nsub), dtype=base, buffer=mm,
+                          offset=offsets[i]+col_offset, strides=strides)
+        out[i].reshape(view.shape)[...] = view
+
+
+def load_fits_spectra(filename, col_names='auto0_real', nthreads=1):
+    """
+    Loads the spectra stored in a multi-HDU FITS file. The file is 
+    memory-mapped and only the requested columns are read; the output
+    is preallocated and filled in bulk rather than HDU by HDU.
+
+    Inputs:
+        - filename (str): File path+name. Must be a FITS file (.fits)
+        - col_names (str or list of str): auto0_real, auto1_real, 
+          cross_real, and/or cross_imag
+        - nthreads (int): number of threads used to copy contiguous
+          ranges of HDUs in parallel. Default is 1 (serial).
+    Returns:
+        - data: array of shape (nspec, nchan), the same layout as 
+          prepare_data. If a list of columns is given, a dict mapping
+          each column name to its array is returned instead.
+    """
+    single = isinstance(col_names, str)
+    if single:
+        col_names = [col_names]
+    with fits.open(filename, memmap=True, lazy_load_hdus=True) as F:
+        offsets, rec_dtype, nrows = _hdu_layout(F, col_names)
+    assert offsets.size > 0, 'No spectra found in file {0}.'.format(filename)
+    mm = np.memmap(filename, dtype='uint8', mode='r')
+    nspec = offsets.size
+    result = {}
+    for col in col_names:
+        col_dtype = rec_dtype.fields[col][0]
+        nchan = nrows * int(np.prod(col_dtype.shape))
+        out = np.empty((nspec, nchan), dtype=col_dtype.base.newbyteorder('='))
+        bounds = np.linspace(0, nspec, max(1, min(nthreads, nspec)) + 1).astype(int)
+        if bounds.size == 2:
+            _fill(mm, out, offsets, rec_dtype, nrows, col, 0, nspec)
+        else:
+            with ThreadPoolExecutor(max_workers=bounds.size-1) as pool:
+                jobs = [pool.submit(_fill, mm, out, offsets, rec_dtype, nrows, col, start, stop)
+                        for start, stop in zip(bounds[:-1], bounds[1:])]
+                for job in jobs:
+                    job.result()
+        result[col] = out
+    del mm
+    if single:
+        return result[col_names[0]]
+    return result
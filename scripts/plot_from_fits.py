@@ -1,20 +1,20 @@
-import numpy as np
 import matplotlib.pyplot as plt
 import argparse
-from astropy.io import fits
+from fits_loader import load_fits_spectra
 
 
 parser = argparse.ArgumentParser(description='Plot power matrix.')
 
 parser.add_argument('filename', type=str,  help='Fits file name')
 parser.add_argument('col_name', type=str, help='auto0_real, auto1_real, cross_real, or cross_imag')
+parser.add_argument('--nthreads', type=int, default=1, help='Number of threads used to load the file')
 
 args = parser.parse_args()
 FILENAME = args.filename
 COL_NAME = args.col_name
+NTHREADS = args.nthreads
 
-F = fits.open(FILENAME)
-data = np.array([F[nspec].data[COL_NAME] for i in range(1, len(F)-1)]) # ignore PrimaryHDU
+data = load_fits_spectra(FILENAME, COL_NAME, nthreads=NTHREADS) # shape (nspec, nchan), PrimaryHDU ignored
 
 plt.figure()
 plt.imshow(data, aspect='auto', interpolation='nearest', origin='lower')
@@ -29,4 +29,21 @@ def prepare_data(filename):
     nspec = int(y.size/total_chans)
     data =  y.reshape([nspec, total_chans]) # reshape into [nspec, 2060]
     data = data[:, info_chans:] # ignore info_chans
-    return data
\ No newline at end of file
+    return data
+
+def memmap_data(filename):
+    """
+    Memory-mapped counterpart of prepare_data. Nothing is read from
+    disk until the returned array is sliced, so this is suitable for
+    files too large to fit in memory.
+    Inputs:
+        - filename (str): File path+name. Must be binary data file (.dat)
+    Returns:
+        - data: read-only view of shape (nspec, 2048) into the file
+    """
+    y = np.memmap(filename, dtype='uint16', mode='r', offset=header)
+    assert (y.size/total_chans).is_integer(), 'Non-integer number of spectra in file. Got {0}'.format(y.size/total_chans)+'spectra.'
+    nspec = int(y.size/total_chans)
+    data = y.reshape([nspec, total_chans]) # reshape into [nspec, 2060]
+    data = data[:, info_chans:] # ignore info_chans
+    return data
@@ -0,0 +1,158 @@
+# Multi-resolution (min/mean/max) decimation pyramid of a data file
+
+import numpy as np
+import os
+import json
+from prepare import memmap_data
+
+# Each level of the pyramid bins the time axis of the level below it by
+# FACTOR. Levels are added until the coarsest one has at most MAX_COLS
+# spectra, so that it can always be plotted in one go. Level 0 is the
+# raw data file itself and is never copied.
+FACTOR = 4
+MAX_COLS = 2048
+STATS = ['min', 'mean', 'max']
+
+
+def _pyramid_dir(file_path):
+    return file_path + '.pyramid'
+
+
+def build_pyramid(file_path, factor=FACTOR, max_cols=MAX_COLS, block_spec=2**13):
+    """
+    Builds the decimation pyramid of a data file in a single streaming
+    pass and stores it next to the file (in <file_path>.pyramid/).
+    Every level is written to a .npy file per statistic, so the pyramid
+    can later be memory-mapped without being read.
+
+    Inputs:
+        - file_path (str): Data file path. Must be binary data file (.dat)
+        - factor (int): time decimation factor between levels
+        - max_cols (int): maximum number of spectra in the coarsest level
+        - block_spec (int): number of raw spectra read per block
+    Returns:
+        - path of the pyramid directory
+    """
+    data = memmap_data(file_path)
+    nspec, nchans = data.shape
+    nlevels = 0
+    while nspec // factor**nlevels > max_cols:
+        nlevels += 1
+    out_dir = _pyramid_dir(file_path)
+    os.makedirs(out_dir, exist_ok=True)
+    meta_file = os.path.join(out_dir, 'meta.json')
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    levels = {}
+    for k in range(1, nlevels+1):
+        shape = (nspec // factor**k, nchans)
+        levels[k] = {stat: np.lib.format.open_memmap(os.path.join(out_dir, 'level{0}_{1}.npy'.format(k, stat)),
+                                                     mode='w+', dtype='float32', shape=shape)
+                     for stat in STATS}
+
+    # Rows that do not yet fill a complete bin are carried over to the
+    # next block, so memory use is set by block_spec alone.
+    carry = {k: None for k in levels}
+    written = {k: 0 for k in levels}
+    for start in range(0, nspec, block_spec):
+        raw = np.asarray(data[start:start+block_spec], dtype='float32')
+        lo, mean, hi = raw, raw, raw
+        for k in range(1, nlevels+1):
+            if carry[k] is not None:
+                lo = np.concatenate([carry[k][0], lo])
+                mean = np.concatenate([carry[k][1], mean])
+                hi = np.concatenate([carry[k][2], hi])
+            n = lo.shape[0] // factor
+            carry[k] = (lo[n*factor:], mean[n*factor:], hi[n*factor:])
+            if n == 0:
+                break
+            lo = lo[:n*factor].reshape(n, factor, nchans).min(axis=1)
+            mean = mean[:n*factor].reshape(n, factor, nchans).mean(axis=1)
+            hi = hi[:n*factor].reshape(n, factor, nchans).max(axis=1)
+            i0 = written[k]
+            levels[k]['min'][i0:i0+n] = lo
+            levels[k]['mean'][i0:i0+n] = mean
+            levels[k]['max'][i0:i0+n] = hi
+            written[k] += n
+
+    for k in levels:
+        for stat in STATS:
+            levels[k][stat].flush()
+    st = os.stat(file_path)
+    meta = {'nspec': nspec, 'nchans': nchans, 'factor': factor, 'nlevels': nlevels,
+            'src_size': st.st_size, 'src_mtime': st.st_mtime}
+    # meta is written last, so an interrupted build is never mistaken for a complete one
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f)
+    return out_dir
+
+
+class Pyramid:
+    def __init__(self, file_path, factor=FACTOR, max_cols=MAX_COLS, rebuild=False):
+        """
+        Opens (building it first if needed) the decimation pyramid of
+        a data file. All levels are memory-mapped, so opening a pyramid
+        takes the same time regardless of the length of the file.
+
+        Inputs:
+            - file_path (str): Data file path. Must be binary data file (.dat)
+            - factor (int): time decimation factor between levels
+            - max_cols (int): maximum number of spectra in the coarsest level
+            - rebuild (bool): force the pyramid to be rebuilt
+        """
+        out_dir = _pyramid_dir(file_path)
+        meta_file = os.path.join(out_dir, 'meta.json')
+        meta = None
+        if os.path.exists(meta_file) and not rebuild:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            st = os.stat(file_path)
+            if (meta['src_size'], meta['src_mtime'], meta['factor']) != (st.st_size, st.st_mtime, factor):
+                meta = None # stale
+        if meta is None:
+            build_pyramid(file_path, factor, max_cols)
+            with open(meta_file) as f:
+                meta = json.load(f)
+        self.nspec = meta['nspec']
+        self.nchans = meta['nchans']
+        self.factor = meta['factor']
+        self.nlevels = meta['nlevels']
+        self.max_cols = max_cols
+        self.raw = memmap_data(file_path)
+        self.levels = [None] + [{stat: np.load(os.path.join(out_dir, 'level{0}_{1}.npy'.format(k, stat)), mmap_mode='r')
+                                 for stat in STATS} for k in range(1, self.nlevels+1)]
+
+    def choose_level(self, t0, t1):
+        """
+        Returns the finest level at which the span [t0, t1) of raw
+        spectra holds at most max_cols columns.
+        """
+        span = max(1, t1 - t0)
+        k = 0
+        while k < self.nlevels and span // self.factor**k > self.max_cols:
+            k += 1
+        return k
+
+    def tile(self, t0, t1, stat='max'):
+        """
+        Loads only the visible part of the matching pyramid level.
+
+        Inputs:
+            - t0, t1 (float): visible range, in raw spectrum indices
+            - stat (str): min, mean, or max. Ignored at level 0.
+        Returns:
+            - data: array of shape (ncols, nchans) with ncols <= ~max_cols
+            - extent: (start, stop) of the tile in raw spectrum indices
+            - level (int): pyramid level the tile was taken from
+        """
+        t0 = int(np.clip(np.floor(t0), 0, self.nspec))
+        t1 = int(np.clip(np.ceil(t1), t0, self.nspec))
+        k = self.choose_level(t0, t1)
+        scale = self.factor**k
+        i0, i1 = t0 // scale, -(-t1 // scale)
+        if k == 0:
+            data = np.asarray(self.raw[i0:i1], dtype='float32')
+        else:
+            data = np.asarray(self.levels[k][stat][i0:i1])
+        return data, (i0*scale, i0*scale + data.shape[0]*scale), k
@@ -4,28 +4,52 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import argparse
-from prepare import prepare_data
+from pyramid import Pyramid
 
 parser = argparse.ArgumentParser(description='Generate waterfall plot of data within file.')
 parser.add_argument('file_path', type=str,  help='Data file path')
 parser.add_argument('fmin', type=float, help='Minimum frequency of band in [MHz]')
 parser.add_argument('fmax', type=float, help='Maximum frequency of band in [MHz]')
+parser.add_argument('--stat', type=str, default='max', help='Statistic shown when zoomed out: min, mean, or max')
+parser.add_argument('--rebuild', action='store_true', help='Rebuild the decimation pyramid of the file')
 
 args = parser.parse_args()
 FILE_PATH = args.file_path
 FILENAME = os.path.split(FILE_PATH)[-1] # grab file name from file path
 FMIN = args.fmin
 FMAX = args.fmax
+STAT = args.stat
 
-data = prepare_data(FILE_PATH)
-NSPEC, NCHANS = data.shape
+# Only the part of the file in view is ever loaded, from the pyramid
+# level matching the current zoom (see pyramid.py).
+pyr = Pyramid(FILE_PATH, rebuild=args.rebuild)
+NSPEC, NCHANS = pyr.nspec, pyr.nchans
 
 fig, ax = plt.subplots(constrained_layout=True)
-im = ax.imshow(data.T, aspect='auto', origin='lower', extent=[0, NSPEC, FMIN, FMAX])
+tile, (t0, t1), level = pyr.tile(0, NSPEC, STAT)
+im = ax.imshow(tile.T, aspect='auto', origin='lower', extent=[t0, t1, FMIN, FMAX])
 cbar = fig.colorbar(im, pad=0.01)
 cbar.set_label('Power', rotation=270, labelpad=20)
 im.set_clim(0, 5000)
 ax.set_xlabel('Time [ms]')
 ax.set_ylabel('Frequency [MHz]')
-ax.set_title(FILENAME)
+ax.set_title('{0} (level {1})'.format(FILENAME, level))
+ax.set_xlim(0, NSPEC)
+
+
+def update_tile(ax):
+    """
+    Reloads the visible tile whenever the x-axis is zoomed or panned.
+    """
+    xmin, xmax = ax.get_xlim()
+    tile, (t0, t1), level = pyr.tile(xmin, xmax, STAT)
+    if tile.shape[0] == 0:
+        return
+    im.set_data(tile.T)
+    im.set_extent([t0, t1, FMIN, FMAX])
+    ax.set_title('{0} (level {1})'.format(FILENAME, level))
+    ax.set_xlim(xmin, xmax, emit=False) # set_extent may reset the view limits
+
+
+ax.callbacks.connect('xlim_changed', update_tile)
 plt.show()
@@ -0,0 +1,280 @@
+############################################
+# Injection-recovery completeness campaign #
+############################################
+
+import numpy as np
+import argparse
+import json
+import os
+import time
+import multiprocessing as mp
+from simfrb import SimFRB
+from dedisp_plan import ENGINES
+from boxcar import boxcar_search, geometric_widths
+from candidates import CandidateClusterer
+from rfi import MAD_TO_STD
+
+# Bursts are drawn over a (DM, width, fluence) grid of bins, injected
+# into noise (or into blocks of a recorded file), dedispersed and
+# searched exactly as the pipeline does (FDMT engine, boxcar search,
+# candidate clustering). Injections are processed in chunks by a pool
+# of worker processes; every finished chunk is saved to its own file,
+# and the draws of a chunk only depend on (seed, chunk index), so an
+# interrupted campaign resumes where it stopped with identical results.
+#
+# Fluence is in units of (noise sigma of one channel) x seconds: a burst
+# of fluence F and width w has a per-channel Gaussian amplitude
+# F / (w sqrt(2 pi)). Its ideal SNR, summed over the band with a
+# matched filter, is amp sqrt(nfreqs) sqrt(sqrt(pi) w / t_samp).
+#
+# The search stages come from src/fdmt, which must be importable, e.g.
+#   PYTHONPATH=../src/fdmt python campaign.py out_dir ...
+
+# Arguments of Campaign.run saved with the settings: chunk i holds
+# injections chunk*i ... and the last chunk is cut at ninject, so both
+# must stay the same when resuming
+RUN_KEYS = ('ninject', 'chunk')
+
+RESULT_DTYPE = np.dtype([('bin', 'i4'), ('DM', 'f8'), ('width', 'f8'), ('fluence', 'f8'), ('t0', 'f8'),
+                         ('expected', 'f4'), ('snr', 'f4'), ('found', '?'), ('DM_found', 'f4'), ('width_found', 'f4')])
+
+
+class Campaign:
+    def __init__(self, out_dir, DM_edges, width_edges, fluence_edges, ntimes=4096, nfreqs=256, f_min=1150e6,
+                 f_max=1650e6, t_samp=1e-3, max_DM=None, engine='homebrew', threshold=7., max_width=64,
+                 background=None, seed=0):
+        """
+        Inputs:
+            - out_dir (str): directory of the chunk files and campaign settings
+            - DM_edges (array)|[pc*cm^-3]: edges of the DM bins
+            - width_edges (array)|[s]: edges of the width bins (drawn log-uniform)
+            - fluence_edges (array)|[sigma*s]: edges of the fluence bins (drawn log-uniform)
+            - ntimes, nfreqs (int): block shape searched per injection
+            - f_min, f_max (float)|[Hz]: band
+            - t_samp (float)|[s]: sampling time
+            - max_DM (float): DM range searched. Default is the last DM edge.
+            - engine (str): dedispersion engine (see dedisp_plan.ENGINES)
+            - threshold (float): detection threshold [sigma]
+            - max_width (int): largest boxcar searched [samples]
+            - background (str): optional recorder .dat file whose blocks
+              (binned to nfreqs channels and normalized per channel)
+              replace the simulated noise; its sampling time and band
+              should match t_samp and f_min - f_max
+            - seed (int): campaign seed
+        """
+        self.out_dir = out_dir
+        self.settings = dict(DM_edges=list(map(float, DM_edges)), width_edges=list(map(float, width_edges)),
+                             fluence_edges=list(map(float, fluence_edges)), ntimes=ntimes, nfreqs=nfreqs,
+                             f_min=f_min, f_max=f_max, t_samp=t_samp,
+                             max_DM=float(max_DM if max_DM is not None else DM_edges[-1]), engine=engine,
+                             threshold=threshold, max_width=max_width, background=background, seed=seed)
+        os.makedirs(out_dir, exist_ok=True)
+        self._path = os.path.join(out_dir, 'campaign.json')
+        if os.path.exists(self._path): # resuming: the settings must not change
+            with open(self._path) as f:
+                saved = json.load(f)
+            run = {k: saved.pop(k) for k in RUN_KEYS if k in saved}
+            assert saved == self.settings, 'Campaign settings differ from those saved in {0}.'.format(self._path)
+            self.settings.update(run)
+        else:
+            self._save_settings()
+        self.shape = (len(DM_edges) - 1, len(width_edges) - 1, len(fluence_edges) - 1)
+
+    def _save_settings(self):
+        with open(self._path, 'w') as f:
+            json.dump(self.settings, f, indent=1)
+
+    def _chunk_path(self, i):
+        return os.path.join(self.out_dir, 'chunk_{0:06d}.npy'.format(i))
+
+    def run(self, ninject, chunk=256, nproc=None):
+        """
+        Runs (or resumes) the campaign until ninject injections are done.
+
+        Inputs:
+            - ninject (int): total number of injections, spread evenly
+              over the grid bins
+            - chunk (int): injections per chunk file
+            - nproc (int): number of worker processes. Default is the
+              number of CPUs.
+            ninject and chunk are saved with the settings on the first
+            run and must be the same when resuming.
+        """
+        for k, v in zip(RUN_KEYS, (ninject, chunk)):
+            saved = self.settings.setdefault(k, v)
+            assert saved == v, 'Campaign {0}={1} differs from {0}={2} saved in {3}.'.format(k, v, saved, self._path)
+        self._save_settings()
+        nchunks = -(-ninject // chunk)
+        todo = [(i, chunk*i, min(chunk, ninject - chunk*i)) for i in range(nchunks) if not os.path.exists(self._chunk_path(i))]
+        print('{0} of {1} chunks already done.'.format(nchunks - len(todo), nchunks))
+        if not todo:
+            return
+        start = time.time()
+        done = 0
+        with mp.Pool(nproc, initializer=_init_worker, initargs=(self.settings,)) as pool:
+            for i, res in pool.imap_unordered(_run_chunk, todo):
+                tmp = self._chunk_path(i) + '.tmp.npy'
+                np.save(tmp, res)
+                os.replace(tmp, self._chunk_path(i)) # a chunk file is never half written
+                done += res.size
+                rate = done / (time.time() - start)
+                print('chunk {0}: {1} injections, {2:.1f} injections/s'.format(i, res.size, rate))
+
+    def results(self):
+        """
+        Returns all finished injections (RESULT_DTYPE).
+        """
+        files = sorted(f for f in os.listdir(self.out_dir) if f.startswith('chunk_') and not f.endswith('.tmp.npy'))
+        if not files:
+            return np.zeros(0, dtype=RESULT_DTYPE)
+        return np.concatenate([np.load(os.path.join(self.out_dir, f)) for f in files])
+
+    def completeness(self):
+        """
+        Aggregates the finished injections per (DM, width, fluence) bin.
+
+        Returns:
+            - n: number of injections per bin
+            - fraction: recovered fraction per bin
+            - snr_ratio: median measured/ideal SNR of recovered bursts per bin
+        """
+        res = self.results()
+        nbins = int(np.prod(self.shape))
+        n = np.bincount(res['bin'], minlength=nbins)
+        found = np.bincount(res['bin'], weights=res['found'], minlength=nbins)
+        fraction = np.where(n > 0, found / np.maximum(n, 1), np.nan)
+        snr_ratio = np.full(nbins, np.nan)
+        rec = res[res['found']]
+        if rec.size:
+            order = np.argsort(rec['bin'], kind='stable')
+            b, ratio = rec['bin'][order], (rec['snr'] / rec['expected'])[order]
+            bins, first = np.unique(b, return_index=True)
+            for k, part in zip(bins, np.split(ratio, first[1:])):
+                snr_ratio[k] = np.median(part)
+        return n.reshape(self.shape), fraction.reshape(self.shape), snr_ratio.reshape(self.shape)
+
+    def summary(self):
+        """
+        Prints completeness and SNR loss per bin.
+        """
+        n, fraction, snr_ratio = self.completeness()
+        s = self.settings
+        print('{0:>17} {1:>19} {2:>19} {3:>7} {4:>9} {5:>9}'.format('DM', 'width [ms]', 'fluence', 'n', 'recovered', 'SNR/ideal'))
+        for idx in np.ndindex(*self.shape):
+            i, j, k = idx
+            print('{0:8.1f}-{1:8.1f} {2:9.3f}-{3:9.3f} {4:9.3g}-{5:9.3g} {6:7d} {7:9.3f} {8:9.3f}'.format(
+                s['DM_edges'][i], s['DM_edges'][i+1], 1e3*s['width_edges'][j], 1e3*s['width_edges'][j+1],
+                s['fluence_edges'][k], s['fluence_edges'][k+1], n[idx], fraction[idx], snr_ratio[idx]))
+
+
+def draw(settings, first, n):
+    """
+    Burst parameters of injections first ... first+n-1. Injection m goes
+    to bin m % nbins; the draws only depend on the campaign seed and the
+    injection indices.
+    """
+    s = settings
+    rng = np.random.default_rng([s['seed'], first])
+    edges = [np.asarray(s[k]) for k in ('DM_edges', 'width_edges', 'fluence_edges')]
+    shape = tuple(e.size - 1 for e in edges)
+    bins = (first + np.arange(n)) % int(np.prod(shape))
+    i, j, k = np.unravel_index(bins, shape)
+    u = rng.random((3, n))
+    DM = edges[0][i] + u[0]*(edges[0][i+1] - edges[0][i])
+    width = np.exp(np.log(edges[1][j]) + u[1]*np.log(edges[1][j+1] / edges[1][j]))
+    fluence = np.exp(np.log(edges[2][k]) + u[2]*np.log(edges[2][k+1] / edges[2][k]))
+    return bins, DM, width, fluence, rng
+
+
+_worker = {}
+
+
+def _init_worker(settings):
+    s = settings
+    _worker['settings'] = s
+    freqs = np.linspace(s['f_min'], s['f_max'], s['nfreqs'])
+    times = np.arange(s['ntimes']) * s['t_samp']
+    _worker['engine'] = ENGINES[s['engine']](freqs, times, s['max_DM'])
+    _worker['widths'] = geometric_widths(s['max_width'])
+    if s['background'] is not None:
+        from reader import memmap_file, fchans
+        _worker['raw'] = memmap_file(s['background'])
+        _worker['fbin'] = fchans // s['nfreqs']
+
+
+def _noise_block(sim, rng):
+    s = _worker['settings']
+    if 'raw' not in _worker:
+        return sim.noise((s['ntimes'], s['nfreqs']))
+    from decimate import decimate
+    raw = _worker['raw']
+    i0 = int(rng.integers(0, raw.shape[0] - s['ntimes'] + 1))
+    block = decimate(raw[i0:i0 + s['ntimes']], 1, _worker['fbin'])
+    med = np.median(block, axis=0)
+    std = MAD_TO_STD * np.median(np.abs(block - med), axis=0)
+    block -= med
+    block /= np.where(std > 0, std, np.inf)
+    return block
+
+
+def _run_chunk(task):
+    i, first, n = task
+    s = _worker['settings']
+    engine = _worker['engine']
+    bins, DM, width, fluence, rng = draw(s, first, n)
+    sim = SimFRB(rng=rng)
+    t_samp = s['t_samp']
+    span = s['ntimes'] * t_samp
+    res = np.zeros(n, dtype=RESULT_DTYPE)
+    res['bin'], res['DM'], res['width'], res['fluence'] = bins, DM, width, fluence
+    dm_step = engine.dms[1] - engine.dms[0]
+    for m in range(n):
+        sweep = sim.DM_delay(DM[m], s['f_min']) - sim.DM_delay(DM[m], s['f_max'])
+        lo, hi = 5*width[m], span - sweep - 5*width[m]
+        assert hi > lo, 'Block of {0} s too short for DM {1:.1f} and width {2:.2g} s.'.format(span, DM[m], width[m])
+        t0 = lo + rng.random()*(hi - lo)
+        amp = fluence[m] / (width[m] * np.sqrt(2*np.pi))
+        block = _noise_block(sim, rng)
+        sim.add_pulse(block, f_min=s['f_min'], f_max=s['f_max'], DM=DM[m], pulse_width=width[m], pulse_amp=amp,
+                      t0=t0, t_samp=t_samp)
+        snr, w = boxcar_search(engine.apply(block), _worker['widths'])
+        cands = CandidateClusterer(s['threshold']).add_block(snr, 0, np.searchsorted(_worker['widths'], w), final=True)
+        # match: arrival (top of band, boxcar start) and DM within tolerance
+        t_c = cands['t']*t_samp + engine.t_offset[cands['dm']]
+        dt_tol = 3*width[m] + _worker['widths'][cands['width']]*t_samp + 2*t_samp
+        ok = (np.abs(t_c - t0) < dt_tol) & (np.abs(engine.dms[cands['dm']] - DM[m]) < max(0.1*DM[m], 3*dm_step))
+        res['t0'][m] = t0
+        res['expected'][m] = amp * np.sqrt(s['nfreqs']) * np.sqrt(np.sqrt(np.pi) * width[m] / t_samp)
+        if ok.any():
+            c = cands[ok][0] # cands are sorted by snr
+            res['found'][m] = True
+            res['snr'][m] = c['snr']
+            res['DM_found'][m] = engine.dms[c['dm']]
+            res['width_found'][m] = _worker['widths'][c['width']]*t_samp
+    return i, res
+
+####################################################################################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Injection-recovery completeness campaign.')
+    parser.add_argument('out_dir', type=str, help='Directory of the campaign results (reused to resume)')
+    parser.add_argument('ninject', type=int, help='Total number of injections')
+    parser.add_argument('--dm', type=float, nargs='+', default=[0, 100, 200, 300, 400], help='DM bin edges')
+    parser.add_argument('--width', type=float, nargs='+', default=[1e-3, 4e-3, 16e-3], help='Width bin edges [s]')
+    parser.add_argument('--fluence', type=float, nargs='+', default=[0.01, 0.03, 0.1, 0.3], help='Fluence bin edges [sigma*s]')
+    parser.add_argument('--ntimes', type=int, default=4096, help='Samples per block')
+    parser.add_argument('--nfreqs', type=int, default=256, help='Channels per block')
+    parser.add_argument('--tsamp', type=float, default=1e-3, help='Sampling time [s]')
+    parser.add_argument('--engine', type=str, default='homebrew', help='Dedispersion engine: ' + ', '.join(ENGINES))
+    parser.add_argument('--threshold', type=float, default=7., help='Detection threshold [sigma]')
+    parser.add_argument('--background', type=str, default=None, help='Recorder .dat file used instead of simulated noise')
+    parser.add_argument('--chunk', type=int, default=256, help='Injections per chunk file')
+    parser.add_argument('--nproc', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='Campaign seed')
+
+    args = parser.parse_args()
+    campaign = Campaign(args.out_dir, args.dm, args.width, args.fluence, args.ntimes, args.nfreqs, t_samp=args.tsamp,
+                        engine=args.engine, threshold=args.threshold, background=args.background, seed=args.seed)
+    campaign.run(args.ninject, args.chunk, args.nproc)
+    campaign.summary()
@@ -0,0 +1,135 @@
+###############################################
+# Synthetic LIMBO recorder (.dat) file writer #
+###############################################
+
+import numpy as np
+import argparse
+import time
+from simfrb import SimFRB
+
+# File layout (see https://github.com/liuweiseu/limbo_recorder/tree/auto_files#file-format):
+# a 1024-byte header followed by records of 2060 little-endian uint16
+# channels, 12 info channels then 2048 spectral channels. The info
+# channels written here are
+#   0-1   time the spectrum was collected, seconds (uint32)
+#   2-3   microseconds (uint32)
+#   4-7   FPGA spectral frame count (uint64)
+#   8-11  zero
+# The header is ASCII "key = value" lines, zero padded.
+#
+# simfrb needs src/fdmt on the path, e.g.
+#   PYTHONPATH=../src/fdmt python limbo_writer.py out.dat 100000 --burst 1 332.72 2e-3 20
+header = 1024
+total_chans = 2060
+fchans = 2048
+info_chans = 12
+INFO_DTYPE = np.dtype([('sec', '<u4'), ('usec', '<u4'), ('count', '<u8'), ('pad', '<u2', 4)])
+assert INFO_DTYPE.itemsize == 2*info_chans
+
+
+def make_header(**meta):
+    """
+    1024-byte header holding meta as "key = value" lines.
+    """
+    text = ''.join('{0} = {1}\n'.format(k, v) for k, v in meta.items()).encode('ascii')
+    assert len(text) <= header, 'Header metadata longer than {0} bytes.'.format(header)
+    return text.ljust(header, b'\0')
+
+
+def write_recorder_file(file_path, nspec, t_samp=1e-4, f_min=1150e6, f_max=1650e6, bursts=(), level=1000.,
+                        sigma=30., drop_rate=0., chunk=4096, start_time=None, seed=None, nthreads=None):
+    """
+    Writes a synthetic recorder file chunk by chunk, so memory use is
+    bounded by chunk spectra whatever the file size.
+
+    Inputs:
+        - file_path (str): output .dat file
+        - nspec (int): number of spectral frames generated (before drops)
+        - t_samp (float)|[s]: time between frames
+        - f_min, f_max (float)|[Hz]: frequencies of the first and last channel
+        - bursts: sequence of (time [s], DM [pc*cm^-3], width [s], amplitude
+          [units of sigma]); time is the arrival at the top of the band
+        - level (float): mean spectral level [counts]
+        - sigma (float): noise standard deviation [counts]
+        - drop_rate (float): probability that a frame is dropped (not
+          written; the FPGA count and timestamp of the next frame skip it)
+        - chunk (int): number of frames generated at once
+        - start_time (float)|[s]: unix time of the first frame. Default is now.
+        - seed (int): seed of the noise and drops
+        - nthreads (int): threads used to generate noise (see SimFRB.noise)
+    Returns:
+        - (written, dropped): number of spectra written and dropped
+    """
+    sim = SimFRB(seed=seed, nthreads=nthreads)
+    if start_time is None:
+        start_time = time.time()
+    start_us = int(round(start_time*1e6)) # integer microseconds keep frame times exact
+    bursts = [tuple(map(float, b)) for b in bursts]
+    # time span touched by each burst (its sweep plus 5 widths either side)
+    spans = [(t - 5*w, t + sim.DM_delay(DM, f_min) - sim.DM_delay(DM, f_max) + 5*w) for t, DM, w, a in bursts]
+    block = np.empty((chunk, fchans), dtype='float32')
+    rec = np.zeros((chunk, total_chans), dtype='<u2')
+    info = rec[:, :info_chans].view(INFO_DTYPE)[:, 0] # structured view of the info channels
+    written = dropped = 0
+    with open(file_path, 'wb') as f:
+        f.write(make_header(source='synthetic', nchans=fchans, tsamp=t_samp, fmin=f_min, fmax=f_max,
+                            nspec=nspec, start_time=start_time, drop_rate=drop_rate, seed=seed))
+        for i0 in range(0, nspec, chunk):
+            n = min(chunk, nspec - i0)
+            t_lo, t_hi = i0*t_samp, (i0 + n)*t_samp
+            sim.noise((n, fchans), loc=level, scale=sigma, out=block[:n])
+            for (t, DM, w, a), (s_lo, s_hi) in zip(bursts, spans):
+                if s_hi >= t_lo and s_lo < t_hi:
+                    sim.add_pulse(block[:n], f_min=f_min, f_max=f_max, DM=DM, pulse_width=w, pulse_amp=a*sigma,
+                                  t0=t - t_lo, t_samp=t_samp)
+            frames = np.arange(i0, i0 + n, dtype='uint64')
+            keep = sim.rng.random(n) >= drop_rate if drop_rate > 0 else np.ones(n, dtype=bool)
+            m = int(keep.sum())
+            np.clip(np.rint(block[:n][keep]), 0, 2**16 - 1, out=block[:m])
+            rec[:m, info_chans:] = block[:m]
+            us = start_us + np.round(frames[keep]*(t_samp*1e6)).astype('int64') # [us]
+            info['sec'][:m], info['usec'][:m] = np.divmod(us, 1000000)
+            info['count'][:m] = frames[keep]
+            rec[:m].tofile(f)
+            written += m
+            dropped += n - m
+    return written, dropped
+
+
+def read_info(raw):
+    """
+    Decodes the info channels of recorder records.
+
+    Inputs:
+        - raw: uint16 array of shape (nspec, 2060), e.g. reader.memmap_file
+    Returns:
+        - (time [s], FPGA count) arrays
+    """
+    info = np.ascontiguousarray(raw[:, :info_chans]).view(INFO_DTYPE)[:, 0]
+    return info['sec'] + info['usec']*1e-6, info['count']
+
+####################################################################################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Write a synthetic LIMBO recorder file with injected FRBs.')
+    parser.add_argument('file_path', type=str, help='Output .dat file')
+    parser.add_argument('nspec', type=int, help='Number of spectra')
+    parser.add_argument('--tsamp', type=float, default=1e-4, help='Sampling time [s]')
+    parser.add_argument('--fmin', type=float, default=1150e6, help='Frequency of the first channel [Hz]')
+    parser.add_argument('--fmax', type=float, default=1650e6, help='Frequency of the last channel [Hz]')
+    parser.add_argument('--burst', type=float, nargs=4, action='append', default=[], metavar=('T', 'DM', 'WIDTH', 'AMP'),
+                        help='Burst arrival time [s], DM [pc*cm^-3], width [s] and amplitude [sigma]; may be repeated')
+    parser.add_argument('--drop_rate', type=float, default=0., help='Fraction of dropped frames')
+    parser.add_argument('--chunk', type=int, default=4096, help='Number of spectra generated at once')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    parser.add_argument('--nthreads', type=int, default=None, help='Threads used to generate noise')
+
+    args = parser.parse_args()
+    start = time.time()
+    written, dropped = write_recorder_file(args.file_path, args.nspec, args.tsamp, args.fmin, args.fmax, args.burst,
+                                           drop_rate=args.drop_rate, chunk=args.chunk, seed=args.seed, nthreads=args.nthreads)
+    elapsed = time.time() - start
+    size = header + written*total_chans*2
+    print('Wrote {0} spectra ({1} dropped), {2:.1f} MB in {3:.2f} s ({4:.1f} MB/s)'.format(
+        written, dropped, size/1e6, elapsed, size/1e6/elapsed))
@@ -0,0 +1,110 @@
+###################################################
+# Vectorized BCD encoding of PTS frequency sweeps #
+###################################################
+
+import numpy as np
+import time as Time
+
+# The PTS takes its frequency as 10 BCD digits (GHz down to Hz), 40 bits
+# shifted in serially. WaveGen._load_frequency shifts the Hz digit first
+# and, within each digit, the least significant bit first, so bit k of a
+# step (k = 0 ... 39) is bit k % 4 of decimal digit k // 4 (units = 0).
+# Encoding a whole sweep here, before it starts, leaves the timed loop
+# with nothing to do but set the pins.
+#
+# Run this file for a benchmark on the fake GPIO backend.
+
+NBITS = 40
+MIN_FREQ = 1e6 # [Hz]
+
+
+def max_frequency(model='PTS3200'):
+    """
+    Highest frequency [Hz] of a PTS model (PTS3200, PTS500 or PTS300).
+    """
+    if model == 'PTS3200':
+        return 3199999999
+    elif model == 'PTS500':
+        return 500e6
+    return 300e6 # assume PTS300
+
+
+def encode_bits(freqs, model='PTS3200'):
+    """
+    BCD bit matrix of a list of frequencies, in shift order.
+
+    Inputs:
+        - freqs (array)|[Hz]: frequencies, rounded to integers and
+          clipped to the range of the model (as _convert_to_bins does)
+        - model (str): PTS model
+    Returns:
+        - bits: uint8 array of shape (nsteps, 40)
+    """
+    freqs = np.round(np.atleast_1d(np.asarray(freqs, dtype='float64')))
+    max_freq = max_frequency(model)
+    bad = (freqs > max_freq) | (freqs < MIN_FREQ)
+    if bad.any():
+        print('WARNING: {0} input frequencies are out of range for model {1} ({2} - {3} Hz).'.format(
+            bad.sum(), model, MIN_FREQ, max_freq))
+    freqs = np.clip(freqs, MIN_FREQ, max_freq).astype('int64')
+    digits = (freqs[:, None] // 10**np.arange(10, dtype='int64')) % 10 # (nsteps, 10), units first
+    bits = (digits[:, :, None] >> np.arange(4)) & 1 # (nsteps, 10, 4), LSB first
+    return bits.reshape(-1, NBITS).astype('uint8')
+
+
+def pack_words(bits):
+    """
+    Packs a (nsteps, 40) bit matrix into uint64 words (bit k of the word
+    is the k-th bit shifted).
+    """
+    return (bits.astype('uint64') << np.arange(NBITS, dtype='uint64')).sum(axis=1, dtype='uint64')
+
+
+def unpack_words(words):
+    """
+    Inverse of pack_words.
+    """
+    return ((np.asarray(words, dtype='uint64')[:, None] >> np.arange(NBITS, dtype='uint64')) & 1).astype('uint8')
+
+
+def benchmark(nsteps=2048, f_min=1150e6, f_max=1650e6):
+    """
+    Compares the CPU cost per sweep step of the string-based path
+    (_convert_to_bins + _load_frequency) with the precompiled bit matrix,
+    on a FakeGPIO backend that only records its calls. Also checks that
+    both paths produce the identical pin sequence.
+    """
+    from gpio_backends import FakeGPIO
+    from wavegen import WaveGen
+    fake = FakeGPIO(clock=lambda: 0) # record the pin sequence only
+    gen = WaveGen(backend=fake)
+    freqs = np.linspace(f_min, f_max, nsteps)
+
+    start = Time.perf_counter()
+    bin_freqs = gen._convert_freq_list(freqs)
+    encode_old = Time.perf_counter() - start
+    fake.clear()
+    start = Time.perf_counter()
+    for f in bin_freqs:
+        gen._load_frequency(f)
+    load_old = Time.perf_counter() - start
+    data_old = list(fake._log)
+
+    start = Time.perf_counter()
+    bits = gen.compile_sweep(freqs)
+    encode_new = Time.perf_counter() - start
+    bits = bits.tolist() # as the sweeps do, before their timed loop
+    fake.clear()
+    start = Time.perf_counter()
+    for row in bits:
+        gen._load_bits(row)
+    load_new = Time.perf_counter() - start
+    data_new = list(fake._log)
+    assert data_old == data_new, 'Compiled sweep does not produce the same pin sequence.'
+    print('Encoding {0} steps: {1:.2f} ms (strings), {2:.2f} ms (vectorized)'.format(nsteps, 1e3*encode_old, 1e3*encode_new))
+    print('Loading per step:   {0:.1f} us (strings), {1:.1f} us (compiled)'.format(
+        1e6*load_old/nsteps, 1e6*load_new/nsteps))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,176 @@
+#############################################
+# Self-calibration of WaveGen._usleep loops #
+#############################################
+
+import numpy as np
+import json
+import os
+import socket
+import time as Time
+from gpio_backends import LOW, HIGH
+
+# _usleep busy-waits by toggling the timer pin N times, so its accuracy
+# rests on the time one toggle takes, which changes with the ARM clock,
+# the firmware, the GPIO library and the Python version. calibrate times
+# toggle loops of several lengths against perf_counter_ns and fits
+#   duration [us] = offset + slope*N
+# by least squares (on relative errors); _usleep inverts it to get N. Results are stored per
+# host and backend in a JSON file, so a Pi only calibrates once (or after
+# a clock/firmware change, with WaveGen(calibration='new')). On the fake
+# backend WaveGen uses the hand-measured DEFAULT_CALIBRATION unless
+# calibration='new' is asked for, so tests write nothing.
+#
+# Run this file to check the fit on a simulated backend, then calibrate
+# and check _usleep on the fake backend of this machine.
+
+CAL_FILE = os.path.join(os.path.expanduser('~'), '.wavegen_calibration.json')
+
+# Hand-measured values used before self-calibration (RPi4B, arm_freq fixed
+# at 700 MHz: 445 toggles per ms and a 4 us Python overhead)
+DEFAULT_CALIBRATION = {'slope': 1e3/445, 'offset': 4.}
+
+DURATIONS = (10, 20, 50, 100, 200, 500, 1000, 2000) # [us]
+
+
+def toggle_pin(output, pin, n):
+    """
+    Toggles pin n times (the busy-wait loop of _usleep), leaving it low.
+    """
+    level = LOW
+    for i in range(n):
+        level = HIGH - level
+        output(pin, level)
+    output(pin, LOW)
+
+
+def host_key(gpio):
+    """
+    Key of a backend in the calibration file: host name and backend class.
+    """
+    return '{0}/{1}'.format(socket.gethostname(), type(gpio).__name__)
+
+
+def time_toggles(gpio, pin, counts, repeats=5, clock=Time.perf_counter_ns):
+    """
+    Times toggle loops.
+
+    Inputs:
+        - gpio: GPIO backend (see gpio_backends.py)
+        - pin (int): pin toggled
+        - counts: numbers of toggles
+        - repeats (int): runs of each count; the fastest one is kept, as
+          slower runs were interrupted by the OS
+        - clock: function returning the time in ns
+    Returns:
+        - durations (array)|[us]: time of each loop
+    """
+    durations = np.empty(len(counts))
+    for i, n in enumerate(counts):
+        best = None
+        for r in range(repeats):
+            start = clock()
+            toggle_pin(gpio.output, pin, int(n))
+            elapsed = clock() - start
+            best = elapsed if best is None else min(best, elapsed)
+        durations[i] = best/1e3
+    return durations
+
+
+def calibrate(gpio, pin, durations=DURATIONS, repeats=5, clock=Time.perf_counter_ns):
+    """
+    Fits the duration of toggle loops as offset + slope*N.
+
+    Inputs:
+        - gpio: GPIO backend
+        - pin (int): pin toggled
+        - durations (list)|[us]: target loop durations; the toggle counts
+          come from a first, rough estimate of the toggle time
+        - repeats (int): runs of each loop (see time_toggles)
+        - clock: function returning the time in ns
+    Returns:
+        - dict with slope [us per toggle], offset [us], rms residual [us],
+          the counts and measured durations [us], and the unix time of the
+          calibration
+    """
+    pilot = 1000
+    rough = time_toggles(gpio, pin, [pilot], repeats, clock)[0]/pilot # [us per toggle]
+    assert rough > 0, 'Toggle loop took no time on this clock.'
+    counts = np.unique(np.maximum(np.round(np.asarray(durations)/rough), 1).astype('int64'))
+    assert counts.size >= 2, 'Need at least two distinct loop lengths to fit, got {0}.'.format(counts)
+    measured = time_toggles(gpio, pin, counts, repeats, clock)
+    slope, offset = np.polyfit(counts, measured, 1, w=1/measured) # relative errors: short loops count as much as long ones
+    residual = np.sqrt(np.mean((offset + slope*counts - measured)**2))
+    return {'slope': float(slope), 'offset': float(offset), 'residual': float(residual),
+            'counts': counts.tolist(), 'durations': measured.tolist(), 'time': Time.time()}
+
+
+def load_calibration(key, path=CAL_FILE):
+    """
+    Calibration stored under key, or None.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get(key)
+
+
+def save_calibration(key, cal, path=CAL_FILE):
+    """
+    Stores cal under key, keeping the other hosts' calibrations. The file
+    is replaced atomically.
+    """
+    table = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            table = json.load(f)
+    table[key] = cal
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(table, f, indent=1)
+    os.replace(tmp, path)
+
+
+def check_simulated(toggle_ns=2247, overhead_ns=4000):
+    """
+    Calibrates a FakeGPIO whose clock advances toggle_ns at every write
+    and overhead_ns at every reading, so the fit must recover them exactly.
+    """
+    from gpio_backends import FakeGPIO
+    state = {'t': 0}
+    def advance(dt):
+        state['t'] += dt
+        return state['t']
+    gpio = FakeGPIO(clock=lambda: advance(toggle_ns))
+    cal = calibrate(gpio, 26, repeats=1, clock=lambda: advance(overhead_ns/2))
+    # each loop is N toggles plus the final low write, and half the
+    # overhead on either reading of the clock
+    assert np.isclose(cal['slope'], toggle_ns/1e3), 'Slope {0} us, expected {1} us.'.format(cal['slope'], toggle_ns/1e3)
+    assert np.isclose(cal['offset'], (toggle_ns + overhead_ns/2)/1e3), 'Offset {0} us, expected {1} us.'.format(
+        cal['offset'], (toggle_ns + overhead_ns/2)/1e3)
+    print('Simulated backend: slope {0:.3f} us, offset {1:.3f} us (exact)'.format(cal['slope'], cal['offset']))
+
+
+def check_usleep(gen, times=(10, 50, 200, 1000, 5000), repeats=20):
+    """
+    Prints the median and worst error of gen._usleep at several durations.
+    """
+    for t in times:
+        err = np.empty(repeats)
+        for r in range(repeats):
+            start = Time.perf_counter_ns()
+            gen._usleep(t)
+            err[r] = (Time.perf_counter_ns() - start)/1e3 - t
+        print('_usleep({0:5d} us): median error {1:6.1f} us, max {2:6.1f} us'.format(t, np.median(err), err.max()))
+
+
+if __name__ == '__main__':
+    import tempfile
+    from wavegen import WaveGen
+    check_simulated()
+    path = os.path.join(tempfile.mkdtemp(), 'calibration.json')
+    gen = WaveGen(backend='fake', calibration='new', calibration_file=path)
+    cal = gen.calibration
+    print('Fake backend on {0}: slope {1:.4f} us, offset {2:.2f} us, rms residual {3:.2f} us'.format(
+        host_key(gen.gpio), cal['slope'], cal['offset'], cal['residual']))
+    assert load_calibration(host_key(gen.gpio), path) == cal, 'Calibration was not stored.'
+    check_usleep(gen)
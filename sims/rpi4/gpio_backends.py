@@ -0,0 +1,167 @@
+##########################################
+# GPIO backends for WaveGen (RPi / fake) #
+##########################################
+
+import numpy as np
+import os
+import time as Time
+
+# WaveGen only talks to a backend through setup, output, set_drive_strength
+# and cleanup, so it can run on the Pi through RPi.GPIO or the pigpio
+# daemon, or anywhere else against FakeGPIO, which timestamps every
+# write with perf_counter_ns. The hardware libraries are only imported
+# when their backend is created.
+
+LOW = 0
+HIGH = 1
+
+
+class RPiGPIOBackend:
+    def __init__(self):
+        """
+        Backend using the RPi.GPIO library (BCM pin numbering). The drive
+        strength is set through the pigpio daemon's command line tool.
+        """
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        GPIO.setwarnings(False) # ignore RPi.GPIO internal messaging
+        GPIO.setmode(GPIO.BCM) # use GPIO numbers rather than pin numbers
+        self.output = GPIO.output # bound once: called in the timed loops
+
+    def setup(self, pins):
+        self.GPIO.setup(pins, self.GPIO.OUT)
+
+    def set_drive_strength(self, strength):
+        os.system('pigs pads 0 ' + str(strength)) # set strength [mA]
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+
+class PigpioBackend:
+    def __init__(self, host='localhost', port=8888):
+        """
+        Backend using the pigpio daemon (sudo pigpiod). Besides single
+        writes, it can play a whole sequence of edges as a DMA-timed
+        waveform (send_wave), which WaveGen uses for its sweeps.
+        """
+        import pigpio
+        self.pigpio = pigpio
+        self.pi = pigpio.pi(host, port)
+        assert self.pi.connected, 'Could not connect to pigpiod at {0}:{1}.'.format(host, port)
+        self.output = self.pi.write
+
+    def setup(self, pins):
+        for pin in pins:
+            self.pi.set_mode(pin, self.pigpio.OUTPUT)
+
+    def set_drive_strength(self, strength):
+        self.pi.set_pad_strength(0, strength)
+
+    def send_wave(self, edges, max_pulses=4000):
+        """
+        Plays (pin, level, delay_us) edges with DMA timing and waits for
+        the end: each edge is set, then held for delay_us. Sequences
+        longer than max_pulses edges (the daemon holds ~12000 pulses in
+        all) are split into waves that are each queued to start when the
+        previous one ends, so there is no gap between them; at most two
+        waves (one playing, one queued) exist at a time.
+        """
+        pulses = [self.pigpio.pulse(1 << pin if level else 0, 0 if level else 1 << pin, int(round(delay)))
+                  for pin, level, delay in edges]
+        self.pi.wave_clear()
+        queued = []
+        for i in range(0, len(pulses), max_pulses):
+            while len(queued) == 2: # wait for the first one to finish, then free it
+                if self.pi.wave_tx_at() == queued[0]:
+                    Time.sleep(1e-4)
+                else:
+                    self.pi.wave_delete(queued.pop(0))
+            self.pi.wave_add_generic(pulses[i:i+max_pulses])
+            wid = self.pi.wave_create()
+            self.pi.wave_send_using_mode(wid, self.pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+            queued.append(wid)
+        while self.pi.wave_tx_busy():
+            Time.sleep(1e-4)
+        for wid in queued:
+            self.pi.wave_delete(wid)
+
+    def cleanup(self):
+        self.pi.stop()
+
+
+class FakeGPIO:
+    def __init__(self, clock=Time.perf_counter_ns):
+        """
+        In-memory backend recording every write as (time [ns], pin, level).
+
+        Inputs:
+            - clock: function returning the time in ns of each write
+        """
+        self.clock = clock
+        self.drive_strength = None
+        self.pins = []
+        self.clear()
+
+    def setup(self, pins):
+        self.pins = list(pins)
+
+    def output(self, pin, value):
+        self._log.append((self.clock(), pin, 1 if value else 0))
+
+    def set_drive_strength(self, strength):
+        self.drive_strength = strength
+
+    def send_wave(self, edges, max_pulses=None):
+        """
+        Records (pin, level, delay_us) edges at their programmed times.
+        """
+        t = self.clock()
+        for pin, level, delay in edges:
+            self._log.append((t, pin, 1 if level else 0))
+            t += int(delay*1e3)
+
+    def cleanup(self):
+        pass
+
+    def clear(self):
+        """
+        Forgets the recorded writes.
+        """
+        self._log = []
+
+    def writes(self, pin=None):
+        """
+        Recorded writes, optionally of one pin only.
+
+        Returns:
+            - (t [ns], pin, level) arrays
+        """
+        log = np.array(self._log, dtype='int64').reshape(-1, 3)
+        if pin is not None:
+            log = log[log[:, 1] == pin]
+        return log[:, 0], log[:, 1], log[:, 2]
+
+    def edges(self, pin, level=None):
+        """
+        Times [ns] at which pin changed level (to level, if given). The
+        first write of a pin counts as an edge.
+        """
+        t, p, v = self.writes(pin)
+        change = np.r_[True, v[1:] != v[:-1]] if v.size else np.zeros(0, dtype=bool)
+        if level is not None:
+            change &= v == level
+        return t[change]
+
+
+BACKENDS = {'rpi': RPiGPIOBackend, 'pigpio': PigpioBackend, 'fake': FakeGPIO}
+
+
+def make_backend(backend='rpi'):
+    """
+    Returns backend itself if it is already a backend object, or a new
+    backend of that name ('rpi', 'pigpio' or 'fake').
+    """
+    if isinstance(backend, str):
+        return BACKENDS[backend]()
+    return backend
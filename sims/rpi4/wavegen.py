@@ -1,7 +1,8 @@
-import RPi.GPIO as GPIO
 import numpy as np
 import time as Time
-import os
+from bcd import encode_bits
+from gpio_backends import make_backend, FakeGPIO, PigpioBackend, LOW, HIGH
+from calibration import CAL_FILE, DEFAULT_CALIBRATION, calibrate, host_key, load_calibration, save_calibration, toggle_pin
 
 # GPIO pins
 GPIO_DATA_PIN = 23 # data pin
@@ -20,8 +21,11 @@ MODEL = 'PTS3200'
 # frequency will later be filtered out via a 250 MHz high-pass filter.
 NO_SIGNAL = 7.2e6 # Hz
 
-# Dispersion measure constant
-CONST = 4140e12 # s Hz^2 / (pc cm^3)
+# Dispersion measure constant. The same value as DM_CONST in
+# src/fdmt/delays.py (checked by tests/test_delays.py), copied rather
+# than imported because this directory is deployed on the Pi on its own,
+# without the FDMT package.
+CONST = 4.148808e15 # s Hz^2 / (pc cm^3)
 
 # Set GPIO drive strength
 DRIVE_STRENGTH = 4 # mA
@@ -36,14 +40,39 @@ class WaveGen():
                  gpio_timer_pin=GPIO_TIMER_PIN, 
                  gpio_loop_pin=GPIO_LOOP_PIN, 
                  model=MODEL, 
-                 no_signal=NO_SIGNAL):
+                 no_signal=NO_SIGNAL,
+                 backend='rpi',
+                 dma=None,
+                 calibration='auto',
+                 calibration_file=CAL_FILE):
         """
         Instantiate use of PTS and RPi GPIO pins.
+
+        Inputs:
+            - backend: 'rpi' (RPi.GPIO), 'pigpio' (pigpio daemon), 'fake'
+              (in-memory, records every write) or a backend object
+              (see gpio_backends.py)
+            - dma (bool): play sweeps as DMA-timed waveforms (see
+              compile_wave) instead of timing them in Python. Needs a
+              backend with send_wave; default is True for pigpio.
+            - calibration: how _usleep's toggle loop is calibrated (see
+              calibration.py): 'auto' (default: stored result of this
+              host and backend, measured and stored in calibration_file
+              if there is none; on FakeGPIO, the hand-measured values,
+              so nothing is written), 'new' (measure and store again,
+              e.g. after a clock or firmware change), None (the
+              hand-measured RPi4B values) or a dict with slope and
+              offset [us]
+            - calibration_file (str): JSON file of stored calibrations
         """
+        self.gpio = make_backend(backend)
+        self.dma = isinstance(self.gpio, PigpioBackend) if dma is None else dma
+        assert not self.dma or hasattr(self.gpio, 'send_wave'), 'Backend {0} cannot play DMA waveforms.'.format(type(self.gpio).__name__)
+        self.lateness = np.zeros(0, dtype='int64') # [ns] of the steps of the last sweep (see _run_schedule)
         # Set drive strength 
         self.drive_strength = drive_strength 
         # os.system('sudo pigpiod') #run pigpio demon
-        os.system('pigs pads 0 ' + str(self.drive_strength)) # set strength
+        self.gpio.set_drive_strength(self.drive_strength) # set strength
 
         self.model = model
         self.gpio_data_pin = gpio_data_pin
@@ -54,16 +83,25 @@ class WaveGen():
         self.gpio_pins = [self.gpio_data_pin, self.gpio_sclk_pin, self.gpio_pclk_pin, self.gpio_timer_pin, self.gpio_loop_pin]
         self.no_signal = no_signal
 
-        GPIO.setwarnings(False) # ignore RPi.GPIO internal messaging
-        GPIO.setmode(GPIO.BCM) # use GPIO numbers rather than pin numbers
         # define GPIO pins as outputs
-        GPIO.setup(self.gpio_pins, GPIO.OUT)
+        self.gpio.setup(self.gpio_pins)
         # set initial level of GPIO pins
-        GPIO.output(self.gpio_data_pin, GPIO.LOW)
-        GPIO.output(self.gpio_sclk_pin, GPIO.HIGH)
-        GPIO.output(self.gpio_pclk_pin, GPIO.HIGH)
-        GPIO.output(self.gpio_timer_pin, GPIO.LOW)
-        GPIO.output(self.gpio_loop_pin, GPIO.LOW)
+        self.gpio.output(self.gpio_data_pin, LOW)
+        self.gpio.output(self.gpio_sclk_pin, HIGH)
+        self.gpio.output(self.gpio_pclk_pin, HIGH)
+        self.gpio.output(self.gpio_timer_pin, LOW)
+        self.gpio.output(self.gpio_loop_pin, LOW)
+
+        if calibration == 'auto' and isinstance(self.gpio, FakeGPIO):
+            calibration = None # no hardware timing to calibrate
+        if calibration in ('auto', 'new'):
+            key = host_key(self.gpio)
+            cal = load_calibration(key, calibration_file) if calibration == 'auto' else None
+            if cal is None:
+                cal = calibrate(self.gpio, self.gpio_timer_pin)
+                save_calibration(key, cal, calibration_file)
+            calibration = cal
+        self.calibration = DEFAULT_CALIBRATION if calibration is None else calibration
 
 
     def _convert_to_bins(self, frequency, model='PTS3200'):
@@ -116,29 +154,170 @@ class WaveGen():
         for num in binary_numbers:
             split = [int(n) for n in num]
             split_binary_numbers.append(split)
-        GPIO.output(self.gpio_sclk_pin, GPIO.HIGH) # set serial clk to off state
-        GPIO.output(self.gpio_pclk_pin, GPIO.HIGH) # set parallel clk to off state
+        self.gpio.output(self.gpio_sclk_pin, HIGH) # set serial clk to off state
+        self.gpio.output(self.gpio_pclk_pin, HIGH) # set parallel clk to off state
         bit_cnt = 0
         for i in range(9, -1, -1): # count from most to least significant bit
             for j in range(len(split_binary_numbers[i])-1, -1, -1):
                 if split_binary_numbers[i][j] == 0:
-                    GPIO.output(self.gpio_data_pin, GPIO.LOW)
+                    self.gpio.output(self.gpio_data_pin, LOW)
                 elif split_binary_numbers[i][j] == 1:
-                    GPIO.output(self.gpio_data_pin, GPIO.HIGH)
+                    self.gpio.output(self.gpio_data_pin, HIGH)
                 self._usleep(3) # let the data settle before pulsing clk
 
-                GPIO.output(self.gpio_sclk_pin, GPIO.LOW)
+                self.gpio.output(self.gpio_sclk_pin, LOW)
                 self._usleep(5) # stretch out clk pulse to be conservative
-                GPIO.output(self.gpio_sclk_pin, GPIO.HIGH) 
+                self.gpio.output(self.gpio_sclk_pin, HIGH) 
                 bit_cnt += 1
         
 
+    def compile_sweep(self, freqs, model='PTS3200'):
+        """
+        Encodes every frequency of a sweep ahead of time (see bcd.py).
+
+        Inputs:
+            - freqs [Hz]: list of frequencies (in decimal form)
+            - model (str): PTS model used. Default is PTS3200.
+        Returns:
+            - uint8 array of shape (nsteps, 40): the bits of each step,
+              in the order they are shifted out
+        """
+        return encode_bits(freqs, model)
+
+
+    def _load_bits(self, bits):
+        """
+        Shifts one precompiled step (a row of compile_sweep, preferably
+        as a list) into the PTS. Produces the same pin sequence as
+        _load_frequency: the 3 and 5 us settles are the busy loops
+        _usleep(3) and _usleep(5) would run with the active calibration,
+        with their counts worked out once per step rather than per bit.
+        """
+        output, low, high = self.gpio.output, LOW, HIGH
+        data, sclk, timer = self.gpio_data_pin, self.gpio_sclk_pin, self.gpio_timer_pin
+        n3, n5 = self._loop_count(3), self._loop_count(5)
+        output(sclk, high) # set serial clk to off state
+        output(self.gpio_pclk_pin, high) # set parallel clk to off state
+        for bit in bits:
+            output(data, high if bit else low)
+            output(timer, low) # _usleep(3): let the data settle before pulsing clk
+            toggle_pin(output, timer, n3)
+            output(sclk, low)
+            output(timer, low) # _usleep(5): stretch out clk pulse to be conservative
+            toggle_pin(output, timer, n5)
+            output(sclk, high)
+
+
+    def compile_wave(self, bits, dt):
+        """
+        DMA waveform of a compiled sweep, for backends with send_wave.
+        Each step shifts its 40 bits in (data set and held 3 us, serial
+        clock low for 5 us, then high for 1 us, the settle times of
+        _load_frequency), waits 3 us, pulses the parallel clock low for
+        1 us and holds the rest of dt, so that sends are exactly dt
+        apart, timed by DMA rather than by Python.
+
+        Inputs:
+            - bits: compile_sweep output of shape (nsteps, 40)
+            - dt (float)|[s]: time between steps
+        Returns:
+            - list of (pin, level, delay_us) edges
+        """
+        data, sclk, pclk = self.gpio_data_pin, self.gpio_sclk_pin, self.gpio_pclk_pin
+        step_us = bits.shape[1]*(3 + 5 + 1) + 3 + 1 # load, settle and parallel clock pulse
+        hold = int(round(dt*1e6)) - step_us
+        assert hold >= 1, 'dt of {0} us is shorter than the {1} us needed to load and send a step.'.format(dt*1e6, step_us + 1)
+        edges = []
+        for row in bits.tolist():
+            for bit in row:
+                edges += [(data, HIGH if bit else LOW, 3), (sclk, LOW, 5), (sclk, HIGH, 1)]
+            edges[-1] = (sclk, HIGH, 1 + 3) # let the data settle before the parallel load
+            edges += [(pclk, LOW, 1), (pclk, HIGH, hold)]
+        return edges
+
+
+    def _play_sweep(self, bits, dt, continuous=False, verbose=False):
+        """
+        Plays a compiled sweep once (or forever if continuous), as a DMA
+        waveform if self.dma, else through _run_schedule.
+        """
+        if self.dma:
+            edges = self.compile_wave(bits, dt)
+            while continuous:
+                self.gpio.send_wave(edges)
+            self.gpio.send_wave(edges)
+            return
+        steps = bits.tolist() # plain lists are faster to walk in the timed loop
+        t_next = None
+        while continuous: # each repeat starts where the previous one ends, so repeats do not drift
+            t_next = self._run_schedule(steps, dt, verbose, t_next)
+        self._run_schedule(steps, dt, verbose, t_next)
+
+
+    def _wait_until(self, deadline):
+        """
+        Waits until perf_counter_ns reaches deadline: sleeps while more
+        than 2 ms remain, then busy-waits. The timer pin is high while
+        waiting.
+        """
+        self.gpio.output(self.gpio_timer_pin, HIGH)
+        remaining = deadline - Time.perf_counter_ns()
+        if remaining > 2000000:
+            Time.sleep((remaining - 1000000)/1e9) # the OS may oversleep by up to ~200us
+        while Time.perf_counter_ns() < deadline:
+            pass
+        self.gpio.output(self.gpio_timer_pin, LOW)
+
+
+    def _run_schedule(self, steps, dt, verbose=False, t_start=None):
+        """
+        Plays precompiled steps at absolute deadlines: step k is sent at
+        t_start + k*dt. Each step is serially loaded, and given the same
+        3 us settle as _make_wave, during the interval before its
+        deadline, so the load time is part of the step budget, and a late
+        step does not delay the following ones. The lateness of every
+        send [ns] is kept in self.lateness.
+
+        By default t_start is one dt after the call: the first step, like
+        every other, then has a whole step to be loaded, instead of
+        starting late by its load time. Compared with the old loop
+        (load, send, sleep dt), every send happens one load time later,
+        but the spacing of the sends is exact.
+
+        Inputs:
+            - steps: rows of compile_sweep, as lists
+            - dt (float)|[s]: time between steps
+            - verbose (bool): print a summary of the lateness
+            - t_start (int)|[ns]: perf_counter_ns deadline of the first
+              step, e.g. the value returned by the previous call, so
+              that repeated sweeps stay on one grid
+        Returns:
+            - deadline [ns] of the step following the last one
+        """
+        dt_ns = int(round(dt*1e9))
+        lateness = np.zeros(len(steps), dtype='int64')
+        if t_start is None:
+            t_start = Time.perf_counter_ns() + dt_ns
+        for k, bits in enumerate(steps):
+            deadline = t_start + k*dt_ns
+            self._load_bits(bits)
+            self._usleep(3) # conservative wait after data has been serially shifted before doing parallel load
+            self._wait_until(deadline)
+            lateness[k] = Time.perf_counter_ns() - deadline
+            self._send_command() # send data to PTS
+        self.lateness = lateness
+        if verbose:
+            print('{0} steps of {1:.1f} us: lateness median {2:.1f} us, max {3:.1f} us, {4} steps late by more than a step'.format(
+                len(steps), dt*1e6, np.median(lateness)/1e3, lateness.max()/1e3, (lateness > dt_ns).sum()))
+        return t_start + len(steps)*dt_ns
+
+
     def _send_command(self):
         """
         Triggers send of frequency from RPi to PTS.
         """
-        GPIO.output(self.gpio_pclk_pin, GPIO.LOW) # triggers send to PTS
-        GPIO.output(self.gpio_pclk_pin, GPIO.HIGH) # return parallel clock to off state
+        self.gpio.output(self.gpio_pclk_pin, LOW) # triggers send to PTS
+        self.gpio.output(self.gpio_pclk_pin, HIGH) # return parallel clock to off state
 
 
     def continuous_wave(self, freq):
@@ -187,53 +366,71 @@ class WaveGen():
         """
         GPIO reset/cleanup.
         """
-        GPIO.cleanup()
+        self.gpio.cleanup()
 
 
-    def _usleep(self, time, cal_cnt=445):
+    def _usleep(self, time):
         """
         Sleep for a given number of microseconds.
 
-        WARNING: Needs to be calibrated according to used hardware.
-        (Current estimate for RPi4B + PTS3200: 445 cnts = 1 ms.
-         NOTE: /boot/config.txt file altered s.t. arm_freq fixed at 700MHz
-         and core_freq_min=500MHz [core_freq set to value misc websites
-         suggested to improve timing stability]. OS interups are NOT
-         disabled so timing/delays can be off by [measured] ~200us. This 
-         "works" for sleeps of >= 12us.)
+        Whole milliseconds but the last are slept by the OS; the rest is a
+        busy loop toggling the timer pin, whose length comes from
+        self.calibration (see _loop_count), less the time the OS sleep
+        actually took. Below 2 ms nothing is measured, so the pin
+        sequence only depends on time. OS interrupts are NOT disabled, so
+        a delay can still be stretched by an interrupt.
 
         Inputs:
             - time [us]: time of delay
-            - cal_cnt (float/int): calibrated number of cnts needed
-              in order to equal 1 ms
         """
-        min_time = 4 # [us] -- offset value for misc Python comp. time
         if time <= 2:
             return
-        bit_val = GPIO.LOW
-        GPIO.output(self.gpio_timer_pin, bit_val)
-        # any time greater than minimum:
+        self.gpio.output(self.gpio_timer_pin, LOW)
         ms_time = np.trunc(time/1e3) - 1 # subtract 1ms because OS take a bit of time
-        if ms_time <= 0:
-            ms_time = 0
-            us_time = time
-        elif ms_time > 0:
-            us_time = time - (ms_time*1e3) - 190 # subtract 190us OS time
-        const = cal_cnt/1e3 # conversion from ms to us
-        N = int(np.round(const*(us_time-min_time)))
-        if ms_time != 0: # for delays larger than or equal to 2ms 
-            GPIO.output(self.gpio_timer_pin, GPIO.HIGH)
+        if ms_time > 0: # for delays larger than or equal to 2ms
+            start = Time.perf_counter_ns()
+            self.gpio.output(self.gpio_timer_pin, HIGH)
             Time.sleep(ms_time/1e3) # Time.sleep wants seconds
-            GPIO.output(self.gpio_timer_pin, GPIO.LOW)
-        for i in range(N): # for delays 10-2000us and fractional ms delays 
-            if bit_val == GPIO.HIGH:
-                bit_val = GPIO.LOW
-            else:
-                bit_val = GPIO.HIGH
-            GPIO.output(self.gpio_timer_pin, bit_val)
-        GPIO.output(self.gpio_timer_pin, GPIO.LOW) # return to safe value
-        # GPIO.output(self.gpio_loop_pin, GPIO.HIGH)
-        # GPIO.output(self.gpio_loop_pin, GPIO.LOW) # return to safe value
+            self.gpio.output(self.gpio_timer_pin, LOW)
+            time -= (Time.perf_counter_ns() - start)/1e3 # what is left after the OS sleep
+        toggle_pin(self.gpio.output, self.gpio_timer_pin, self._loop_count(time))
+
+
+    def _loop_count(self, time):
+        """
+        Number of timer pin toggles lasting time [us], from the fit
+        duration = offset + slope*N of self.calibration.
+        """
+        return max(int(np.round((time - self.calibration['offset'])/self.calibration['slope'])), 0)
+
+
+    def sweep_timing(self):
+        """
+        Timing of the steps recorded by a FakeGPIO backend (e.g. after
+        dm_sweep(..., backend='fake')). A step is sent by a write of the
+        parallel clock low (_send_command).
+
+        Returns:
+            - sends (array)|[us]: time of every send, from the first one
+            - intervals (array)|[us]: time between consecutive sends
+            - loads (array)|[us]: serial load time of every step, from
+              its first data write to the timer pin going high at the
+              start of _wait_until (to its send if it did not wait, as
+              in a DMA waveform), so the wait for the deadline is not
+              counted
+        """
+        t, pins, level = self.gpio.writes()
+        # positions in the log rather than times, which may be equal
+        send = np.flatnonzero((pins == self.gpio_pclk_pin) & (level == LOW))
+        data = np.flatnonzero(pins == self.gpio_data_pin)
+        wait = np.flatnonzero((pins == self.gpio_timer_pin) & (level == HIGH))
+        # first data write after the previous send
+        first = data[np.minimum(np.searchsorted(data, np.r_[-1, send[:-1]], side='right'), data.size - 1)]
+        # last wait before the send, if it comes after the first data write
+        last = wait[np.maximum(np.searchsorted(wait, send) - 1, 0)] if wait.size else send
+        end = np.where((last > first) & (last < send), last, send)
+        t_send = t[send]
+        return (t_send - t_send[0])/1e3, np.diff(t_send)/1e3, (t[end] - t[first])/1e3
 
 
     def blank(self):
@@ -241,16 +438,16 @@ class WaveGen():
         Clear signal and reset clocks.
         """
         N = 50
-        GPIO.output(self.gpio_sclk_pin, GPIO.HIGH) # set off
+        self.gpio.output(self.gpio_sclk_pin, HIGH) # set off
         for j in range(2):
             for i in range(N):
-                GPIO.output(self.gpio_sclk_pin, GPIO.LOW)
-                GPIO.output(self.gpio_sclk_pin, GPIO.HIGH)
+                self.gpio.output(self.gpio_sclk_pin, LOW)
+                self.gpio.output(self.gpio_sclk_pin, HIGH)
             self._send_command()
        
 
 
-    def linear_sweep(self, f_min=1150e6, f_max=1650e6, nchans= 2048, dt=1e-3, model='PTS3200', continuous=False):
+    def linear_sweep(self, f_min=1150e6, f_max=1650e6, nchans= 2048, dt=1e-3, model='PTS3200', continuous=False, verbose=False):
         """
         Generate a continuous linear (simple) sweep.
 
@@ -260,17 +457,10 @@ class WaveGen():
             - nchans (int): number of frequency channels
             - dt (float)|[s]: time until next frequncy change
             - continuous (bool): single or repeating sweep?
+            - verbose (bool): print the step lateness of each sweep
         """
-        dt_us = dt*1e6 # convert from s to us
         freqs = np.linspace(f_min, f_max, nchans)
-        bin_freqs = self._convert_freq_list(freqs, model)
-        while continuous:
-            for f in bin_freqs:
-                self._make_wave(f)
-                self._usleep(dt_us)
-        for f in bin_freqs:
-            self._make_wave(f)
-            self._usleep(dt_us)
+        self._play_sweep(self.compile_sweep(freqs, model), dt, continuous, verbose) # encode before the timed loop
 
 
     def _dm_delay(self, DM, freq):
@@ -286,7 +476,7 @@ class WaveGen():
         A = CONST*DM
         return A / freq**2
 
-    def dm_sweep(self, DM=332.72, f_min=1150e6, f_max=1650e6, dt=1e-3, model='PTS3200', continuous=False):
+    def dm_sweep(self, DM=332.72, f_min=1150e6, f_max=1650e6, dt=1e-3, model='PTS3200', continuous=False, verbose=False):
         """
         Generates a frequency sweep that mirrors that caused
         by dispersion measure influence.
@@ -300,21 +490,14 @@ class WaveGen():
             - model (str): PTS model used. Default is PTS3200.
               Accepts PTS3200, PTS500, PTS300.
             - continuous (bool): single or repeating sweep?
+            - verbose (bool): print the step lateness of each sweep
         """
-        dt_us = dt*1e6 # convert from s to us
         A = CONST*DM
         t0 = self._dm_delay(DM, f_max)
         tf = self._dm_delay(DM, f_min)
         ts = np.arange(t0, tf+dt, dt)
         freqs = np.sqrt(A/ts) # these frequencies will be sent to the PTS
-        bin_freqs = self._convert_freq_list(freqs, model) # convert frequencies into binary form
-        while continuous:
-            for f in bin_freqs:
-                self._make_wave(f)
-                self._usleep(dt_us)
-        for f in bin_freqs:
-            self._make_wave(f)
-            self._usleep(dt_us)
+        self._play_sweep(self.compile_sweep(freqs, model), dt, continuous, verbose) # convert frequencies into bits before the timed loop
 
 
     def mock_dm_obs(self, wait_time, DM=332.72, f_min=1150e6, f_max=1650e6, dt=1e-3, model='PTS3200'):
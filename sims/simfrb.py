@@ -5,10 +5,122 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import argparse
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from delays import DM_CONST, dm_delay
+
+# Dispersion delays come from the shared delay service of the FDMT
+# package, so simulated bursts are swept exactly as they are searched.
+# Run with it on the path, e.g. PYTHONPATH=../src/fdmt python simfrb.py
+
+class PhaseCache:
+    def __init__(self, max_bytes=2**30):
+        """
+        Least-recently-used cache of phase matrices, bounded by the total
+        size of the arrays it holds.
+
+        Inputs:
+            - max_bytes (int): memory cap; arrays larger than it are not kept
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def get(self, key):
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+        value.flags.writeable = False
+        self._items[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self._items.popitem(last=False)[1].nbytes
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+
+    def info(self):
+        """
+        Returns (hits, misses, number of matrices, bytes held).
+        """
+        return self.hits, self.misses, len(self._items), self.nbytes
+
 
 class SimFRB:
-    def __init__(self):
-        self.CONST = 4140e12 # s Hz^2 / (pc / cm^3)
+    def __init__(self, cache_bytes=2**30, rng=None, seed=None, nthreads=None):
+        """
+        Inputs:
+            - cache_bytes (int): memory cap of the phase matrix cache
+              (see phase_matrix)
+            - rng (np.random.Generator): source of all random numbers.
+              Default is np.random.default_rng(seed).
+            - seed (int): seed used when rng is not given
+            - nthreads (int): number of threads filling noise (see noise)
+        """
+        self.CONST = DM_CONST # s Hz^2 / (pc / cm^3)
+        self.phase_cache = PhaseCache(cache_bytes)
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+        # parent of the per-block streams of the noise
+        self._seed_seq = np.random.SeedSequence(self.rng.integers(2**63))
+        self.nthreads = nthreads
+
+    def noise(self, shape, loc=0., scale=1., dtype='float32', out=None, nthreads=None, block_rows=256):
+        """
+        Gaussian noise generated directly in dtype (float32 or float64).
+
+        The rows are split into blocks of block_rows, each drawn from its
+        own stream spawned from a SeedSequence (itself seeded from
+        self.rng). With nthreads > 1 (here or in the constructor) the
+        blocks are filled by a thread pool. The blocks and their streams
+        do not depend on nthreads, so the output for a given seed is the
+        same whatever the number of threads.
+
+        Inputs:
+            - shape (tuple): shape of the noise array
+            - loc, scale (float): mean and standard deviation
+            - dtype (str): 'float32' or 'float64'
+            - out: optional C-contiguous array to fill instead
+            - nthreads (int): number of threads (default self.nthreads)
+            - block_rows (int): rows per stream in the threaded fill
+        Returns:
+            - noise array
+        """
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        # a reshape of a non-contiguous array would be a copy, and out would not be filled
+        assert out.flags.c_contiguous, 'out must be C-contiguous.'
+        if nthreads is None:
+            nthreads = self.nthreads
+        rows = out.reshape(out.shape[0], -1) if out.ndim else out.reshape(1, 1)
+        starts = range(0, rows.shape[0], block_rows)
+        seqs = self._seed_seq.spawn(len(starts))
+
+        def fill(i):
+            gen = np.random.Generator(np.random.PCG64(seqs[i]))
+            gen.standard_normal(out=rows[starts[i]:starts[i]+block_rows], dtype=out.dtype)
+
+        if nthreads is not None and nthreads > 1:
+            with ThreadPoolExecutor(nthreads) as pool:
+                list(pool.map(fill, range(len(starts))))
+        else:
+            for i in range(len(starts)):
+                fill(i)
+        if scale != 1:
+            out *= scale
+        if loc != 0:
+            out += loc
+        return out
 
     def DM_delay(self, DM, freq):
         """
@@ -20,7 +132,36 @@ class SimFRB:
         Returns:
             - Pulse time delay in [s] 
         """
-        return np.float32(DM * self.CONST) / freq**2
+        return dm_delay(DM, freq)
+
+    def phase_matrix(self, ntimes, nfreqs, f_min, f_max, DM, dt, cdtype='complex64'):
+        """
+        Phase matrix exp(-2j*pi*f*delay) of shape (ntimes//2+1, nfreqs)
+        applying the dispersion delays of every channel (relative to the
+        top of the band, centered on the middle sample) in the Fourier
+        domain. Matrices are memoized in self.phase_cache, keyed on
+        (ntimes, nfreqs, f_min, f_max, DM, dt, dtype); the pulse start
+        time t0 is applied separately (see _t0_phase), so repeated
+        injections at the same DM reuse the matrix whatever their t0,
+        amplitude or noise.
+        """
+        key = (ntimes, nfreqs, float(f_min), float(f_max), float(DM), float(dt), np.dtype(cdtype).str)
+        phs = self.phase_cache.get(key)
+        if phs is None:
+            freqs = np.linspace(f_min, f_max, nfreqs)
+            tmid = (ntimes // 2) * dt
+            delays = self.DM_delay(DM, freqs)
+            delays -= tmid + delays[-1]
+            phs = np.ascontiguousarray(self._phases(1. / (ntimes*dt), ntimes//2 + 1, delays[None], cdtype)[0])
+            self.phase_cache.put(key, phs)
+        return phs
+
+    @staticmethod
+    def _t0_phase(ntimes, dt, t0, cdtype='complex64'):
+        """
+        Phase ramp delaying a profile by t0 [s].
+        """
+        return np.exp(-2j * np.pi * np.fft.rfftfreq(ntimes, dt) * t0).astype(cdtype)
 
     def make_frb(self, ntimes=4096, nfreqs=2048, f_min=1150e6, f_max=1650e6, DM=332.72, pulse_width=2.12e-3, pulse_amp=2, 
                  t0=2e-3, dtype='float32', cdtype='complex64'):
@@ -43,17 +184,14 @@ class SimFRB:
         freqs = np.linspace(f_min, f_max, nfreqs)
         dt = times[1] - times[0]
         tmid = times[times.size // 2]
-        delays = self.DM_delay(DM, freqs)
-        delays -= tmid + delays[-1] - t0  # center lowest delay at t0
 
         # assume same inherent profile for all freqs
         pulse = pulse_amp * np.exp(-(times - tmid)**2 / (2 * pulse_width**2)) # Gaussian pulse shape
         _pulse = np.fft.rfft(pulse).astype(cdtype)
-        _ffreq = np.fft.rfftfreq(pulse.size, dt)
-        phs = np.exp(-2j * np.pi * np.outer(_ffreq.astype(dtype), delays.astype(dtype)))
-        _pulse_dly = np.einsum('i,ij->ij', _pulse, phs)
+        _pulse *= self._t0_phase(ntimes, dt, t0, cdtype)
+        _pulse_dly = _pulse[:, None] * self.phase_matrix(ntimes, nfreqs, f_min, f_max, DM, dt, cdtype)
         profile = np.fft.irfft(_pulse_dly, axis=0).astype(dtype)
-        profile += np.random.normal(size=profile.shape, loc=10) # add noise
+        profile += self.noise(profile.shape, loc=10, dtype=profile.dtype) # add noise
         # profile[:,::137] = 0  # blank out rfi
         # profile[:,300:500] = 0  # blank out rfi
         # profile[::519] = 100  # rfi
@@ -64,15 +202,11 @@ class SimFRB:
         times = np.arange(ntimes)*(1.048e-3) # [s]
         freqs = np.linspace(f_min, f_max, nfreqs)
         dt = times[1] - times[0]
-        tmid = times[times.size // 2]
-        delays = self.DM_delay(DM, freqs)
-        delays -= tmid + delays[-1] - t0  # center lowest delay at t0
 
         # assume same inherent profile for all freqs
         _pulse = np.fft.rfft(pulse, axis=0).astype(cdtype)
-        _ffreq = np.fft.rfftfreq(pulse.shape[0], dt)
-        phs = np.exp(2j * np.pi * np.outer(_ffreq.astype(dtype), delays.astype(dtype)))
-        _pulse_dly = _pulse * phs.conj()
+        _pulse *= self._t0_phase(pulse.shape[0], dt, t0, cdtype)[:, None]
+        _pulse_dly = _pulse * self.phase_matrix(pulse.shape[0], nfreqs, f_min, f_max, DM, dt, cdtype)
         profile = np.fft.irfft(_pulse_dly, axis=0).astype(dtype)
         # profile += np.random.normal(size=profile.shape, loc=10) # add noise
         # profile[:,::137] = 0  # blank out rfi
@@ -81,6 +215,156 @@ class SimFRB:
         # profile -= np.mean(profile, axis=0, keepdims=True)
         return profile
 
+    @staticmethod
+    def _phases(df, nf, delays, cdtype='complex64', out=None):
+        """
+        Phase matrices exp(-2j*pi*k*df*delay) for k = 0 ... nf-1. The
+        complex exponential is only evaluated on a coarse (A) and a fine
+        (B) grid of k = a*B + b, and the rows are the products of the
+        two, which is much cheaper than an exp per element.
+
+        Inputs:
+            - df (float)|[Hz]: spacing of the rfft frequencies
+            - nf (int): number of rfft frequencies
+            - delays (array)|[s]: delays of shape (m, nfreqs)
+            - out: optional complex array of shape (m, A*B, nfreqs)
+        Returns:
+            - phases of shape (m, nf, nfreqs)
+        """
+        m, nfreqs = delays.shape
+        B = int(np.ceil(np.sqrt(nf)))
+        A = int(np.ceil(nf / B))
+        arg = -2 * np.pi * df * delays[:, None, :] # float64 so large k*delay stay accurate
+        coarse = np.exp(1j * (B * np.arange(A))[:, None] * arg).astype(cdtype) # (m, A, nfreqs)
+        fine = np.exp(1j * np.arange(B)[:, None] * arg).astype(cdtype) # (m, B, nfreqs)
+        if out is None:
+            out = np.empty((m, A * B, nfreqs), dtype=cdtype)
+        np.multiply(coarse[:, :, None], fine[:, None], out=out.reshape(m, A, B, nfreqs))
+        return out[:, :nf]
+
+    def make_frbs(self, DM, pulse_width, pulse_amp, t0, ntimes=4096, nfreqs=2048, f_min=1150e6, f_max=1650e6,
+                  t_samp=1.048e-3, noise=True, max_bytes=2**28, dtype='float32', cdtype='complex64'):
+        """
+        Batched make_frb: simulates one burst per element of the parameter
+        arrays, in chunks whose working memory stays below max_bytes, so
+        a campaign can draw any number of bursts without holding them
+        all. The time and frequency grids are built once for the whole
+        batch, the pulse spectra of a chunk are computed in one rfft, and
+        the phase matrices of the chunk by one call of _phases. Noise is
+        drawn burst by burst as make_frb draws it, so for the same seed
+        the bursts equal those of a make_frb loop.
+
+        Inputs:
+            - DM (array)|[pc*cm^-3]: dispersion measures
+            - pulse_width (array)|[s]: widths of the FRB pulses
+            - pulse_amp (array): amplitudes of the FRB pulses
+            - t0 (array)|[s]: offsets of the pulse start times
+              (scalars are broadcast against the other arrays)
+            - ntimes, nfreqs, f_min, f_max: as in make_frb
+            - t_samp (float)|[s]: sampling time
+            - noise (bool): add noise and remove each channel's mean
+            - max_bytes (int): memory bound per chunk
+        Yields:
+            - (i0, profiles): index of the first burst of the chunk and
+              power matrices of shape (nburst, ntimes, nfreqs)
+        """
+        DM, pulse_width, pulse_amp, t0 = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype='float64'))
+                                                              for x in (DM, pulse_width, pulse_amp, t0)])
+        times = np.arange(ntimes)*t_samp # [s]
+        freqs = np.linspace(f_min, f_max, nfreqs)
+        tmid = times[times.size // 2]
+        nf = ntimes // 2 + 1
+        B = int(np.ceil(np.sqrt(nf)))
+        rows = B * int(np.ceil(nf / B))
+        # phases, plus the irfft output and its cast to dtype
+        per_burst = rows*nfreqs*np.dtype(cdtype).itemsize + 2*ntimes*nfreqs*np.dtype(dtype).itemsize
+        chunk = max(1, int(max_bytes // per_burst))
+        buf = np.empty((min(chunk, DM.size), rows, nfreqs), dtype=cdtype)
+        scratch = np.empty((ntimes, nfreqs), dtype=dtype) if noise else None
+        for i0 in range(0, DM.size, chunk):
+            sl = slice(i0, i0 + chunk)
+            m = DM[sl].size
+            delays = self.DM_delay(DM[sl, None], freqs)
+            delays -= tmid + delays[:, -1:] - t0[sl, None] # as phase_matrix, then delayed by t0
+            pulses = pulse_amp[sl, None] * np.exp(-(times - tmid)**2 / (2 * pulse_width[sl, None]**2))
+            _pulse = np.fft.rfft(pulses, axis=1).astype(cdtype)
+            phs = self._phases(1. / (ntimes*t_samp), nf, delays, cdtype, out=buf[:m])
+            phs *= _pulse[:, :, None]
+            profiles = np.fft.irfft(phs, n=ntimes, axis=1).astype(dtype, copy=False)
+            if noise:
+                for profile in profiles:
+                    profile += self.noise(scratch.shape, loc=10, out=scratch) # add noise
+                profiles -= np.mean(profiles, axis=1, keepdims=True)
+            yield i0, profiles
+
+    def benchmark_batch(self, n=64, ntimes=4096, nfreqs=2048, max_bytes=2**28):
+        """
+        Prints the throughput [bursts/s] of make_frbs against a loop of
+        make_frb, for n bursts of random DM, width, amplitude and t0.
+        """
+        DM = self.rng.uniform(50, 1000, n)
+        width = self.rng.uniform(1e-3, 5e-3, n)
+        amp = self.rng.uniform(1, 5, n)
+        t0 = self.rng.uniform(0, 1, n)
+        start = time.perf_counter()
+        for i in range(n):
+            self.make_frb(ntimes, nfreqs, DM=DM[i], pulse_width=width[i], pulse_amp=amp[i], t0=t0[i])
+        loop = time.perf_counter() - start
+        start = time.perf_counter()
+        chunk = 0
+        for i0, profiles in self.make_frbs(DM, width, amp, t0, ntimes, nfreqs, max_bytes=max_bytes):
+            chunk = max(chunk, profiles.shape[0])
+        batch = time.perf_counter() - start
+        print('make_frb loop: {0:.2f} bursts/s'.format(n / loop))
+        print('make_frbs:     {0:.2f} bursts/s ({1:.2f}x), {2} bursts per chunk of at most {3:.0f} MB'.format(
+            n / batch, loop / batch, chunk, max_bytes/1e6))
+
+    def add_pulse(self, out=None, ntimes=4096, nfreqs=2048, f_min=1150e6, f_max=1650e6, DM=332.72, pulse_width=2.12e-3,
+                  pulse_amp=2, t0=2e-3, t_samp=1.048e-3, nsigma=5, smearing=False, noise=True, dtype='float32'):
+        """
+        Direct time-domain synthesis of a dispersed Gaussian pulse. Each
+        channel's pulse is only evaluated within nsigma widths of its
+        arrival time and added in place, so the cost is O(nfreqs x pulse
+        width) rather than the full-profile FFTs of make_frb. The pulse
+        arrives at t0 at the top of the band (make_frb's convention,
+        without the wrap-around of the FFT delay).
+
+        Inputs:
+            - out: optional array of shape (ntimes, nfreqs) to add the
+              pulse into (e.g. recorded data or a block of a larger file)
+            - ntimes, nfreqs, f_min, f_max, DM, pulse_width, pulse_amp, t0:
+              as in make_frb
+            - t_samp (float)|[s]: sampling time
+            - nsigma (float): half-width of the evaluated window [widths]
+            - smearing (bool): broaden each channel by its intra-channel
+              dispersion smearing (added in quadrature, fluence conserved)
+            - noise (bool): if out is not given, start from unit normal
+              noise rather than zeros
+        Returns:
+            - out, with the pulse added
+        """
+        if out is None:
+            out = self.noise((ntimes, nfreqs), dtype=dtype) if noise else np.zeros((ntimes, nfreqs), dtype=dtype)
+        ntimes, nfreqs = out.shape
+        freqs = np.linspace(f_min, f_max, nfreqs)
+        arrival = t0 + self.DM_delay(DM, freqs) - self.DM_delay(DM, freqs[-1]) # [s]
+        width = np.full(nfreqs, float(pulse_width))
+        amp = np.full(nfreqs, float(pulse_amp))
+        if smearing:
+            df = abs(freqs[1] - freqs[0]) if nfreqs > 1 else 0.
+            smear = 2 * self.DM_delay(DM, freqs) / freqs * df # |d delay / d freq| * channel width
+            eff = np.sqrt(width**2 + smear**2 / 12) # boxcar of width smear has variance smear^2/12
+            amp *= width / eff
+            width = eff
+        nw = int(np.ceil(2 * nsigma * width.max() / t_samp)) + 1
+        first = np.floor((arrival - nsigma * width) / t_samp).astype('int64')
+        idx = first[:, None] + np.arange(nw) # (nfreqs, nw) sample indices
+        inside = (idx >= 0) & (idx < ntimes)
+        chan = np.broadcast_to(np.arange(nfreqs)[:, None], idx.shape)
+        vals = amp[:, None] * np.exp(-(idx * t_samp - arrival[:, None])**2 / (2 * width[:, None]**2))
+        out[idx[inside], chan[inside]] += vals[inside].astype(out.dtype) # indices are unique per channel
+        return out
+
     def pts_frb(self, ntimes=4096, nfreqs=2048, f_min=1150e6, f_max=1650e6, DM=332.72, pulse_width=2.12e-3, pulse_amp=2, 
                 t0=2e-3, dtype='float32', cdtype='complex64'):
         """
@@ -103,22 +387,19 @@ class SimFRB:
         freqs = np.linspace(f_min, f_max, nfreqs)
         dt = times[1] - times[0] # 0.1ms
         tmid = times[times.size // 2]
-        delays = self.DM_delay(DM, freqs)
-        delays -= tmid + delays[-1] - t0  # center lowest delay at t0
 
         # assume same inherent profile for all freqs
         pulse = pulse_amp * np.exp(-(times - tmid)**2 / (2 * pulse_width**2)) # Gaussian pulse shape
         _pulse = np.fft.rfft(pulse).astype(cdtype)
-        _ffreq = np.fft.rfftfreq(pulse.size, dt)
-        phs = np.exp(-2j * np.pi * np.outer(_ffreq.astype(dtype), delays.astype(dtype))) 
-        _pulse_dly = np.einsum('i,ij->ij', _pulse, phs)
+        _pulse *= self._t0_phase(ntimes, dt, t0, cdtype)
+        _pulse_dly = _pulse[:, None] * self.phase_matrix(ntimes, nfreqs, f_min, f_max, DM, dt, cdtype)
         profile = np.fft.irfft(_pulse_dly, axis=0).astype(dtype) 
         # blank out some signal so it mirrors the step behavior of RPi+PTS setup
         profile.shape = (-1, 4, ntimes)
         profile[0:, 0:3] = 0
         profile.shape = (-1, ntimes)
         
-        profile += np.random.normal(size=profile.shape, loc=10) # add noise
+        profile += self.noise(profile.shape, loc=10, dtype=profile.dtype) # add noise
         profile -= np.mean(profile, axis=0, keepdims=True)
         return profile
     
@@ -0,0 +1,95 @@
+# Multi-width boxcar matched-filter search on DM-time output
+
+import numpy as np
+from rfi import MAD_TO_STD
+
+
+def geometric_widths(max_width=64, factor=2.):
+    """
+    Boxcar widths 1, factor, factor^2, ... up to max_width (in samples),
+    rounded to unique integers.
+    """
+    n = int(np.floor(np.log(max_width) / np.log(factor) + 1e-9)) + 1
+    return np.unique(np.round(factor**np.arange(n)).astype(int))
+
+
+def boxcar_search(dmt, widths=None, max_width=64, stat_stride=8):
+    """
+    Convolves every DM trial (column) of a DM-time block with boxcars of
+    geometrically spaced widths and keeps, for each pixel, the best SNR
+    over all widths. A single cumulative sum along time makes every
+    width O(1) per sample (S_w[t] = C[t+w] - C[t]), and all widths are
+    evaluated into one reused scratch buffer, so the DM-time plane is
+    never copied per width.
+
+    The noise of each width and DM trial is measured robustly (median
+    and MAD over every stat_stride-th sample of the boxcar series), so
+    correlated noise in the FDMT output is accounted for.
+
+    Inputs:
+        - dmt: array of shape (ntimes, ndm), e.g. the output of FDMT.apply
+        - widths (array): boxcar widths in samples. Default is
+          geometric_widths(max_width).
+        - max_width (int): largest width if widths is not given
+        - stat_stride (int): subsampling used for the noise estimate
+    Returns:
+        - snr: float32 array of shape (ntimes, ndm), best SNR of the
+          boxcar starting at each sample (-inf where no width fits)
+        - width: uint16 array of shape (ntimes, ndm), the width [samples]
+          achieving it
+    """
+    if widths is None:
+        widths = geometric_widths(max_width)
+    ntimes, ndm = dmt.shape
+    widths = [int(w) for w in widths if w <= ntimes]
+    csum = np.zeros((ntimes + 1, ndm), dtype='float64')
+    np.cumsum(dmt, axis=0, out=csum[1:])
+    snr = np.full((ntimes, ndm), -np.inf, dtype='float32')
+    width = np.zeros((ntimes, ndm), dtype='uint16')
+    scratch = np.empty((ntimes, ndm), dtype='float64')
+    for w in widths:
+        n = ntimes - w + 1
+        s = scratch[:n]
+        np.subtract(csum[w:], csum[:n], out=s)
+        sub = s[::stat_stride]
+        med = np.median(sub, axis=0)
+        std = MAD_TO_STD * np.median(np.abs(sub - med), axis=0)
+        s -= med
+        s /= np.where(std > 0, std, np.inf)
+        better = s > snr[:n]
+        np.copyto(snr[:n], s, where=better, casting='same_kind')
+        width[:n][better] = w
+    return snr, width
+
+
+def boxcar_peak(dmt, widths=None, max_width=64, stat_stride=8):
+    """
+    Brightest pixel of the boxcar search of a DM-time block.
+
+    Returns:
+        - (snr, t, dm, width): best SNR, its time and DM indices, and
+          the boxcar width [samples]
+    """
+    return peak_pixel(*boxcar_search(dmt, widths, max_width, stat_stride))
+
+
+def peak_pixel(snr, width):
+    """
+    Brightest pixel of an existing boxcar_search result, for callers
+    that also use the full SNR plane (e.g. for clustering).
+
+    Returns:
+        - (snr, t, dm, width): as boxcar_peak
+    """
+    t, dm = np.unravel_index(np.argmax(snr, axis=None), snr.shape)
+    return float(snr[t, dm]), int(t), int(dm), int(width[t, dm])
+
+
+def boxcar_candidate(dmt, start, max_width=64):
+    """
+    Candidate stage for mp_pipeline.run_pipeline using the boxcar search
+    (bind max_width with functools.partial).
+    Returns (snr, time index in file, DM index, width).
+    """
+    snr, t, dm, w = boxcar_peak(dmt, max_width=max_width)
+    return snr, int(start + t), dm, w
@@ -0,0 +1,116 @@
+# Brute-force (direct sum) dedispersion over many DM trials
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+from old.fdmt import pulse_delay
+from delays import shift_table
+
+# Exact reference for the FDMT engines: every DM trial is the sum over
+# channels of the data shifted by the integer delay of each channel,
+# with no approximation of the dispersion sweep. The delay table of all
+# trials comes from the shared cache (delays.shift_table) and is turned
+# once into flat offsets into a channel-major, zero-padded copy of the
+# block. Each time tile is then a gather of contiguous runs (fancy
+# indexing of a sliding-window view, which copies whole rows rather
+# than single elements) and a sum over channels. A gather copies
+# dm_chunk*nfreqs*tile float32 values, so the tile length is derived from
+# a byte budget (gather_bytes, default 1 MB, about the size of an L2
+# cache) to keep them in cache until they are summed. Tiles are spread
+# over a thread pool.
+
+
+class BruteForceEngine:
+    def __init__(self, freqs, times, maxDM=500, dms=None, ndm=None, gather_bytes=2**20, dm_chunk=1, tile=None, nthreads=1):
+        """
+        Inputs:
+            - freqs (array)|[Hz]: channel frequencies (ascending)
+            - times (array)|[s]: sample times
+            - maxDM (float)|[pc*cm^-3]: maximum DM searched
+            - dms (array)|[pc*cm^-3]: DM trials. Default is ndm trials
+              evenly spaced over 0 - maxDM.
+            - ndm (int): number of trials if dms is not given. Default is
+              one trial per sample of delay across the band.
+            - gather_bytes (int): size of the values copied by one gather
+              [bytes], which sets tile
+            - dm_chunk (int): number of DM trials per gather
+            - tile (int): number of output samples per gather, overriding
+              gather_bytes
+            - nthreads (int): number of threads
+        """
+        self.freqs = np.asarray(freqs, dtype='float64')
+        self.t_samp = times[1] - times[0]
+        self.ntimes = times.size
+        self.nfreqs = self.freqs.size
+        f_lo, f_hi = self.freqs[0]/1e6, self.freqs[-1]/1e6 # [MHz]
+        if dms is None:
+            if ndm is None:
+                ndm = int(np.ceil((pulse_delay(f_lo, maxDM) - pulse_delay(f_hi, maxDM))*1e-3/self.t_samp)) + 1
+            dms = np.linspace(0, maxDM, ndm)
+        self.dms = np.asarray(dms, dtype='float64')
+        self.t_offset = np.zeros(self.dms.size) # output times are arrivals at the top of the band
+        # delay of every channel relative to the top of the band [samples]
+        self.delays = shift_table(self.freqs, self.t_samp, self.dms) # (ndm, nfreqs), shared and read-only
+        self.max_delay = int(self.delays.max())
+        if tile is None:
+            tile = max(gather_bytes // (4*dm_chunk*self.nfreqs), 1)
+        self.tile = int(tile)
+        self.dm_chunk = dm_chunk
+        self.nthreads = nthreads
+        # flat offsets into the channel-major, zero-padded copy of a block
+        self._stride = self.ntimes + self.max_delay
+        self._base = np.arange(self.nfreqs, dtype='int64')*self._stride + self.delays # (ndm, nfreqs)
+
+    def _tile(self, flat, out, t0):
+        n = min(self.tile, self.ntimes - t0)
+        windows = sliding_window_view(flat[t0:], n) # windows[i] = flat[t0+i:t0+i+n], no copy
+        for d0 in range(0, self.dms.size, self.dm_chunk):
+            windows[self._base[d0:d0+self.dm_chunk]].sum(axis=1, out=out[d0:d0+self.dm_chunk, t0:t0+n])
+
+    def apply(self, block):
+        """
+        Dedisperses a block. Samples whose sweep runs past the end of the
+        block only sum the channels still inside it.
+
+        Inputs:
+            - block: array of shape (ntimes, nfreqs)
+        Returns:
+            - dmt: float32 array of shape (ntimes, ndm)
+        """
+        assert block.shape == (self.ntimes, self.nfreqs), 'Expected a block of shape {0}, got {1}.'.format(
+            (self.ntimes, self.nfreqs), block.shape)
+        padded = np.zeros((self.nfreqs, self._stride), dtype='float32')
+        padded[:, :self.ntimes] = block.T
+        flat = padded.ravel()
+        out = np.empty((self.dms.size, self.ntimes), dtype='float32')
+        starts = range(0, self.ntimes, self.tile)
+        if self.nthreads > 1:
+            with ThreadPoolExecutor(self.nthreads) as pool:
+                list(pool.map(lambda t0: self._tile(flat, out, t0), starts))
+        else:
+            for t0 in starts:
+                self._tile(flat, out, t0)
+        return out.T
+
+    def cost(self):
+        return self.ntimes * self.dms.size * self.nfreqs
+
+
+def validate(engine, block, freqs, t_samp, nthreads=1):
+    """
+    Measures how much of the signal an FDMT engine recovers, against the
+    exact brute-force sum at the engine's own DM trials.
+
+    Inputs:
+        - engine: engine with apply and dms, e.g. dedisp_plan.TreeEngine
+        - block: array of shape (ntimes, nfreqs), e.g. a simulated burst
+        - freqs (array)|[Hz]: channel frequencies of the engine
+        - t_samp (float)|[s]: sampling time
+        - nthreads (int): threads for the brute-force engine
+    Returns:
+        - ratio: for every DM trial, the peak of the engine output over
+          the peak of the brute-force output
+    """
+    times = np.arange(block.shape[0]) * t_samp
+    ref = BruteForceEngine(freqs, times, dms=engine.dms, nthreads=nthreads)
+    return engine.apply(block).max(axis=0) / ref.apply(block).max(axis=0)
@@ -0,0 +1,174 @@
+# Candidate clustering and sifting
+
+import numpy as np
+
+# A single burst lights up many neighbouring (time, DM, width) pixels
+# above threshold. Pixels are grouped by friends-of-friends: two pixels
+# are friends when they are within (t_link, dm_link, w_link) index steps
+# of each other, and clusters are the connected components of that
+# graph. Each cluster is reduced to its brightest pixel. Everything is
+# done on arrays of pixels (sorted keys + searchsorted to find friends,
+# and vectorized min-label propagation to join them), so a block with
+# millions of pixels above threshold never loops in Python per pixel.
+
+CAND_DTYPE = np.dtype([('snr', 'f4'), ('t', 'i8'), ('dm', 'i4'), ('width', 'i4'), ('npix', 'i4'),
+                       ('t_min', 'i8'), ('t_max', 'i8'), ('dm_min', 'i4'), ('dm_max', 'i4')])
+
+
+def _edges(keys, coords, offsets, shape):
+    """
+    Pairs (i, j) of pixels separated by one of the offsets. keys must be
+    sorted, coords is (npix, 3) and shape the extent of each coordinate.
+    """
+    ii, jj = [], []
+    for off in offsets:
+        nb = coords + off
+        ok = np.all((nb >= 0) & (nb < shape), axis=1)
+        nb_keys = np.ravel_multi_index(nb[ok].T, shape)
+        pos = np.searchsorted(keys, nb_keys)
+        pos[pos == keys.size] = 0
+        hit = keys[pos] == nb_keys
+        ii.append(np.flatnonzero(ok)[hit])
+        jj.append(pos[hit])
+    return np.concatenate(ii), np.concatenate(jj)
+
+
+def _label(n, i, j):
+    """
+    Connected components of a graph of n nodes with edges (i, j), by
+    min-label propagation with pointer jumping. Returns one label per
+    node (the smallest node index of its component).
+    """
+    labels = np.arange(n)
+    while i.size:
+        li, lj = labels[i], labels[j]
+        if np.array_equal(li, lj):
+            break
+        m = np.minimum(li, lj)
+        np.minimum.at(labels, li, m) # hook roots onto the smaller root
+        np.minimum.at(labels, lj, m)
+        while True: # compress paths
+            nxt = labels[labels]
+            if np.array_equal(nxt, labels):
+                break
+            labels = nxt
+    return labels
+
+
+def cluster_pixels(t, dm, w, snr, t_link=2, dm_link=2, w_link=1):
+    """
+    Friends-of-friends clustering of pixels in (time, DM, width) index
+    space.
+
+    Inputs:
+        - t, dm, w (int arrays): pixel coordinates (w is a width index)
+        - snr (float array): pixel SNR
+        - t_link, dm_link, w_link (int): linking lengths in index steps
+    Returns:
+        - labels: index in cands of the cluster of every pixel
+        - cands: structured array (CAND_DTYPE) with one candidate per
+          cluster, its brightest pixel, sorted by decreasing snr
+    """
+    n = t.size
+    if n == 0:
+        return np.zeros(0, dtype='int64'), np.zeros(0, dtype=CAND_DTYPE)
+    t0 = t.min()
+    coords = np.stack([t - t0, dm, w], axis=1).astype('int64')
+    shape = coords.max(axis=0) + 1
+    keys = np.ravel_multi_index(coords.T, shape)
+    order = np.argsort(keys, kind='stable')
+    keys, coords = keys[order], coords[order]
+    # half of the linking box suffices: every pair is found from one side
+    grid = np.stack(np.meshgrid(np.arange(-t_link, t_link+1), np.arange(-dm_link, dm_link+1),
+                                np.arange(-w_link, w_link+1), indexing='ij'), axis=-1).reshape(-1, 3)
+    flat = np.ravel_multi_index((grid + [t_link, dm_link, w_link]).T, (2*t_link+1, 2*dm_link+1, 2*w_link+1))
+    offsets = grid[flat > flat.size // 2]
+    i, j = _edges(keys, coords, offsets, shape)
+    labels_sorted = _label(n, i, j)
+    labels = np.empty(n, dtype='int64')
+    labels[order] = labels_sorted
+
+    # reduce: brightest pixel and extent of every cluster
+    uniq, inv, npix = np.unique(labels, return_inverse=True, return_counts=True)
+    best = np.lexsort((-snr, inv)) # by cluster, then decreasing snr
+    first = best[np.r_[0, np.flatnonzero(np.diff(inv[best])) + 1]]
+    cands = np.zeros(uniq.size, dtype=CAND_DTYPE)
+    cands['snr'] = snr[first]
+    cands['t'] = t[first]
+    cands['dm'] = dm[first]
+    cands['width'] = w[first]
+    cands['npix'] = npix
+    for name, arr, func in (('t_min', t, np.minimum), ('t_max', t, np.maximum),
+                            ('dm_min', dm, np.minimum), ('dm_max', dm, np.maximum)):
+        out = arr[first].copy()
+        func.at(out, inv, arr)
+        cands[name] = out
+    rank = np.argsort(-cands['snr'], kind='stable')
+    pos = np.empty_like(rank)
+    pos[rank] = np.arange(rank.size)
+    return pos[inv], cands[rank]
+
+
+class CandidateClusterer:
+    def __init__(self, threshold=7., t_link=2, dm_link=2, w_link=1):
+        """
+        Streaming candidate extractor. For every block, pixels above
+        threshold are clustered (see cluster_pixels) and one candidate is
+        emitted per cluster. Clusters reaching the end of a block are held
+        back, with their pixels, and clustered again with the next block,
+        so a burst straddling a block boundary gives a single candidate.
+        Pixels seen twice because of overlapping blocks are merged, and
+        overlapping samples before the region closed by the previous block
+        are ignored.
+
+        Inputs:
+            - threshold (float): SNR threshold
+            - t_link, dm_link, w_link (int): linking lengths in index steps
+        """
+        self.threshold = threshold
+        self.t_link = t_link
+        self.dm_link = dm_link
+        self.w_link = w_link
+        self._pending = None # (t, dm, w, snr) of clusters still open
+        self._closed = None # time index before which every cluster was emitted
+
+    def add_block(self, snr, start=0, width=None, final=False):
+        """
+        Extracts the candidates of a block.
+
+        Inputs:
+            - snr: array of shape (ntimes, ndm), e.g. FDMT output
+              normalized to SNR or the snr of boxcar.boxcar_search
+            - start (int): absolute time index of the first sample
+            - width: optional array of shape (ntimes, ndm) of width
+              indices (e.g. np.searchsorted(widths, boxcar width))
+            - final (bool): flush every open cluster
+        Returns:
+            - cands: structured array (CAND_DTYPE) of closed candidates,
+              with absolute time indices
+        """
+        t, dm = np.nonzero(snr > self.threshold)
+        s = snr[t, dm].astype('float32')
+        w = width[t, dm].astype('int64') if width is not None else np.zeros(t.size, dtype='int64')
+        t = t + start
+        block_end = start + snr.shape[0]
+        if self._closed is not None: # overlap with clusters already emitted
+            new = t >= self._closed
+            t, dm, w, s = t[new], dm[new], w[new], s[new]
+        if self._pending is not None and self._pending[0].size:
+            t, dm, w, s = [np.concatenate([p, x]) for p, x in zip(self._pending, (t, dm, w, s))]
+            # overlapping blocks: keep each pixel once, at its highest snr
+            coords = np.stack([t, dm, w])
+            order = np.lexsort((-s, *coords[::-1]))
+            coords, s = coords[:, order], s[order]
+            keep = np.r_[True, np.any(np.diff(coords, axis=1) != 0, axis=0)][:s.size]
+            (t, dm, w), s = coords[:, keep], s[keep]
+        labels, cands = cluster_pixels(t, dm, w, s, self.t_link, self.dm_link, self.w_link)
+        self._closed = block_end - self.t_link
+        if final:
+            self._pending = None
+            return cands
+        open_ = cands['t_max'] >= self._closed
+        keep = open_[labels]
+        self._pending = (t[keep], dm[keep], w[keep], s[keep])
+        return cands[~open_]
@@ -0,0 +1,66 @@
+# Fused time/frequency decimation of recorder data into FDMT input
+
+import numpy as np
+from reader import info_chans, total_chans
+
+
+def decimate(raw, tbin=1, fbin=1, out=None, reduce='sum', dtype='float32'):
+    """
+    Bins spectra by tbin in time and fbin in frequency in a single pass,
+    straight from the recorder's uint16 layout into the float FDMT
+    input. raw may still contain the info channels (rows of 2060, e.g.
+    a slice of reader.memmap_file); they are skipped through a strided
+    view rather than copied out first. Trailing spectra that do not
+    fill a complete time bin are dropped.
+
+    Inputs:
+        - raw: array of shape (nspec, 2060) or (nspec, 2048)
+        - tbin (int): number of spectra summed into one output sample
+        - fbin (int): number of channels summed into one output channel
+        - out: optional preallocated array of shape
+          (nspec//tbin, 2048//fbin) to write into
+        - reduce (str): 'sum' or 'mean' over each bin
+        - dtype (str): output data type
+    Returns:
+        - data: array of shape (nspec//tbin, 2048//fbin)
+    """
+    if raw.shape[1] == total_chans:
+        raw = raw[:, info_chans:] # strided view, no copy
+    nspec, nchans = raw.shape
+    assert nchans % fbin == 0, 'fbin={0} does not divide {1} channels.'.format(fbin, nchans)
+    n = nspec // tbin
+    if out is None:
+        out = np.empty((n, nchans // fbin), dtype=dtype)
+    # Integer input is accumulated exactly in uint32 over time first (a
+    # reduction over a non-contiguous axis, cheapest on narrow types),
+    # then over frequency straight into the float output.
+    acc = 'uint32' if raw.dtype.kind == 'u' and raw.dtype.itemsize <= 2 and tbin*fbin <= 2**16 else out.dtype
+    data = raw[:n*tbin]
+    if tbin > 1:
+        data = data.reshape(n, tbin, nchans).sum(axis=1, dtype=acc) # splitting axes never copies
+    if fbin > 1:
+        data.reshape(n, nchans // fbin, fbin).sum(axis=2, dtype=out.dtype, out=out)
+    else:
+        out[...] = data
+    if reduce == 'mean':
+        out *= out.dtype.type(1. / (tbin * fbin))
+    return out
+
+
+def decimate_axes(freqs, times, tbin=1, fbin=1):
+    """
+    Frequency and time axes matching the output of decimate: bin
+    centers of the original axes.
+
+    Inputs:
+        - freqs (array): channel frequencies, of size 2048
+        - times (array): spectrum times, of size nspec
+        - tbin, fbin (int): binning factors passed to decimate
+    Returns:
+        - freqs, times: decimated axes
+    """
+    freqs = np.asarray(freqs)
+    times = np.asarray(times)
+    n = times.size // tbin
+    return (freqs.reshape(-1, fbin).mean(axis=-1),
+            times[:n*tbin].reshape(n, tbin).mean(axis=-1))
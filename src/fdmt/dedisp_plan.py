@@ -0,0 +1,205 @@
+# DM-dependent time downsampling tiers (dedispersion plan)
+
+import numpy as np
+import time
+from old.fdmt import FDMT as tree_FDMT, pulse_delay, DispersionConstant
+from rfi import MAD_TO_STD
+from brute import BruteForceEngine
+
+# Within a channel of width df, a pulse at DM is smeared by the
+# difference of pulse_delay across the channel. Smearing grows linearly
+# with DM and is worst in the lowest channel, so above some DM it is
+# wider than the sampling time and full time resolution is wasted. Tier
+# k of the plan covers the DM range over which the lowest-channel
+# smearing is between tol*2^k and tol*2^(k+1) samples, and is searched
+# at a time resolution of 2^k samples.
+
+
+class TreeEngine:
+    def __init__(self, freqs, times, maxDM):
+        """
+        Adapter around the time-domain FDMT (old/fdmt.py). Its cost grows
+        with the number of delay trials, i.e. with maxDM/t_samp, which is
+        what downsampling the high-DM tiers saves.
+
+        Inputs:
+            - freqs (array)|[Hz]: channel frequencies (ascending)
+            - times (array)|[s]: sample times
+            - maxDM (float)|[pc*cm^-3]: maximum DM searched
+        """
+        self.f_min, self.f_max = freqs[0]/1e6, freqs[-1]/1e6 # [MHz]
+        self.t_samp = (times[1] - times[0])*1e3 # [ms]
+        span = pulse_delay(self.f_min, maxDM) - pulse_delay(self.f_max, maxDM)
+        self.maxDT = int(np.ceil(span/self.t_samp)) + 1
+        self.dms = np.arange(self.maxDT)*self.t_samp/(DispersionConstant*(self.f_min**-2 - self.f_max**-2))
+        self.ntimes = times.size
+        self.nfreqs = freqs.size
+        # output times are arrivals at the bottom of the band; shift to the top
+        self.t_offset = -(pulse_delay(self.f_min, self.dms) - pulse_delay(self.f_max, self.dms))*1e-3 # [s]
+
+    def apply(self, block):
+        return tree_FDMT(np.ascontiguousarray(block.T), self.f_min, self.f_max, self.maxDT, 'float32').T
+
+    def cost(self):
+        return self.ntimes * self.maxDT * np.log2(self.nfreqs)
+
+
+class HomebrewEngine:
+    def __init__(self, freqs, times, maxDM):
+        """
+        Adapter around the FFT-based fdmt_homebrew.FDMT, whose cost does
+        not depend on maxDM: tiers only save the time-axis work.
+        """
+        from fdmt_homebrew import FDMT
+        self.fdmt = FDMT(freqs=freqs, times=times, maxDM=maxDM)
+        self.dms = np.linspace(0, maxDM, freqs.size)
+        self.t_offset = np.zeros(freqs.size) # output times are arrivals at the top of the band
+        self.ntimes = times.size
+        self.nfreqs = freqs.size
+
+    def apply(self, block):
+        return self.fdmt.apply(block)
+
+    def cost(self):
+        return self.ntimes * np.log2(self.ntimes) * self.nfreqs * np.log2(self.nfreqs)
+
+
+ENGINES = {'tree': TreeEngine, 'homebrew': HomebrewEngine, 'brute': BruteForceEngine}
+
+
+class DedispersionPlan:
+    def __init__(self, freqs, t_samp, ntimes, max_DM=500, tol=1., max_k=6, engine='tree'):
+        """
+        Splits the 0 - max_DM search into tiers searched at time
+        resolutions of 2^k samples, according to the intra-channel
+        smearing at each DM.
+
+        Inputs:
+            - freqs (array)|[Hz]: channel frequencies (ascending)
+            - t_samp (float)|[s]: sampling time
+            - ntimes (int): number of samples per block (divisible by 2^max_k)
+            - max_DM (float)|[pc*cm^-3]: maximum DM searched
+            - tol (float): smearing, in units of the tier sampling time,
+              at which the next tier starts
+            - max_k (int): largest downsampling exponent
+            - engine (str): 'tree' (old/fdmt.py), 'homebrew' (fdmt_homebrew)
+              or 'brute' (brute.py)
+        """
+        self.freqs = np.asarray(freqs, dtype='float64')
+        self.t_samp = t_samp
+        self.ntimes = ntimes
+        self.max_DM = max_DM
+        self.engine = engine
+        self.df = abs(self.freqs[1] - self.freqs[0])
+        # smearing in the lowest channel at DM=1 [s]
+        f_lo = self.freqs.min()
+        self.smear_per_dm = (pulse_delay((f_lo - self.df/2)/1e6, 1.) - pulse_delay((f_lo + self.df/2)/1e6, 1.))*1e-3
+
+        self.tiers = [] # (k, DM_lo, DM_hi)
+        lo = 0.
+        for k in range(max_k + 1):
+            hi = tol * 2**(k+1) * t_samp / self.smear_per_dm if k < max_k else np.inf
+            hi = min(hi, max_DM)
+            if hi > lo:
+                self.tiers.append((k, lo, hi))
+            lo = hi
+            if lo >= max_DM:
+                break
+        k_max = self.tiers[-1][0]
+        assert ntimes % 2**k_max == 0, 'ntimes must be divisible by 2^{0}'.format(k_max)
+        self._engines = {}
+
+    def smearing(self, DM):
+        """
+        Intra-channel smearing [s] in the lowest channel at DM.
+        """
+        return self.smear_per_dm * np.asarray(DM)
+
+    def _engine(self, k, hi):
+        if k not in self._engines:
+            times = np.arange(self.ntimes // 2**k) * self.t_samp * 2**k
+            self._engines[k] = ENGINES[self.engine](self.freqs, times, hi)
+        return self._engines[k]
+
+    def estimated_speedup(self):
+        """
+        Cost of a single full-resolution 0 - max_DM search over the summed
+        cost of the tiers, using the engine's cost model.
+        """
+        times = np.arange(self.ntimes) * self.t_samp
+        full = ENGINES[self.engine](self.freqs, times, self.max_DM).cost()
+        tiered = sum(self._engine(k, hi).cost() for k, lo, hi in self.tiers)
+        return full / tiered
+
+    def summary(self):
+        """
+        Prints the tiers of the plan.
+        """
+        print('Dedispersion plan ({0} engine): smearing {1:.2f} us per unit DM in the lowest channel'.format(
+            self.engine, 1e6*self.smear_per_dm))
+        for k, lo, hi in self.tiers:
+            print('  tier {0}: DM {1:7.2f} - {2:7.2f}, t_samp = {3:.3g} ms (x{4}), smearing up to {5:.3g} ms'.format(
+                k, lo, hi, 1e3*self.t_samp*2**k, 2**k, 1e3*self.smearing(hi)))
+        print('Estimated speedup: {0:.2f}x'.format(self.estimated_speedup()))
+
+    def run(self, data, threshold=7., max_cands=1000, dt_tol=None, dm_tol=None, timing=False):
+        """
+        Searches a block tier by tier and merges the candidates.
+
+        Inputs:
+            - data: float32 array of shape (ntimes, nfreqs)
+            - threshold (float): detection threshold in robust sigmas of
+              each DM trial's time series
+            - max_cands (int): maximum number of pixels kept per tier
+            - dt_tol (float)|[s]: candidates closer than dt_tol in time
+              and dm_tol in DM are merged. Default is 4 samples of the
+              coarsest tier.
+            - dm_tol (float)|[pc*cm^-3]: default is 5% of max_DM
+            - timing (bool): also time a full-resolution search and
+              report the measured speedup
+        Returns:
+            - candidates: list of (snr, time [s], DM, k) sorted by snr,
+              where time is the arrival at the top of the band
+        """
+        if dt_tol is None:
+            dt_tol = 4 * self.t_samp * 2**self.tiers[-1][0]
+        if dm_tol is None:
+            dm_tol = 0.05 * self.max_DM
+        cands = []
+        block = np.asarray(data, dtype='float32')
+        level = 0
+        start = time.perf_counter()
+        for k, lo, hi in self.tiers:
+            while level < k: # halve the time resolution
+                block = block[0::2] + block[1::2]
+                level += 1
+            engine = self._engine(k, hi)
+            dmt = engine.apply(block)
+            keep = (engine.dms >= lo) & (engine.dms <= hi)
+            dmt, dms, t_offset = dmt[:, keep], engine.dms[keep], engine.t_offset[keep]
+            med = np.median(dmt, axis=0)
+            std = MAD_TO_STD * np.median(np.abs(dmt - med), axis=0)
+            snr = (dmt - med) / np.where(std > 0, std, np.inf)
+            flat = snr.ravel()
+            idx = np.flatnonzero(flat > threshold)
+            if idx.size > max_cands:
+                idx = idx[np.argpartition(flat[idx], -max_cands)[-max_cands:]]
+            t, d = np.unravel_index(idx, snr.shape)
+            cands.extend(zip(flat[idx].tolist(), (t * self.t_samp * 2**k + t_offset[d]).tolist(), dms[d].tolist(), [k]*idx.size))
+        elapsed = time.perf_counter() - start
+
+        cands.sort(key=lambda c: -c[0])
+        merged = [] # greedy: keep the brightest candidate of every neighbourhood
+        for c in cands:
+            if all(abs(c[1] - m[1]) > dt_tol or abs(c[2] - m[2]) > dm_tol for m in merged):
+                merged.append(c)
+
+        if timing:
+            times = np.arange(self.ntimes) * self.t_samp
+            full = ENGINES[self.engine](self.freqs, times, self.max_DM)
+            t0 = time.perf_counter()
+            full.apply(np.asarray(data, dtype='float32'))
+            full_elapsed = time.perf_counter() - t0
+            print('Tiered search: {0:.3f} s, full-resolution search: {1:.3f} s'.format(elapsed, full_elapsed))
+            print('Measured speedup: {0:.2f}x (estimated {1:.2f}x)'.format(full_elapsed/elapsed, self.estimated_speedup()))
+        return merged
@@ -0,0 +1,107 @@
+# Dispersion delays and memoized integer shift tables
+
+import numpy as np
+from collections import OrderedDict
+import threading
+
+# Single dispersion constant for the whole package (dedispersion,
+# simulations and the sweep generator). 4.148808e15 s Hz^2 / (pc cm^-3)
+# is 4.148808e6 ms MHz^2, the value used by the tree FDMT
+# (old/fdmt.py); the 4140e12 that some modules used is a rounded version.
+DM_CONST = 4.148808e15 # s Hz^2 / (pc cm^-3)
+
+
+def dm_delay(DM, freq):
+    """
+    Dispersion delay of a pulse at a given frequency, relative to
+    infinite frequency.
+
+    Inputs:
+        - DM (float or array)|[pc*cm^-3]: dispersion measure
+        - freq (float or array)|[Hz]: frequency
+    Returns: pulse time delay [s]
+    """
+    return DM_CONST * DM / np.asarray(freq, dtype='float64')**2
+
+
+class DelayTables:
+    def __init__(self, maxsize=32):
+        """
+        Least-recently-used cache of integer shift tables. A table holds,
+        for every DM trial and channel, the delay relative to a reference
+        frequency rounded to samples, stored as int16 when it fits and
+        int32 otherwise. Tables are read-only and shared by every caller
+        asking for the same (freqs, t_samp, DM grid, reference).
+
+        Inputs:
+            - maxsize (int): number of tables kept
+        """
+        self.maxsize = maxsize
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(freqs, t_samp, dms, ref):
+        # the raw bytes, not their hash: the dict compares keys on a hit,
+        # so a hash collision cannot return another grid's table
+        return (freqs.tobytes(), float(t_samp), dms.tobytes(), ref)
+
+    def table(self, freqs, t_samp, dms, ref='top'):
+        """
+        Integer shift table of a DM grid.
+
+        Inputs:
+            - freqs (array)|[Hz]: channel frequencies
+            - t_samp (float)|[s]: sampling time
+            - dms (float or array)|[pc*cm^-3]: DM trials
+            - ref (str or float): reference frequency, 'top' (highest
+              channel), 'bottom' (lowest channel) or a frequency [Hz]
+              (np.inf for delays relative to infinite frequency)
+        Returns:
+            - shifts: read-only int16/int32 array of shape (ndm, nfreqs),
+              (nfreqs,) for a scalar DM
+        """
+        freqs = np.ascontiguousarray(freqs, dtype='float64')
+        scalar = np.ndim(dms) == 0
+        dms = np.atleast_1d(np.asarray(dms, dtype='float64'))
+        key = self._key(freqs, t_samp, dms, ref)
+        with self._lock:
+            if key in self._tables:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                shifts = self._tables[key]
+                return shifts[0] if scalar else shifts
+            self.misses += 1
+        if ref == 'top':
+            f_ref = freqs.max()
+        elif ref == 'bottom':
+            f_ref = freqs.min()
+        else:
+            f_ref = float(ref)
+        shifts = np.round((dm_delay(dms[:, None], freqs) - dm_delay(dms[:, None], f_ref)) / t_samp)
+        lim = np.abs(shifts).max() if shifts.size else 0
+        shifts = shifts.astype('int16' if lim < 2**15 else 'int32')
+        shifts.flags.writeable = False
+        with self._lock:
+            self._tables[key] = shifts
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+        return shifts[0] if scalar else shifts
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+    def info(self):
+        """
+        Returns (hits, misses, number of tables, bytes held).
+        """
+        with self._lock:
+            return self.hits, self.misses, len(self._tables), sum(t.nbytes for t in self._tables.values())
+
+
+# Shared by every module of the package
+TABLES = DelayTables()
+shift_table = TABLES.table
@@ -1652,6 +1652,9 @@ static PyTypeObject *__Pyx_ImportType(PyObject* module, const char *module_name,
 /* Import.proto */
 static PyObject *__Pyx_Import(PyObject *name, PyObject *from_list, int level);
 
+/* ImportFrom.proto */
+static PyObject* __Pyx_ImportFrom(PyObject* module, PyObject* name);
+
 /* FetchCommonType.proto */
 static PyTypeObject* __Pyx_FetchCommonType(PyTypeObject* type);
 
@@ -2023,6 +2026,7 @@ static const char __pyx_k_float32[] = "float32";
 static const char __pyx_k_phs_sum[] = "phs_sum";
 static const char __pyx_k_prepare[] = "__prepare__";
 static const char __pyx_k_profile[] = "profile";
+static const char __pyx_k_DM_CONST[] = "DM_CONST";
 static const char __pyx_k_DM_delay[] = "DM_delay";
 static const char __pyx_k_qualname[] = "__qualname__";
 static const char __pyx_k_rfftfreq[] = "rfftfreq";
@@ -2040,6 +2044,7 @@ static const char __pyx_k_numpy_core_multiarray_failed_to[] = "numpy.core.multia
 static const char __pyx_k_numpy_core_umath_failed_to_impor[] = "numpy.core.umath failed to import";
 static PyObject *__pyx_n_s_CONST;
 static PyObject *__pyx_n_s_DM;
+static PyObject *__pyx_n_s_DM_CONST;
 static PyObject *__pyx_n_s_DM_delay;
 static PyObject *__pyx_n_s_FDMT;
 static PyObject *__pyx_n_s_FDMT___init;
@@ -2112,7 +2117,6 @@ static PyObject *__pyx_pf_13fdmt_homebrew_2phs_sum(CYTHON_UNUSED PyObject *__pyx
 static PyObject *__pyx_pf_13fdmt_homebrew_4FDMT___init__(CYTHON_UNUSED PyObject *__pyx_self, PyObject *__pyx_v_self, PyObject *__pyx_v_freqs, PyObject *__pyx_v_times, PyObject *__pyx_v_maxDM, PyObject *__pyx_v_dtype, PyObject *__pyx_v_cdtype); /* proto */
 static PyObject *__pyx_pf_13fdmt_homebrew_4FDMT_2phs_sum(CYTHON_UNUSED PyObject *__pyx_self, CYTHON_UNUSED PyObject *__pyx_v_self, PyObject *__pyx_v_d, PyObject *__pyx_v_phs); /* proto */
 static PyObject *__pyx_pf_13fdmt_homebrew_4FDMT_4apply(CYTHON_UNUSED PyObject *__pyx_self, PyObject *__pyx_v_self, PyObject *__pyx_v_profile); /* proto */
-static PyObject *__pyx_float_4140e12;
 static PyObject *__pyx_int_0;
 static PyObject *__pyx_int_1;
 static PyObject *__pyx_int_2;
@@ -5163,6 +5167,7 @@ static struct PyModuleDef __pyx_moduledef = {
 static __Pyx_StringTabEntry __pyx_string_tab[] = {
   {&__pyx_n_s_CONST, __pyx_k_CONST, sizeof(__pyx_k_CONST), 0, 0, 1, 1},
   {&__pyx_n_s_DM, __pyx_k_DM, sizeof(__pyx_k_DM), 0, 0, 1, 1},
+  {&__pyx_n_s_DM_CONST, __pyx_k_DM_CONST, sizeof(__pyx_k_DM_CONST), 0, 0, 1, 1},
   {&__pyx_n_s_DM_delay, __pyx_k_DM_delay, sizeof(__pyx_k_DM_delay), 0, 0, 1, 1},
   {&__pyx_n_s_FDMT, __pyx_k_FDMT, sizeof(__pyx_k_FDMT), 0, 0, 1, 1},
   {&__pyx_n_s_FDMT___init, __pyx_k_FDMT___init, sizeof(__pyx_k_FDMT___init), 0, 0, 1, 1},
@@ -5369,7 +5374,6 @@ static CYTHON_SMALL_CODE int __Pyx_InitCachedConstants(void) {
 
 static CYTHON_SMALL_CODE int __Pyx_InitGlobals(void) {
   if (__Pyx_InitStrings(__pyx_string_tab) < 0) __PYX_ERR(0, 1, __pyx_L1_error);
-  __pyx_float_4140e12 = PyFloat_FromDouble(4140e12); if (unlikely(!__pyx_float_4140e12)) __PYX_ERR(0, 1, __pyx_L1_error)
   __pyx_int_0 = PyInt_FromLong(0); if (unlikely(!__pyx_int_0)) __PYX_ERR(0, 1, __pyx_L1_error)
   __pyx_int_1 = PyInt_FromLong(1); if (unlikely(!__pyx_int_1)) __PYX_ERR(0, 1, __pyx_L1_error)
   __pyx_int_2 = PyInt_FromLong(2); if (unlikely(!__pyx_int_2)) __PYX_ERR(0, 1, __pyx_L1_error)
@@ -5701,7 +5705,7 @@ if (!__Pyx_RefNanny) {
  * cimport numpy as np
  * import numpy as np             # <<<<<<<<<<<<<<
  * 
- * CONST = 4140e12 # s Hz^2 / (pc / cm^3)
+ * from delays import DM_CONST as CONST # s Hz^2 / (pc / cm^3)
  */
   __pyx_t_1 = __Pyx_Import(__pyx_n_s_numpy, 0, -1); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 3, __pyx_L1_error)
   __Pyx_GOTREF(__pyx_t_1);
@@ -5711,11 +5715,23 @@ if (!__Pyx_RefNanny) {
   /* "fdmt_homebrew.pyx":5
  * import numpy as np
  * 
- * CONST = 4140e12 # s Hz^2 / (pc / cm^3)             # <<<<<<<<<<<<<<
+ * from delays import DM_CONST as CONST # s Hz^2 / (pc / cm^3)             # <<<<<<<<<<<<<<
  * 
  * 
  */
-  if (PyDict_SetItem(__pyx_d, __pyx_n_s_CONST, __pyx_float_4140e12) < 0) __PYX_ERR(0, 5, __pyx_L1_error)
+  __pyx_t_1 = PyList_New(1); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 5, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_1);
+  __Pyx_INCREF(__pyx_n_s_DM_CONST);
+  __Pyx_GIVEREF(__pyx_n_s_DM_CONST);
+  PyList_SET_ITEM(__pyx_t_1, 0, __pyx_n_s_DM_CONST);
+  __pyx_t_2 = __Pyx_Import(__pyx_n_s_delays, __pyx_t_1, -1); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 5, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_2);
+  __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
+  __pyx_t_1 = __Pyx_ImportFrom(__pyx_t_2, __pyx_n_s_DM_CONST); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 5, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_1);
+  if (PyDict_SetItem(__pyx_d, __pyx_n_s_CONST, __pyx_t_1) < 0) __PYX_ERR(0, 5, __pyx_L1_error)
+  __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
+  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
 
   /* "fdmt_homebrew.pyx":8
  * 
@@ -5724,10 +5740,10 @@ if (!__Pyx_RefNanny) {
  *     return np.float32(DM * CONST) / freq**2
  * 
  */
-  __pyx_t_1 = PyCFunction_NewEx(&__pyx_mdef_13fdmt_homebrew_1DM_delay, NULL, __pyx_n_s_fdmt_homebrew); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 8, __pyx_L1_error)
-  __Pyx_GOTREF(__pyx_t_1);
-  if (PyDict_SetItem(__pyx_d, __pyx_n_s_DM_delay, __pyx_t_1) < 0) __PYX_ERR(0, 8, __pyx_L1_error)
-  __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
+  __pyx_t_2 = PyCFunction_NewEx(&__pyx_mdef_13fdmt_homebrew_1DM_delay, NULL, __pyx_n_s_fdmt_homebrew); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 8, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_2);
+  if (PyDict_SetItem(__pyx_d, __pyx_n_s_DM_delay, __pyx_t_2) < 0) __PYX_ERR(0, 8, __pyx_L1_error)
+  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
 
   /* "fdmt_homebrew.pyx":12
  * 
@@ -5736,10 +5752,10 @@ if (!__Pyx_RefNanny) {
  *             np.ndarray[np.complex64_t, ndim=2] p):
  *     cdef int i, j
  */
-  __pyx_t_1 = PyCFunction_NewEx(&__pyx_mdef_13fdmt_homebrew_3phs_sum, NULL, __pyx_n_s_fdmt_homebrew); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 12, __pyx_L1_error)
-  __Pyx_GOTREF(__pyx_t_1);
-  if (PyDict_SetItem(__pyx_d, __pyx_n_s_phs_sum, __pyx_t_1) < 0) __PYX_ERR(0, 12, __pyx_L1_error)
-  __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
+  __pyx_t_2 = PyCFunction_NewEx(&__pyx_mdef_13fdmt_homebrew_3phs_sum, NULL, __pyx_n_s_fdmt_homebrew); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 12, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_2);
+  if (PyDict_SetItem(__pyx_d, __pyx_n_s_phs_sum, __pyx_t_2) < 0) __PYX_ERR(0, 12, __pyx_L1_error)
+  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
 
   /* "fdmt_homebrew.pyx":25
  * 
@@ -5748,8 +5764,8 @@ if (!__Pyx_RefNanny) {
  *     def __init__(self, freqs, times, maxDM=500, dtype='float32', cdtype='complex64'):
  *         self.cache = {}
  */
-  __pyx_t_1 = __Pyx_Py3MetaclassPrepare((PyObject *) NULL, __pyx_empty_tuple, __pyx_n_s_FDMT, __pyx_n_s_FDMT, (PyObject *) NULL, __pyx_n_s_fdmt_homebrew, (PyObject *) NULL); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 25, __pyx_L1_error)
-  __Pyx_GOTREF(__pyx_t_1);
+  __pyx_t_2 = __Pyx_Py3MetaclassPrepare((PyObject *) NULL, __pyx_empty_tuple, __pyx_n_s_FDMT, __pyx_n_s_FDMT, (PyObject *) NULL, __pyx_n_s_fdmt_homebrew, (PyObject *) NULL); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 25, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_2);
 
   /* "fdmt_homebrew.pyx":26
  * 
@@ -5758,11 +5774,11 @@ if (!__Pyx_RefNanny) {
  *         self.cache = {}
  *         self.dtype = dtype
  */
-  __pyx_t_2 = __Pyx_CyFunction_New(&__pyx_mdef_13fdmt_homebrew_4FDMT_1__init__, 0, __pyx_n_s_FDMT___init, NULL, __pyx_n_s_fdmt_homebrew, __pyx_d, ((PyObject *)__pyx_codeobj__13)); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 26, __pyx_L1_error)
-  __Pyx_GOTREF(__pyx_t_2);
-  __Pyx_CyFunction_SetDefaultsTuple(__pyx_t_2, __pyx_tuple__14);
-  if (__Pyx_SetNameInClass(__pyx_t_1, __pyx_n_s_init, __pyx_t_2) < 0) __PYX_ERR(0, 26, __pyx_L1_error)
-  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
+  __pyx_t_1 = __Pyx_CyFunction_New(&__pyx_mdef_13fdmt_homebrew_4FDMT_1__init__, 0, __pyx_n_s_FDMT___init, NULL, __pyx_n_s_fdmt_homebrew, __pyx_d, ((PyObject *)__pyx_codeobj__13)); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 26, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_1);
+  __Pyx_CyFunction_SetDefaultsTuple(__pyx_t_1, __pyx_tuple__14);
+  if (__Pyx_SetNameInClass(__pyx_t_2, __pyx_n_s_init, __pyx_t_1) < 0) __PYX_ERR(0, 26, __pyx_L1_error)
+  __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
 
   /* "fdmt_homebrew.pyx":42
  *             self.cache[i] = phs.astype(cdtype)
@@ -5771,10 +5787,10 @@ if (!__Pyx_RefNanny) {
  *         phs_sum(d, phs)
  *         return [d[:,0::2], d[:,1::2]]
  */
-  __pyx_t_2 = __Pyx_CyFunction_New(&__pyx_mdef_13fdmt_homebrew_4FDMT_3phs_sum, 0, __pyx_n_s_FDMT_phs_sum, NULL, __pyx_n_s_fdmt_homebrew, __pyx_d, ((PyObject *)__pyx_codeobj__16)); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 42, __pyx_L1_error)
-  __Pyx_GOTREF(__pyx_t_2);
-  if (__Pyx_SetNameInClass(__pyx_t_1, __pyx_n_s_phs_sum, __pyx_t_2) < 0) __PYX_ERR(0, 42, __pyx_L1_error)
-  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
+  __pyx_t_1 = __Pyx_CyFunction_New(&__pyx_mdef_13fdmt_homebrew_4FDMT_3phs_sum, 0, __pyx_n_s_FDMT_phs_sum, NULL, __pyx_n_s_fdmt_homebrew, __pyx_d, ((PyObject *)__pyx_codeobj__16)); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 42, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_1);
+  if (__Pyx_SetNameInClass(__pyx_t_2, __pyx_n_s_phs_sum, __pyx_t_1) < 0) __PYX_ERR(0, 42, __pyx_L1_error)
+  __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
 
   /* "fdmt_homebrew.pyx":46
  *         return [d[:,0::2], d[:,1::2]]
@@ -5783,10 +5799,10 @@ if (!__Pyx_RefNanny) {
  *         self._data = np.fft.rfft(profile, axis=0).astype(self.cdtype)
  *         ans = [self._data]
  */
-  __pyx_t_2 = __Pyx_CyFunction_New(&__pyx_mdef_13fdmt_homebrew_4FDMT_5apply, 0, __pyx_n_s_FDMT_apply, NULL, __pyx_n_s_fdmt_homebrew, __pyx_d, ((PyObject *)__pyx_codeobj__18)); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 46, __pyx_L1_error)
-  __Pyx_GOTREF(__pyx_t_2);
-  if (__Pyx_SetNameInClass(__pyx_t_1, __pyx_n_s_apply, __pyx_t_2) < 0) __PYX_ERR(0, 46, __pyx_L1_error)
-  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
+  __pyx_t_1 = __Pyx_CyFunction_New(&__pyx_mdef_13fdmt_homebrew_4FDMT_5apply, 0, __pyx_n_s_FDMT_apply, NULL, __pyx_n_s_fdmt_homebrew, __pyx_d, ((PyObject *)__pyx_codeobj__18)); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 46, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_1);
+  if (__Pyx_SetNameInClass(__pyx_t_2, __pyx_n_s_apply, __pyx_t_1) < 0) __PYX_ERR(0, 46, __pyx_L1_error)
+  __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
 
   /* "fdmt_homebrew.pyx":25
  * 
@@ -5795,21 +5811,21 @@ if (!__Pyx_RefNanny) {
  *     def __init__(self, freqs, times, maxDM=500, dtype='float32', cdtype='complex64'):
  *         self.cache = {}
  */
-  __pyx_t_2 = __Pyx_Py3ClassCreate(((PyObject*)&__Pyx_DefaultClassType), __pyx_n_s_FDMT, __pyx_empty_tuple, __pyx_t_1, NULL, 0, 1); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 25, __pyx_L1_error)
-  __Pyx_GOTREF(__pyx_t_2);
-  if (PyDict_SetItem(__pyx_d, __pyx_n_s_FDMT, __pyx_t_2) < 0) __PYX_ERR(0, 25, __pyx_L1_error)
-  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
+  __pyx_t_1 = __Pyx_Py3ClassCreate(((PyObject*)&__Pyx_DefaultClassType), __pyx_n_s_FDMT, __pyx_empty_tuple, __pyx_t_2, NULL, 0, 1); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 25, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_1);
+  if (PyDict_SetItem(__pyx_d, __pyx_n_s_FDMT, __pyx_t_1) < 0) __PYX_ERR(0, 25, __pyx_L1_error)
   __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
+  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
 
   /* "fdmt_homebrew.pyx":1
  * import cython             # <<<<<<<<<<<<<<
  * cimport numpy as np
  * import numpy as np
  */
-  __pyx_t_1 = __Pyx_PyDict_NewPresized(0); if (unlikely(!__pyx_t_1)) __PYX_ERR(0, 1, __pyx_L1_error)
-  __Pyx_GOTREF(__pyx_t_1);
-  if (PyDict_SetItem(__pyx_d, __pyx_n_s_test, __pyx_t_1) < 0) __PYX_ERR(0, 1, __pyx_L1_error)
-  __Pyx_DECREF(__pyx_t_1); __pyx_t_1 = 0;
+  __pyx_t_2 = __Pyx_PyDict_NewPresized(0); if (unlikely(!__pyx_t_2)) __PYX_ERR(0, 1, __pyx_L1_error)
+  __Pyx_GOTREF(__pyx_t_2);
+  if (PyDict_SetItem(__pyx_d, __pyx_n_s_test, __pyx_t_2) < 0) __PYX_ERR(0, 1, __pyx_L1_error)
+  __Pyx_DECREF(__pyx_t_2); __pyx_t_2 = 0;
 
   /* "../../.venv/lib/python3.9/site-packages/numpy/__init__.pxd":1013
  * 
@@ -7576,6 +7592,20 @@ bad:
     return module;
 }
 
+/* ImportFrom */
+  static PyObject* __Pyx_ImportFrom(PyObject* module, PyObject* name) {
+    PyObject* value = __Pyx_PyObject_GetAttrStr(module, name);
+    if (unlikely(!value) && PyErr_ExceptionMatches(PyExc_AttributeError)) {
+        PyErr_Format(PyExc_ImportError,
+        #if PY_MAJOR_VERSION < 3
+            "cannot import name %.230s", PyString_AS_STRING(name));
+        #else
+            "cannot import name %S", name);
+        #endif
+    }
+    return value;
+}
+
 /* FetchCommonType */
   static PyTypeObject* __Pyx_FetchCommonType(PyTypeObject* type) {
     PyObject* fake_module;
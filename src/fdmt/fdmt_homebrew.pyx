@@ -2,7 +2,7 @@ import cython
 cimport numpy as np
 import numpy as np
 
-CONST = 4140e12 # s Hz^2 / (pc / cm^3)
+from delays import DM_CONST as CONST # s Hz^2 / (pc / cm^3)
 
 
 def DM_delay(DM, freq):
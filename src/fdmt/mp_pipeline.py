@@ -0,0 +1,208 @@
+# Multi-process detection pipeline over a ring of shared-memory blocks
+
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import traceback
+from reader import iter_blocks, fchans
+
+# Blocks never travel between processes. Each stage runs in its own
+# process and only passes (seq, slot) integers along the queues; the
+# data itself lives in a ring of nslots shared-memory buffers. A slot
+# is handed back to the reader once the candidate stage is done with it.
+#
+#   reader -> rfi -> normalize -> FDMT workers (x nworkers) -> candidates
+#
+# The FDMT workers finish blocks out of order; the candidate stage
+# reassembles them by sequence number.
+
+
+class FDMTFactory:
+    def __init__(self, freqs, times, maxDM=500):
+        """
+        Picklable recipe for the FDMT engine built inside each worker
+        process (the Cython FDMT itself cannot be sent between processes).
+        """
+        self.freqs = freqs
+        self.times = times
+        self.maxDM = maxDM
+
+    def __call__(self):
+        from fdmt_homebrew import FDMT
+        return FDMT(freqs=self.freqs, times=self.times, maxDM=self.maxDM)
+
+
+def argmax_candidate(dmt, start):
+    """
+    Default candidate stage: the brightest DM-time pixel of the block.
+    Returns (value, time index in file, DM index).
+    """
+    t0, dm0 = np.unravel_index(np.argmax(dmt, axis=None), dmt.shape)
+    return float(dmt[t0, dm0]), int(start + t0), int(dm0)
+
+
+class _Ring:
+    def __init__(self, nslots, shape, dtype, name=None):
+        size = nslots * int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.slots = np.ndarray((nslots,) + tuple(shape), dtype=dtype, buffer=self.shm.buf)
+
+    def close(self):
+        del self.slots
+        self.shm.close()
+
+
+def _stage(target, errors, *args):
+    try:
+        target(*args)
+    except Exception:
+        errors.put(traceback.format_exc())
+
+
+def _reader(file_path, block_size, overlap, tbin, fbin, ring_spec, free, q_out, nout):
+    ring = _Ring(*ring_spec)
+    slot = [None]
+
+    def out():
+        slot[0] = free.get()
+        return ring.slots[slot[0]]
+
+    for seq, (start, block) in enumerate(iter_blocks(file_path, block_size, overlap, out=out, tbin=tbin, fbin=fbin)):
+        q_out.put((seq, start, slot[0]))
+    for i in range(nout):
+        q_out.put(None)
+    ring.close()
+
+
+def _inplace(func, ring_spec, q_in, q_out, nout):
+    ring = _Ring(*ring_spec)
+    while True:
+        item = q_in.get()
+        if item is None:
+            break
+        seq, start, slot = item
+        func(ring.slots[slot], start)
+        q_out.put(item)
+    for i in range(nout):
+        q_out.put(None)
+    ring.close()
+
+
+def _dedisperse(factory, ring_spec, out_spec, q_in, q_out):
+    ring, out = _Ring(*ring_spec), _Ring(*out_spec)
+    engine = factory()
+    while True:
+        item = q_in.get()
+        if item is None:
+            break
+        seq, start, slot = item
+        out.slots[slot] = engine.apply(ring.slots[slot])
+        q_out.put(item)
+    q_out.put(None)
+    ring.close()
+    out.close()
+
+
+def _candidates(func, out_spec, q_in, free, results, nworkers):
+    out = _Ring(*out_spec)
+    pending = {}
+    next_seq = 0
+    done = 0
+    while done < nworkers:
+        item = q_in.get()
+        if item is None:
+            done += 1
+            continue
+        pending[item[0]] = item
+        while next_seq in pending: # ordered reassembly
+            seq, start, slot = pending.pop(next_seq)
+            results.put((seq, start, func(out.slots[slot], start)))
+            free.put(slot)
+            next_seq += 1
+    results.put(None)
+    out.close()
+
+
+def run_pipeline(file_path, engine_factory, block_size, overlap=0, nworkers=2, nslots=None,
+                 rfi=None, normalize=None, find_candidates=argmax_candidate, out_shape=None, tbin=1, fbin=1):
+    """
+    Runs read -> RFI mask -> normalize -> dedisperse -> find candidates
+    with every stage in its own process and nworkers FDMT processes
+    dedispersing blocks in parallel. Blocks are passed through a ring of
+    shared-memory buffers, so no array is ever pickled.
+
+    Inputs:
+        - file_path (str): Data file path. Must be binary data file (.dat)
+        - engine_factory: picklable callable returning an object with an
+          apply(block) method, e.g. FDMTFactory(freqs, times, maxDM)
+        - block_size (int): number of spectra per block
+        - overlap (int): number of spectra shared by consecutive blocks
+        - nworkers (int): number of FDMT worker processes
+        - nslots (int): number of shared-memory buffers in the ring.
+          Default is 2*nworkers + 2.
+        - rfi, normalize: picklable functions f(block, start) modifying
+          a (block_size, 2048//fbin) float32 block in place, or None to skip
+        - find_candidates: picklable function f(dmt, start) returning a
+          picklable summary of a DM-time block
+        - out_shape (tuple): shape of the engine output. Default is
+          (block_size, 2048//fbin), that of FDMT.apply.
+        - tbin, fbin (int): time and frequency binning factors applied
+          by the reader (see decimate.decimate)
+    Yields:
+        - (start, candidates) for every block, in file order
+    """
+    if nslots is None:
+        nslots = 2*nworkers + 2
+    nchans = fchans // fbin
+    if out_shape is None:
+        out_shape = (block_size, nchans)
+    ring = _Ring(nslots, (block_size, nchans), 'float32')
+    out = _Ring(nslots, out_shape, 'float32')
+    ring_spec = (nslots, (block_size, nchans), 'float32', ring.name)
+    out_spec = (nslots, out_shape, 'float32', out.name)
+
+    free, results, errors = mp.Queue(), mp.Queue(), mp.Queue()
+    for i in range(nslots):
+        free.put(i)
+    stages = [f for f in (rfi, normalize) if f is not None]
+    queues = [mp.Queue(maxsize=nslots) for i in range(len(stages) + 2)]
+    procs = [mp.Process(target=_stage, args=(_reader, errors, file_path, block_size, overlap, tbin, fbin, ring_spec,
+                                             free, queues[0], 1 if stages else nworkers))]
+    for i, func in enumerate(stages):
+        nout = 1 if i < len(stages) - 1 else nworkers
+        procs.append(mp.Process(target=_stage, args=(_inplace, errors, func, ring_spec, queues[i], queues[i+1], nout)))
+    for i in range(nworkers):
+        procs.append(mp.Process(target=_stage, args=(_dedisperse, errors, engine_factory, ring_spec, out_spec,
+                                                     queues[-2], queues[-1])))
+    procs.append(mp.Process(target=_stage, args=(_candidates, errors, find_candidates, out_spec,
+                                                 queues[-1], free, results, nworkers)))
+    for p in procs:
+        p.daemon = True
+        p.start()
+    try:
+        while True:
+            try:
+                item = results.get(timeout=0.5)
+            except Exception: # queue.Empty
+                if not errors.empty():
+                    raise RuntimeError('Pipeline stage failed:\n' + errors.get())
+                if not any(p.is_alive() for p in procs):
+                    raise RuntimeError('Pipeline stopped without finishing.')
+                continue
+            if item is None:
+                break
+            seq, start, cands = item
+            yield start, cands
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+        ring.close()
+        out.close()
+        ring.shm.unlink()
+        out.shm.unlink()
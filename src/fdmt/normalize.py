@@ -0,0 +1,88 @@
+# Incremental per-channel bandpass normalization
+
+import numpy as np
+
+
+class BandpassNormalizer:
+    def __init__(self, nchans=2048, mode='welford', alpha=0.05, eps=1e-6):
+        """
+        Flattens the bandpass of a stream of blocks of shape (nspec, nchans)
+        so that every channel has zero mean and unit variance, without a
+        second pass over the data. Per-channel mean and variance are
+        updated incrementally with each block, then the block is
+        normalized in place.
+
+        Two update rules are available:
+            - 'welford': exact running mean/variance of everything seen
+              so far, merging each block's statistics with the parallel
+              form of Welford's algorithm (Chan et al. 1979)
+            - 'ema': exponentially weighted mean/variance, which tracks
+              a slowly drifting bandpass; alpha is the weight of the
+              newest block
+
+        Inputs:
+            - nchans (int): number of frequency channels
+            - mode (str): 'welford' or 'ema'
+            - alpha (float): EMA weight of the newest block
+            - eps (float): floor on the standard deviation, so that dead
+              channels are zeroed rather than blown up
+        """
+        assert mode in ('welford', 'ema'), 'mode must be welford or ema. Got {0}.'.format(mode)
+        self.nchans = nchans
+        self.mode = mode
+        self.alpha = alpha
+        self.eps = eps
+        self.count = 0
+        self.mean = np.zeros(nchans, dtype='float64')
+        self.m2 = np.zeros(nchans, dtype='float64') # sum of squared deviations (welford)
+        self.var = np.zeros(nchans, dtype='float64')
+
+    def update(self, block):
+        """
+        Folds a block into the running statistics.
+
+        Inputs:
+            - block: array of shape (nspec, nchans)
+        """
+        n = block.shape[0]
+        if n == 0:
+            return
+        b_mean = block.mean(axis=0, dtype='float64')
+        b_var = block.var(axis=0, dtype='float64')
+        if self.count == 0 or self.mode == 'welford':
+            total = self.count + n
+            delta = b_mean - self.mean
+            self.mean += delta * (n / total)
+            self.m2 += b_var * n + delta**2 * (self.count * n / total)
+            self.count = total
+            self.var = self.m2 / total
+        else:
+            a = self.alpha
+            delta = b_mean - self.mean
+            self.mean += a * delta
+            self.var = (1 - a) * (self.var + a * delta**2) + a * b_var
+            self.count += n
+
+    def std(self):
+        return np.sqrt(self.var)
+
+    def apply(self, block):
+        """
+        Updates the running statistics with a block, then normalizes the
+        block in place to zero mean and unit variance per channel.
+
+        Inputs:
+            - block: float array of shape (nspec, nchans)
+        Returns:
+            - the normalized block
+        """
+        self.update(block)
+        std = self.std()
+        scale = np.where(std > self.eps, 1 / np.maximum(std, self.eps), 0)
+        block -= self.mean.astype(block.dtype)
+        block *= scale.astype(block.dtype)
+        return block
+
+    def __call__(self, block, start=0):
+        # stage signature used by mp_pipeline.run_pipeline
+        self.apply(block)
@@ -1,10 +1,14 @@
 import numpy as np
 import matplotlib.pyplot as plt
+try: # imported within a package (e.g. fdmt.old.fdmt)
+    from ..delays import DM_CONST, dm_delay, shift_table
+except ImportError: # imported as old.fdmt, from src/fdmt
+    from delays import DM_CONST, dm_delay, shift_table
 # import time
 # import sys
 
 # Constants of utility
-DispersionConstant = 4.148808e6 
+DispersionConstant = DM_CONST/1e9 # ms MHz^2 / (pc cm^-3)
 
 
 ################################################################################################################################################
@@ -105,22 +109,48 @@ def FDMT_iteration(Input, f_min, f_max, maxDT, dataType, N_f, iteration_num):
 #         end = 2**i + 2**i - 1 
 #         start += 2**i 
 
-def minimize_nspec(Image, minimum_sigma):
-    nchans, nspec = Image.shape
-    log2_nspec = int(np.log2(nspec))
-    # avg_vals = np.empty(log2_nspec)
-    indices = []
-    for i in range(log2_nspec):
-        data = Image[:, 2**i:2**(i+1)]
-        # avg_vals[i] = data.mean()
-        # print(data.mean())
-        if data.mean() > minimum_sigma:
-            indices.append(i)
-    minimum = 2**(np.min(indices)) - 1  
-    maximum = 2**(np.max(indices)+1)
-    length = maximum - minimum
-    end_index = int(2**np.ceil(np.log2(length)))
-    return Image[:, minimum:minimum+end_index]
+def minimize_nspec(Image, minimum_sigma, window=1, margin=0, pow2=True, return_start=False):
+    """
+    Crops a (N_f, N_t) image to the span of time where there is signal,
+    so that FDMT runs on the shortest possible input.
+
+    The band-averaged power of every sample is computed once; a single
+    cumulative sum of it gives the mean power of every run of window
+    samples, and the active span runs from the first to the last run
+    whose mean exceeds minimum_sigma. The result is a view of Image; it
+    is only copied (zero padded) when pow2 is set and the data are
+    shorter than the next power of two.
+
+    Inputs:
+        - Image: array of shape (N_f, N_t)
+        - minimum_sigma (float): power threshold
+        - window (int): number of samples averaged before thresholding
+        - margin (int): samples kept on each side of the active span
+        - pow2 (bool): extend the span to a power of two (as FDMT requires)
+        - return_start (bool): also return the index of the first sample kept
+    Returns:
+        - cropped image (and its first sample index)
+    """
+    N_f, N_t = Image.shape
+    csum = np.zeros(N_t + 1)
+    np.cumsum(Image.mean(axis=0, dtype='float64'), out=csum[1:])
+    level = (csum[window:] - csum[:-window]) / window
+    active = np.flatnonzero(level > minimum_sigma)
+    if active.size == 0:
+        start, stop = 0, N_t
+    else:
+        start = max(active[0] - margin, 0)
+        stop = min(active[-1] + window + margin, N_t)
+    if pow2:
+        length = int(2**np.ceil(np.log2(max(stop - start, 2))))
+        if length > N_t: # too short: pad
+            out = np.zeros((N_f, length), dtype=Image.dtype)
+            out[:, :N_t] = Image
+            return (out, 0) if return_start else out
+        start = min(start, N_t - length) # keep the span inside the data
+        stop = start + length
+    out = Image[:, start:stop]
+    return (out, int(start)) if return_start else out
 
 ##############################################################################################################################################################
 
@@ -231,7 +261,7 @@ def pulse_delay(freq, DM):
         - DM [pc*cm^-3]: dispersion measure
     Returns: pulse time delay [ms]
     """
-    return (DispersionConstant * DM)/(freq**2)
+    return dm_delay(DM, freq*1e6)*1e3
 
 
 def dedisperse(Image, f_min, f_max, t_samp, plot=False):
@@ -243,9 +273,7 @@ def dedisperse(Image, f_min, f_max, t_samp, plot=False):
     dmt = FDMT(Image, f_min, f_max, nspec, 'int64')
     measured_dm = compute_DM(dmt, f_min, f_max, t_samp)
 
-    delays = pulse_delay(freqs, measured_dm)
-    bins = delays/t_samp
-    rounded_bins = np.round(bins).astype(int)
+    rounded_bins = shift_table(freqs*1e6, t_samp*1e-3, measured_dm, ref=np.inf)
 
     for i in range(len(Image)):
         Image[i] = np.roll(Image[i], -rounded_bins[i])
@@ -0,0 +1,171 @@
+# Double-buffered background prefetch between the reader and FDMT
+
+import numpy as np
+import threading
+import queue
+import time
+from reader import iter_blocks, fchans
+
+_DONE = object() # end-of-stream marker
+
+
+class Prefetcher:
+    def __init__(self, blocks, depth=2, shape=None, dtype='float32'):
+        """
+        Runs a block generator (e.g. reader.iter_blocks) on a background
+        thread, keeping up to depth preprocessed blocks queued while the
+        consumer works on the previous one.
+
+        If shape is given, depth+2 buffers of that shape are preallocated
+        and recycled: blocks is then a function taking a buffer factory
+        (see the out argument of reader.iter_blocks) and returning the
+        generator. A yielded block stays valid until the next one is
+        requested, so the consumer must be done with it (FDMT.apply
+        copies its input) before advancing.
+
+        Inputs:
+            - blocks: iterable of (start, block), or function of a
+              buffer factory returning one if shape is given
+            - depth (int): maximum number of blocks waiting in the queue
+            - shape (tuple): shape of the recycled buffers
+            - dtype (str): data type of the recycled buffers
+        """
+        self.depth = depth
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._free = None
+        if shape is not None:
+            self._free = queue.Queue()
+            for i in range(depth + 2):
+                self._free.put(np.empty(shape, dtype=dtype))
+            blocks = blocks(self._get_free)
+        self._blocks = blocks
+        self._held = None
+        self._free_wait = 0.
+        # statistics
+        self.nblocks = 0
+        self.occupancy = np.zeros(depth + 1, dtype='int64') # number of gets that saw k blocks queued
+        self.read_time = 0. # [s] reader time spent producing blocks
+        self.producer_stall = 0. # [s] reader time blocked on a full queue
+        self.consumer_stall = 0. # [s] consumer time blocked on an empty queue
+        self.consumer_stalls = 0 # number of gets that had to wait
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_file(cls, file_path, block_size, overlap=0, depth=2, tbin=1, fbin=1):
+        """
+        Prefetches blocks of a recorder data file (see reader.iter_blocks)
+        into recycled (block_size, 2048//fbin) float32 buffers.
+
+        Inputs:
+            - file_path (str): Data file path. Must be binary data file (.dat)
+            - block_size (int): number of spectra per block
+            - overlap (int): number of spectra shared by consecutive blocks
+            - depth (int): number of prefetched blocks
+            - tbin, fbin (int): time and frequency binning factors
+        """
+        return cls(lambda out: iter_blocks(file_path, block_size, overlap, out=out, tbin=tbin, fbin=fbin),
+                   depth=depth, shape=(block_size, fchans // fbin))
+
+    def _get_free(self):
+        # waiting for a recycled buffer counts as a reader stall, not reading
+        t0 = time.perf_counter()
+        buf = self._free.get()
+        self._free_wait += time.perf_counter() - t0
+        return buf
+
+    def _run(self):
+        try:
+            it = iter(self._blocks)
+            while not self._stop.is_set():
+                self._free_wait = 0.
+                t0 = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                t1 = time.perf_counter()
+                self.read_time += t1 - t0 - self._free_wait
+                self.producer_stall += self._free_wait
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                self.producer_stall += time.perf_counter() - t1
+        except Exception as e: # hand reader errors to the consumer
+            self._queue.put(e)
+            return
+        self._queue.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            self._release()
+            self.occupancy[min(self._queue.qsize(), self.depth)] += 1
+            t0 = time.perf_counter()
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                self.consumer_stalls += 1
+                item = self._queue.get()
+            self.consumer_stall += time.perf_counter() - t0
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            self.nblocks += 1
+            self._held = item[1]
+            yield item
+
+    def _release(self):
+        if self._free is not None and self._held is not None:
+            self._free.put(self._held)
+        self._held = None
+
+    def close(self):
+        """
+        Stops the reader thread.
+        """
+        self._stop.set()
+        self._release()
+        while self._thread.is_alive():
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if self._free is not None and isinstance(item, tuple):
+                self._free.put(item[1]) # unblock a reader waiting for a buffer
+        self._thread.join()
+
+    def stats(self):
+        """
+        Returns a dict of queue-occupancy and stall statistics. A large
+        consumer stall means the pipeline is I/O bound; a large producer
+        stall means it is compute bound.
+        """
+        ngets = max(self.occupancy.sum(), 1)
+        return {'nblocks': self.nblocks,
+                'depth': self.depth,
+                'mean_occupancy': float(np.dot(np.arange(self.depth + 1), self.occupancy)/ngets),
+                'empty_fraction': float(self.occupancy[0]/ngets),
+                'full_fraction': float(self.occupancy[-1]/ngets),
+                'read_time': self.read_time,
+                'producer_stall': self.producer_stall,
+                'consumer_stall': self.consumer_stall,
+                'consumer_stalls': self.consumer_stalls}
+
+    def report(self):
+        """
+        Prints the statistics returned by stats().
+        """
+        s = self.stats()
+        bound = 'I/O' if s['consumer_stall'] > s['producer_stall'] else 'compute'
+        print('Blocks processed:', s['nblocks'])
+        print('Mean queue occupancy: {0:.2f}/{1} (empty {2:.0%}, full {3:.0%})'.format(
+            s['mean_occupancy'], s['depth'], s['empty_fraction'], s['full_fraction']))
+        print('Reader time: {0:.3f} s, reader stalled on full queue: {1:.3f} s'.format(s['read_time'], s['producer_stall']))
+        print('FDMT stalled on empty queue: {0:.3f} s ({1} times)'.format(s['consumer_stall'], s['consumer_stalls']))
+        print('Pipeline is {0} bound.'.format(bound))
+
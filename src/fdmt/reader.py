@@ -0,0 +1,68 @@
+# Block-wise reader for LIMBO recorder data files
+
+import numpy as np
+
+# The total number of channels per spectra is 2060. Only 2048 of them
+# contain spectral data (one for each frequency channel). The remaining 12 channels
+# store spectrum information, such as the time in which the spectra was collected
+# and the FPGA count of the spectral frame.
+# For more information see https://github.com/liuweiseu/limbo_recorder/tree/auto_files#file-format
+total_chans = 2060 # TOTAL number of channels
+fchans = 2048 # frequency channels
+info_chans = 12 # channels containing spectra information
+# The header of the data file takes up the first 1024 byte
+header = 1024
+
+
+def memmap_file(file_path):
+    """
+    Memory-maps a recorder data file without reading it.
+
+    Inputs:
+        - file_path (str): Data file path. Must be binary data file (.dat)
+    Returns:
+        - raw: read-only uint16 array of shape (nspec, 2060), info
+          channels included
+    """
+    y = np.memmap(file_path, dtype='uint16', mode='r', offset=header)
+    assert (y.size/total_chans).is_integer(), 'Non-integer number of spectra in file. Got {0}'.format(y.size/total_chans)+'spectra.'
+    nspec = int(y.size/total_chans)
+    return y.reshape([nspec, total_chans])
+
+
+def iter_blocks(file_path, block_size, overlap=0, dtype='float32', out=None, tbin=1, fbin=1):
+    """
+    Reads a recorder data file in blocks of block_size spectra, with
+    the info channels removed. Consecutive blocks share overlap spectra
+    so that pulses spanning a block boundary are not lost. The final
+    block is zero-padded to block_size. With tbin/fbin > 1 every block
+    is decimated on the fly (see decimate.decimate), and block_size and
+    overlap count decimated samples.
+
+    Inputs:
+        - file_path (str): Data file path. Must be binary data file (.dat)
+        - block_size (int): number of spectra per block
+        - overlap (int): number of spectra shared by consecutive blocks
+        - dtype (str): data type of the yielded blocks
+        - out (callable): optional function returning a preallocated
+          (block_size, 2048//fbin) array to fill, e.g. from a buffer pool
+        - tbin (int): number of spectra summed into one sample
+        - fbin (int): number of channels summed into one channel
+    Yields:
+        - (start, block): index of the first sample of the block in
+          the (decimated) file, and the block of shape (block_size, 2048//fbin)
+    """
+    from decimate import decimate
+    assert 0 <= overlap < block_size, 'overlap must be smaller than block_size'
+    raw = memmap_file(file_path)
+    nspec = raw.shape[0] // tbin # in decimated samples
+    step = block_size - overlap
+    for start in range(0, max(nspec - overlap, 1), step):
+        block = out() if out is not None else np.empty((block_size, fchans // fbin), dtype=dtype)
+        n = min(block_size, nspec - start)
+        if tbin == 1 and fbin == 1:
+            block[:n] = raw[start:start+n, info_chans:]
+        else:
+            decimate(raw[start*tbin:(start+n)*tbin], tbin, fbin, out=block[:n])
+        block[n:] = 0
+        yield start, block
@@ -0,0 +1,312 @@
+# Streaming RFI excision ahead of dedispersion
+
+import numpy as np
+import time
+
+MAD_TO_STD = 1.4826 # std of a Gaussian in units of its median absolute deviation
+
+
+class RFIFilter:
+    def __init__(self, nchans=2048, clip_sigma=5., time_sigma=5., chan_sigma=5.,
+                 alpha=0.1, stat_stride=8, zero_dm=True):
+        """
+        Vectorized streaming RFI excision for blocks of shape (nspec, nchans),
+        applied in place before FDMT.apply. Each block goes through
+            1. per-channel robust statistics: median and MAD, estimated
+               on every stat_stride-th spectrum of the block and carried
+               across blocks as running (exponentially weighted) values
+            2. channel flagging: dead channels and channels whose noise
+               level is an outlier among all channels
+            3. time-domain clipping of single samples beyond clip_sigma
+            4. zero-DM filtering: the mean over channels of each spectrum
+               is removed, and spectra whose zero-DM power is beyond
+               time_sigma (broadband, undispersed RFI) are flagged
+        Flagged samples are replaced by their channel's running median.
+
+        Inputs:
+            - nchans (int): number of frequency channels
+            - clip_sigma (float): single-sample clipping threshold
+            - time_sigma (float): zero-DM time-flagging threshold
+            - chan_sigma (float): channel noise-level flagging threshold
+            - alpha (float): weight of the newest block in the running
+              statistics (1 = no memory)
+            - stat_stride (int): subsampling of spectra used for the
+              per-block statistics
+            - zero_dm (bool): subtract the zero-DM time series
+        """
+        self.nchans = nchans
+        self.clip_sigma = clip_sigma
+        self.time_sigma = time_sigma
+        self.chan_sigma = chan_sigma
+        self.alpha = alpha
+        self.stat_stride = stat_stride
+        self.zero_dm = zero_dm
+        self.median = None # running per-channel median
+        self.mad = None # running per-channel MAD
+        self._scratch = None
+        # masks of the last block
+        self.chan_mask = np.zeros(nchans, dtype=bool)
+        self.time_mask = None
+        self.nclipped = 0
+
+    def _update_stats(self, block):
+        sub = block[::self.stat_stride]
+        med = np.median(sub, axis=0)
+        mad = np.median(np.abs(sub - med), axis=0)
+        if self.median is None:
+            self.median, self.mad = med, mad
+        else:
+            self.median += self.alpha * (med - self.median)
+            self.mad += self.alpha * (mad - self.mad)
+
+    def _flag_channels(self, std):
+        dead = ~(std > 0)
+        logs = np.log(np.where(dead, 1, std))
+        good = logs[~dead]
+        if good.size == 0:
+            return dead
+        m = np.median(good)
+        s = MAD_TO_STD * np.median(np.abs(good - m))
+        if s == 0:
+            return dead
+        return dead | (np.abs(logs - m) > self.chan_sigma * s)
+
+    def apply(self, block):
+        """
+        Excises RFI from a block in place.
+
+        Inputs:
+            - block: float32 array of shape (nspec, nchans)
+        Returns:
+            - chan_mask: bool array of shape (nchans,), True where flagged
+            - time_mask: bool array of shape (nspec,), True where flagged
+        """
+        self._update_stats(block)
+        std = MAD_TO_STD * self.mad
+        chan_mask = self._flag_channels(std)
+        inv_std = np.where(chan_mask, 0, 1 / np.where(chan_mask, 1, std)).astype(block.dtype)
+        med = self.median.astype(block.dtype)
+
+        if self._scratch is None or self._scratch.shape != block.shape:
+            self._scratch = np.empty(block.shape, dtype=block.dtype)
+        z = self._scratch
+        np.subtract(block, med, out=z)
+        z *= inv_std # normalized block, flagged channels are zero
+        ngood = max(1, self.nchans - int(chan_mask.sum()))
+        zdm = z.sum(axis=1) / ngood # zero-DM time series (in sigma)
+        sample_mask = np.abs(z) > self.clip_sigma
+        self.nclipped = int(np.count_nonzero(sample_mask))
+        s = MAD_TO_STD * np.median(np.abs(zdm - np.median(zdm)))
+        time_mask = np.abs(zdm - np.median(zdm)) > self.time_sigma * max(s, 1 / np.sqrt(ngood))
+
+        if self.zero_dm:
+            zdm[time_mask] = 0
+            block -= zdm[:, None] * np.where(chan_mask, 0, std).astype(block.dtype)
+        sample_mask |= time_mask[:, None]
+        sample_mask |= chan_mask
+        np.copyto(block, med, where=sample_mask)
+
+        self.chan_mask = chan_mask
+        self.time_mask = time_mask
+        return chan_mask, time_mask
+
+    def __call__(self, block, start=0):
+        # stage signature used by mp_pipeline.run_pipeline
+        self.apply(block)
+
+
+class SpectralKurtosis:
+    def __init__(self, nchans=2048, M=256, N=1, d=1, sigma=5., time_frac=0.2):
+        """
+        Streaming generalized spectral-kurtosis (SK) flagger. For every
+        channel only the running sums S1 = sum(x) and S2 = sum(x**2) of
+        the current M-spectrum window and the number of spectra in it are
+        kept (O(1) memory per channel); each completed window gives
+
+            SK = (M*N*d + 1)/(M - 1) * (M*S2/S1**2 - 1)
+
+        which is 1 for Gaussian noise. Bursty or narrowband RFI pushes SK
+        away from 1 and the (window, channel) is flagged. A window in
+        which more than time_frac of the channels are flagged is flagged
+        entirely (time bin).
+
+        Inputs:
+            - nchans (int): number of frequency channels
+            - M (int): number of spectra per SK window
+            - N (int): number of raw spectra accumulated into each input
+              spectrum by the recorder
+            - d (float): shape factor of the raw power distribution (1
+              for a single unaveraged FFT power)
+            - sigma (float): flagging threshold in standard deviations
+              of SK
+            - time_frac (float): fraction of flagged channels above which
+              a whole window is flagged
+        """
+        self.nchans = nchans
+        self.M = M
+        self.N = N
+        self.d = d
+        self.time_frac = time_frac
+        Nd = N * d
+        var = 2 * Nd * (Nd + 1) * M**2 / ((M - 1) * (M*Nd + 3) * (M*Nd + 2))
+        self.threshold = sigma * np.sqrt(var)
+        self.s1 = np.zeros(nchans, dtype='float64')
+        self.s2 = np.zeros(nchans, dtype='float64')
+        self.count = 0 # spectra in the current (incomplete) window
+        self.nseen = 0 # spectra seen so far
+
+    def _sk(self, s1, s2):
+        M, Nd = self.M, self.N * self.d
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sk = (M*Nd + 1) / (M - 1) * (M * s2 / s1**2 - 1)
+        return np.where(s1 > 0, sk, 1) # empty/dead channels are left to RFIFilter
+
+    def update(self, block):
+        """
+        Adds a block of spectra to the running sums.
+
+        Inputs:
+            - block: array of shape (nspec, nchans), e.g. a prepare_data
+              or reader.iter_blocks block (uint16 or float)
+        Returns:
+            - starts: array of the absolute index of the first spectrum
+              of every window completed by this block
+            - sk: array of shape (nwin, nchans) of their SK values
+            - mask: bool array of shape (nwin, nchans), True where flagged
+              (whole rows are flagged for flagged time bins)
+        """
+        nspec = block.shape[0]
+        s1, s2, starts = [], [], []
+        i = 0
+        if self.count: # finish the window left open by the previous block
+            n = min(self.M - self.count, nspec)
+            x = block[:n].astype('float32')
+            self.s1 += x.sum(axis=0, dtype='float64')
+            self.s2 += np.square(x).sum(axis=0, dtype='float64')
+            self.count += n
+            i = n
+            if self.count == self.M:
+                s1.append(self.s1[None].copy())
+                s2.append(self.s2[None].copy())
+                starts.append(self.nseen - (self.M - n))
+                self.s1[:], self.s2[:], self.count = 0, 0, 0
+        nwin = (nspec - i) // self.M
+        if nwin:
+            x = block[i:i+nwin*self.M].astype('float32').reshape(nwin, self.M, -1)
+            s1.append(x.sum(axis=1, dtype='float64'))
+            s2.append(np.square(x).sum(axis=1, dtype='float64'))
+            starts.extend(self.nseen + i + self.M*np.arange(nwin))
+            i += nwin * self.M
+        if i < nspec: # open a new window with the remainder
+            x = block[i:].astype('float32')
+            self.s1 += x.sum(axis=0, dtype='float64')
+            self.s2 += np.square(x).sum(axis=0, dtype='float64')
+            self.count += nspec - i
+        self.nseen += nspec
+        if not s1:
+            empty = np.zeros((0, self.nchans))
+            return np.zeros(0, dtype='int64'), empty, empty.astype(bool)
+        sk = self._sk(np.concatenate(s1), np.concatenate(s2))
+        mask = np.abs(sk - 1) > self.threshold
+        mask[mask.mean(axis=1) > self.time_frac] = True
+        return np.array(starts, dtype='int64'), sk, mask
+
+    def apply(self, block, fill=None):
+        """
+        Updates the SK sums with a block and blanks, in place, the samples
+        of the block that belong to flagged (window, channel) pairs. Only
+        the part of a window lying in this block can be blanked; the part
+        in the previous block has already been passed on.
+
+        Inputs:
+            - block: float array of shape (nspec, nchans)
+            - fill (array): per-channel replacement value, e.g. the
+              running median of RFIFilter. Default is the per-channel
+              median of the window's samples in this block, which a few
+              bright RFI samples do not pull up as they would a mean.
+        Returns:
+            - starts, sk, mask: as returned by update()
+        """
+        block_start = self.nseen
+        starts, sk, mask = self.update(block)
+        for start, m in zip(starts, mask):
+            if not m.any():
+                continue
+            i0 = max(start - block_start, 0)
+            i1 = start - block_start + self.M
+            if fill is None:
+                seg = block[i0:i1]
+                value = np.median(seg, axis=0)
+            else:
+                value = fill
+            np.copyto(block[i0:i1], np.broadcast_to(value, m.shape).astype(block.dtype), where=m)
+        return starts, sk, mask
+
+    def __call__(self, block, start=0):
+        # stage signature used by mp_pipeline.run_pipeline
+        self.apply(block)
+
+
+def sk_flag_file(file_path, M=256, N=1, d=1, sigma=5., time_frac=0.2, block_size=2**14):
+    """
+    Runs the spectral-kurtosis flagger over a whole data file through
+    the memory-mapped reader, without loading the file.
+
+    Inputs:
+        - file_path (str): Data file path. Must be binary data file (.dat)
+        - M, N, d, sigma, time_frac: see SpectralKurtosis
+        - block_size (int): number of spectra read at once
+    Returns:
+        - starts: absolute index of the first spectrum of every window
+        - mask: bool array of shape (nwin, 2048), True where flagged
+    """
+    from reader import memmap_file, info_chans
+    raw = memmap_file(file_path)
+    sk = SpectralKurtosis(raw.shape[1] - info_chans, M, N, d, sigma, time_frac)
+    block_size = max(M, block_size - block_size % M)
+    starts, masks = [], []
+    for i in range(0, raw.shape[0], block_size):
+        s, k, m = sk.update(raw[i:i+block_size, info_chans:])
+        starts.append(s)
+        masks.append(m)
+    return np.concatenate(starts), np.concatenate(masks)
+
+
+def benchmark(nspec=10000, nchans=2048, nblocks=5, **kwargs):
+    """
+    Measures the throughput of RFIFilter on Gaussian noise blocks with
+    some injected narrowband and broadband RFI.
+
+    Inputs:
+        - nspec (int): spectra per block
+        - nchans (int): number of frequency channels
+        - nblocks (int): number of blocks timed
+        - kwargs: passed to RFIFilter
+    Returns:
+        - throughput in spectra/s
+    """
+    rng = np.random.default_rng(0)
+    blocks = []
+    for i in range(2):
+        b = rng.standard_normal((nspec, nchans), dtype='float32') * 100 + 1000
+        b[:, 137::519] *= 20 # narrowband
+        b[::997] += 800 # broadband
+        blocks.append(b)
+    rfi = RFIFilter(nchans, **kwargs)
+    rfi.apply(blocks[0].copy()) # warm up
+    elapsed = 0.
+    for i in range(nblocks):
+        block = blocks[i % 2].copy()
+        t0 = time.perf_counter()
+        rfi.apply(block)
+        elapsed += time.perf_counter() - t0
+    rate = nblocks * nspec / elapsed
+    print('RFIFilter: {0:.0f} spectra/s of {1} channels ({2:.1f} ms per {3}-spectrum block)'.format(
+        rate, nchans, 1e3 * elapsed / nblocks, nspec))
+    print('Flagged channels: {0}, flagged spectra: {1}, clipped samples: {2}'.format(
+        int(rfi.chan_mask.sum()), int(rfi.time_mask.sum()), rfi.nclipped))
+    return rate
+
+
+if __name__ == '__main__':
+    benchmark()
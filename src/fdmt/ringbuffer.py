@@ -0,0 +1,184 @@
+# Triggered raw-data ring buffer and candidate cutout dumps
+
+import numpy as np
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from reader import fchans
+from delays import dm_delay
+
+
+class SpectraRing:
+    def __init__(self, capacity, nchans=fchans, dtype='uint16'):
+        """
+        Fixed-size ring buffer holding the most recent capacity spectra.
+        Spectra are addressed by their absolute index in the stream
+        (the number of spectra appended before them).
+
+        Inputs:
+            - capacity (int): number of spectra kept
+            - nchans (int): number of frequency channels per spectrum
+            - dtype (str): data type of the stored spectra
+        """
+        self.capacity = capacity
+        self.buf = np.zeros((capacity, nchans), dtype=dtype)
+        self.count = 0 # total number of spectra appended so far
+
+    def append(self, block):
+        """
+        Appends a block of shape (nspec, nchans) to the ring, overwriting
+        the oldest spectra.
+        """
+        n = block.shape[0]
+        if n > self.capacity: # only the newest spectra survive
+            block = block[n-self.capacity:]
+            self.count += n - self.capacity
+            n = self.capacity
+        i0 = self.count % self.capacity
+        n0 = min(n, self.capacity - i0)
+        self.buf[i0:i0+n0] = block[:n0]
+        self.buf[:n-n0] = block[n0:]
+        self.count += n
+
+    def oldest(self):
+        """
+        Returns the absolute index of the oldest spectrum still held.
+        """
+        return max(0, self.count - self.capacity)
+
+    def get(self, start, stop):
+        """
+        Copies spectra [start, stop) (absolute indices) out of the ring.
+        The range is clipped to what is currently held.
+
+        Returns:
+            - data: array of shape (stop-start, nchans) after clipping
+            - start, stop (int): the clipped range
+        """
+        start = max(start, self.oldest())
+        stop = min(stop, self.count)
+        if stop <= start:
+            return self.buf[:0].copy(), start, start
+        idx = np.arange(start, stop) % self.capacity
+        i0 = idx[0]
+        if i0 + idx.size <= self.capacity: # contiguous, plain slice copy
+            return self.buf[i0:i0+idx.size].copy(), start, stop
+        return self.buf[idx], start, stop
+
+
+class CutoutWriter:
+    def __init__(self, ring, freqs, t_samp, out_dir, pad=256, nthreads=1):
+        """
+        Dumps the raw data around candidates to disk. A cutout covers the
+        full dispersion sweep at the candidate DM (plus pad spectra on
+        either side). Because the low-frequency end of the sweep arrives
+        after the trigger, requests wait until the ring holds the whole
+        span; the cutout is then copied out and written by a background
+        thread, so the detection loop never waits on the disk.
+
+        Inputs:
+            - ring (SpectraRing): ring the raw spectra are appended to
+            - freqs (array)|[Hz]: channel frequencies
+            - t_samp (float)|[s]: sampling time
+            - out_dir (str): directory the cutouts are written to
+            - pad (int): spectra kept before and after the sweep
+            - nthreads (int): number of writer threads
+        """
+        self.ring = ring
+        self.freqs = np.asarray(freqs)
+        self.t_samp = t_samp
+        self.out_dir = out_dir
+        self.pad = pad
+        os.makedirs(out_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=nthreads)
+        self._pending = [] # requests waiting for their data
+        self._futures = []
+        self._lock = threading.Lock()
+        self.written = []
+
+    def sweep_length(self, DM):
+        """
+        Number of samples spanned by the dispersion sweep at DM.
+        """
+        f_lo, f_hi = self.freqs.min(), self.freqs.max()
+        return int(np.ceil((dm_delay(DM, f_lo) - dm_delay(DM, f_hi)) / self.t_samp))
+
+    def trigger(self, t_index, DM, **meta):
+        """
+        Requests a cutout for a candidate.
+
+        Inputs:
+            - t_index (int): absolute index of the candidate's arrival
+              at the top of the band
+            - DM (float)|[pc*cm^-3]: candidate dispersion measure
+            - meta: any extra (JSON serializable) candidate metadata,
+              e.g. snr or width
+        """
+        start = t_index - self.pad
+        stop = t_index + self.sweep_length(DM) + self.pad
+        assert stop - start <= self.ring.capacity, 'Cutout of {0} spectra does not fit in ring of {1}.'.format(stop-start, self.ring.capacity)
+        request = dict(meta, t_index=int(t_index), DM=float(DM), start=int(start), stop=int(stop))
+        self._pending.append(request)
+        self.poll()
+
+    def append(self, block):
+        """
+        Appends a block to the ring and serves the requests it completes.
+        The block is appended in pieces ending where pending requests
+        end, so a cutout is never overwritten by the rest of the block.
+        """
+        pos, n = 0, block.shape[0]
+        while pos < n:
+            stops = [r['stop'] - self.ring.count for r in self._pending]
+            step = min([n - pos] + [s for s in stops if s > 0])
+            self.ring.append(block[pos:pos+step])
+            pos += step
+            self.poll()
+
+    def poll(self):
+        """
+        Copies out every pending cutout whose span is now in the ring
+        and hands it to the writer thread.
+        """
+        ready = [r for r in self._pending if r['stop'] <= self.ring.count]
+        if not ready:
+            return
+        self._pending = [r for r in self._pending if r['stop'] > self.ring.count]
+        for r in ready:
+            data, start, stop = self.ring.get(r['start'], r['stop'])
+            r['clipped'] = (start, stop) != (r['start'], r.get('stop_requested', r['stop']))
+            r['start'], r['stop'] = int(start), int(stop)
+            self._futures.append(self._pool.submit(self._write, data, r))
+        for f in self._futures:
+            if f.done():
+                f.result() # re-raise write errors
+        self._futures = [f for f in self._futures if not f.done()]
+
+    def _write(self, data, request):
+        name = 'cand_{0:012d}_DM{1:.2f}'.format(request['t_index'], request['DM'])
+        path = os.path.join(self.out_dir, name)
+        meta = dict(request, t_samp=self.t_samp, f_min=float(self.freqs.min()), f_max=float(self.freqs.max()),
+                    nchans=int(data.shape[1]), dtype=str(data.dtype))
+        np.save(path + '.npy', data)
+        with open(path + '.json', 'w') as f:
+            json.dump(meta, f, indent=1)
+        with self._lock:
+            self.written.append(path)
+
+    def close(self, flush=True):
+        """
+        Waits for all submitted writes to finish. With flush, pending
+        requests are written with whatever part of their span is in the
+        ring, marked clipped, with the stop they asked for kept as
+        stop_requested.
+        """
+        if flush:
+            for r in self._pending:
+                if r['stop'] > self.ring.count: # the end of the sweep never arrived
+                    r['stop_requested'] = r['stop']
+                    r['stop'] = self.ring.count
+            self.poll()
+        self._pool.shutdown(wait=True)
+        for f in self._futures:
+            f.result() # re-raise write errors
@@ -5,12 +5,34 @@ import matplotlib.pyplot as plt
 import argparse
 import timeit
 
+
+def channel_binning(value):
+    """
+    argparse type of --fbin: FDMT needs a power-of-two number of channels,
+    so fbin must be a power of two of at most 2048 (the recorder channels).
+    """
+    fbin = int(value)
+    if fbin < 1 or fbin > 2048 or fbin & (fbin - 1):
+        raise argparse.ArgumentTypeError('fbin must be a power of two between 1 and 2048 (got {0}), '
+                                         'so that 2048/fbin channels remain a power of two.'.format(value))
+    return fbin
+
 parser = argparse.ArgumentParser('Run FDMT algorithm on data file.')
 parser.add_argument('file_path', type=str, help='Data file path')
 # parser.add_argument('ntimes', type=int, help='number of spectra')
 # parser.add_argument('nchans', type=int, help='number of channels')
 parser.add_argument('fmin', help='minimum frequency of band in [Hz]')
 parser.add_argument('fmax', help='maximum frequency of band in [Hz]')
+parser.add_argument('--block_size', type=int, default=0, help='number of spectra per block; if given, the file is read in the background while FDMT runs')
+parser.add_argument('--overlap', type=int, default=0, help='number of spectra shared by consecutive blocks')
+parser.add_argument('--depth', type=int, default=2, help='number of blocks prefetched by the background reader')
+parser.add_argument('--rfi', action='store_true', help='excise RFI from each block before dedispersion (requires --block_size)')
+parser.add_argument('--normalize', action='store_true', help='flatten the bandpass of each block with running statistics (requires --block_size)')
+parser.add_argument('--tbin', type=int, default=1, help='number of spectra summed into one FDMT time sample')
+parser.add_argument('--fbin', type=channel_binning, default=1, help='number of channels summed into one FDMT frequency channel')
+parser.add_argument('--max_width', type=int, default=1, help='largest boxcar width [samples] searched on the FDMT output; 1 takes the brightest pixel')
+parser.add_argument('--threshold', type=float, default=0, help='if given (with --block_size), cluster every boxcar pixel above this SNR into candidates')
+parser.add_argument('--nworkers', type=int, default=0, help='number of FDMT processes; if given (with --block_size), every pipeline stage runs in its own process')
 
 args = parser.parse_args()
 FILE_PATH = args.file_path
@@ -18,6 +40,16 @@ FILE_PATH = args.file_path
 # NCHANS = args.nchans
 FMIN = float(args.fmin)
 FMAX = float(args.fmax)
+BLOCK_SIZE = args.block_size
+OVERLAP = args.overlap
+DEPTH = args.depth
+NWORKERS = args.nworkers
+RFI = args.rfi
+NORMALIZE = args.normalize
+TBIN = args.tbin
+FBIN = args.fbin
+MAX_WIDTH = args.max_width
+THRESHOLD = args.threshold
 
 
 # The total number of channels per spectra is 2060. Only 2048 of them
@@ -32,35 +64,108 @@ info_chans = 12 # channels containing spectra information
 header = 1024
 
 FREQS = np.linspace(FMIN, FMAX, fchans) # frequency range in [Hz]
+TSAMP = 1e-4 # [s]
 
+# Trade resolution for throughput: data are binned by TBIN in time and
+# FBIN in frequency on the way in (see decimate.py)
+from decimate import decimate, decimate_axes
+FREQS = decimate_axes(FREQS, [], 1, FBIN)[0] # channel centers after binning
+NCHANS = FREQS.size
 
-## Prepare data
-f = open(FILE_PATH, 'rb')
-y = np.frombuffer(f.read(), dtype='uint16', offset=header)
-assert (y.size/total_chans).is_integer(), 'Non-integer number of spectra in file. Got {0}'.format(y.size/total_chans)+'spectra.'
-nspec = int(y.size/total_chans)
-TIMES = np.arange(nspec)*1e-4
 
+MAXDM = 500
 
-data =  y.reshape([nspec, total_chans]) # reshape into [nspec, 2060]
-data = data[:, info_chans:] # ignore info_chans so that data now takes shape [nspec, 2048]
-# data.shape = data.shape[0:1] + (-1, 8)
-# data = data.sum(axis=-1)
-# FREQS.shape = (-1, 8)
-# FREQS = FREQS.mean(axis=-1)
-# data = np.random.normal(size=data.shape)
+if BLOCK_SIZE and NWORKERS:
+    ## Multi-process: blocks move between stages through shared memory
+    from mp_pipeline import run_pipeline, FDMTFactory, argmax_candidate
+    from boxcar import boxcar_candidate
+    from functools import partial
+    from rfi import RFIFilter
+    from normalize import BandpassNormalizer
+    TIMES = np.arange(BLOCK_SIZE)*TSAMP*TBIN
+    import time
+    start = time.time()
+    best = (-np.inf, 0, 0)
+    for t_start, cand in run_pipeline(FILE_PATH, FDMTFactory(FREQS, TIMES, MAXDM), BLOCK_SIZE, OVERLAP, NWORKERS, tbin=TBIN, fbin=FBIN,
+                                      rfi=RFIFilter(NCHANS) if RFI else None,
+                                      normalize=BandpassNormalizer(NCHANS) if NORMALIZE else None,
+                                      find_candidates=partial(boxcar_candidate, max_width=MAX_WIDTH) if MAX_WIDTH > 1 else argmax_candidate):
+        if cand[0] > best[0]:
+            best = cand
+    print('FDMT execution time:', time.time() - start)
+    print(best[1]*TSAMP*TBIN, np.linspace(0, MAXDM, NCHANS)[best[2]])
 
-MAXDM = 500
-fdmt = FDMT(freqs=FREQS, times=TIMES, maxDM=MAXDM)
-import time
-start = time.time()
-dmt = fdmt.apply(data)
-print('FDMT execution time:', time.time() - start)
-
-print(dmt.shape)
-t0, dm0 = inds = np.unravel_index(np.argmax(dmt, axis=None), dmt.shape)
-print(TIMES[t0], np.linspace(0, MAXDM, fchans)[dm0])
-
-plt.figure()
-plt.imshow(dmt, aspect='auto')
-plt.show()
+elif BLOCK_SIZE:
+    ## Pipelined: a background thread reads the next blocks while FDMT runs
+    from prefetch import Prefetcher
+    from rfi import RFIFilter
+    from normalize import BandpassNormalizer
+    from boxcar import boxcar_peak, boxcar_search, geometric_widths, peak_pixel
+    from candidates import CandidateClusterer
+    rfi = RFIFilter(NCHANS) if RFI else None
+    normalizer = BandpassNormalizer(NCHANS) if NORMALIZE else None
+    clusterer = CandidateClusterer(THRESHOLD) if THRESHOLD else None
+    cands = []
+    TIMES = np.arange(BLOCK_SIZE)*TSAMP*TBIN
+    fdmt = FDMT(freqs=FREQS, times=TIMES, maxDM=MAXDM)
+    pf = Prefetcher.from_file(FILE_PATH, BLOCK_SIZE, OVERLAP, DEPTH, TBIN, FBIN)
+    import time
+    start = time.time()
+    best = (-np.inf, 0, 0)
+    for t_start, block in pf:
+        if rfi is not None:
+            rfi.apply(block)
+        if normalizer is not None:
+            normalizer.apply(block)
+        dmt = fdmt.apply(block)
+        if clusterer is not None:
+            snr, width = boxcar_search(dmt, max_width=MAX_WIDTH)
+            cands.append(clusterer.add_block(snr, t_start, np.searchsorted(geometric_widths(MAX_WIDTH), width)))
+        if MAX_WIDTH > 1 and clusterer is not None:
+            peak, t0, dm0, width = peak_pixel(snr, width) # reuse the search made for the clusterer
+        elif MAX_WIDTH > 1:
+            peak, t0, dm0, width = boxcar_peak(dmt, max_width=MAX_WIDTH)
+        else:
+            t0, dm0 = np.unravel_index(np.argmax(dmt, axis=None), dmt.shape)
+            peak = dmt[t0, dm0]
+        if peak > best[0]:
+            best = (peak, t_start + t0, dm0)
+    pf.close()
+    print('FDMT execution time:', time.time() - start)
+    pf.report()
+    print(best[1]*TSAMP*TBIN, np.linspace(0, MAXDM, NCHANS)[best[2]])
+    if clusterer is not None:
+        cands.append(clusterer.add_block(np.zeros((0, NCHANS)), final=True))
+        cands = np.sort(np.concatenate(cands), order='snr')[::-1]
+        print('{0} candidates above {1} sigma'.format(cands.size, THRESHOLD))
+        for c in cands[:10]:
+            print('  snr {0:6.2f}  t = {1:.4f} s  DM = {2:6.2f}  width = {3} samples  ({4} pixels)'.format(
+                c['snr'], c['t']*TSAMP*TBIN, np.linspace(0, MAXDM, NCHANS)[c['dm']], geometric_widths(MAX_WIDTH)[c['width']], c['npix']))
+
+else:
+    ## Prepare data
+    f = open(FILE_PATH, 'rb')
+    y = np.frombuffer(f.read(), dtype='uint16', offset=header)
+    assert (y.size/total_chans).is_integer(), 'Non-integer number of spectra in file. Got {0}'.format(y.size/total_chans)+'spectra.'
+    nspec = int(y.size/total_chans)
+
+
+    data =  y.reshape([nspec, total_chans]) # reshape into [nspec, 2060]
+    # ignore info_chans and bin in one pass, so that data now takes shape [nspec//TBIN, 2048//FBIN]
+    data = decimate(data, TBIN, FBIN)
+    TIMES = decimate_axes(FREQS, np.arange(nspec)*TSAMP, TBIN, 1)[1]
+    # data = np.random.normal(size=data.shape)
+
+    fdmt = FDMT(freqs=FREQS, times=TIMES, maxDM=MAXDM)
+    import time
+    start = time.time()
+    dmt = fdmt.apply(data)
+    print('FDMT execution time:', time.time() - start)
+
+    print(dmt.shape)
+    t0, dm0 = inds = np.unravel_index(np.argmax(dmt, axis=None), dmt.shape)
+    print(TIMES[t0], np.linspace(0, MAXDM, NCHANS)[dm0])
+
+    plt.figure()
+    plt.imshow(dmt, aspect='auto')
+    plt.show()
@@ -0,0 +1,12 @@
+# The package modules import each other flat (run from their own
+# directory, or with it on PYTHONPATH), so the tests put those
+# directories on the path the same way.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for d in ('scripts', 'src/fdmt', 'sims', 'sims/rpi4'):
+    path = os.path.join(ROOT, d)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from bcd import encode_bits, pack_words, unpack_words
+from gpio_backends import FakeGPIO, LOW, HIGH
+from wavegen import WaveGen
+
+FREQS = np.linspace(1150e6, 1650e6, 37)
+
+
+def nibble_bits(gen, freqs):
+    # bits in shift order from the string encoding: units digit first, LSB first
+    return np.array([[int(b) for nibble in gen._convert_freq_list([f])[0][::-1] for b in nibble[::-1]]
+                     for f in freqs], dtype='uint8')
+
+
+def fake_gen(calibration=None):
+    fake = FakeGPIO(clock=lambda: 0)
+    gen = WaveGen(backend=fake, calibration=calibration)
+    fake.clear() # forget the pin setup
+    return gen, fake
+
+
+def test_encode_bits_vs_strings():
+    gen, fake = fake_gen()
+    freqs = np.r_[FREQS, 1e6, 1234567890, 3199999999]
+    bits = encode_bits(freqs)
+    assert bits.shape == (freqs.size, 40) and bits.dtype == np.uint8
+    assert np.array_equal(bits, nibble_bits(gen, freqs))
+    assert np.array_equal(unpack_words(pack_words(bits)), bits)
+
+
+def test_encode_bits_clips(capsys):
+    assert np.array_equal(encode_bits([5e5, 4e9]), encode_bits([1e6, 3199999999]))
+    assert 'WARNING' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('calibration', [None, {'slope': 0.5, 'offset': 1.}, {'slope': 0.1, 'offset': 0.2}])
+def test_load_bits_vs_load_frequency(calibration):
+    gen, fake = fake_gen(calibration)
+    for nibbles in gen._convert_freq_list(FREQS):
+        gen._load_frequency(nibbles)
+    expected = fake.writes()
+    fake.clear()
+    for row in gen.compile_sweep(FREQS).tolist():
+        gen._load_bits(row)
+    for a, b in zip(fake.writes(), expected):
+        assert np.array_equal(a, b)
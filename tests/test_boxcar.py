@@ -0,0 +1,30 @@
+import numpy as np
+from boxcar import boxcar_search, boxcar_peak, geometric_widths
+from rfi import MAD_TO_STD
+
+
+def test_geometric_widths():
+    assert list(geometric_widths(64)) == [1, 2, 4, 8, 16, 32, 64]
+    assert list(geometric_widths(10, 3.)) == [1, 3, 9]
+
+
+def test_boxcar_vs_convolution():
+    rng = np.random.default_rng(0)
+    dmt = rng.standard_normal((300, 5))
+    snr, width = boxcar_search(dmt, widths=[1, 4, 16], stat_stride=1)
+    best = np.full(dmt.shape, -np.inf)
+    for w in (1, 4, 16):
+        s = np.stack([np.convolve(col, np.ones(w), mode='valid') for col in dmt.T], axis=1)
+        med = np.median(s, axis=0)
+        s = (s - med)/(MAD_TO_STD*np.median(np.abs(s - med), axis=0))
+        best[:s.shape[0]] = np.maximum(best[:s.shape[0]], s)
+    assert np.allclose(snr, best, rtol=1e-4, atol=1e-4)
+    assert set(np.unique(width)) <= {1, 4, 16}
+
+
+def test_boxcar_peak():
+    dmt = np.random.default_rng(1).standard_normal((1000, 8)).astype('float32')
+    dmt[500:516, 3] += 3
+    snr, t, dm, w = boxcar_peak(dmt)
+    assert (t, dm, w) == (500, 3, 16)
+    assert snr > 8
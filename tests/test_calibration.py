@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import pytest
+import calibration
+from calibration import calibrate, check_simulated, host_key, load_calibration, save_calibration, DEFAULT_CALIBRATION
+from gpio_backends import FakeGPIO
+from wavegen import WaveGen
+
+
+def simulated(toggle_ns, overhead_ns):
+    # FakeGPIO whose clock advances toggle_ns per write and overhead_ns/2 per reading
+    state = {'t': 0}
+    def advance(dt):
+        state['t'] += dt
+        return state['t']
+    return FakeGPIO(clock=lambda: advance(toggle_ns)), lambda: advance(overhead_ns/2)
+
+
+@pytest.mark.parametrize('toggle_ns,overhead_ns', [(2247, 4000), (500, 1000), (3000, 0)])
+def test_calibrate_simulated(toggle_ns, overhead_ns):
+    gpio, clock = simulated(toggle_ns, overhead_ns)
+    cal = calibrate(gpio, 26, repeats=1, clock=clock)
+    assert cal['slope'] == pytest.approx(toggle_ns/1e3)
+    assert cal['offset'] == pytest.approx((toggle_ns + overhead_ns/2)/1e3)
+    assert cal['residual'] < 1e-6
+    # the toggle counts target the requested durations
+    assert np.allclose(cal['durations'], calibration.DURATIONS, rtol=0.02, atol=5) # the pilot loop includes the offset
+    check_simulated(toggle_ns, overhead_ns)
+
+
+def test_store(tmp_path):
+    path = str(tmp_path/'cal.json')
+    assert load_calibration('a/B', path) is None
+    save_calibration('a/B', {'slope': 1., 'offset': 2.}, path)
+    save_calibration('c/D', {'slope': 3., 'offset': 4.}, path)
+    assert load_calibration('a/B', path) == {'slope': 1., 'offset': 2.}
+    assert load_calibration('c/D', path) == {'slope': 3., 'offset': 4.}
+    assert os.listdir(str(tmp_path)) == ['cal.json']
+
+
+class Hardware:
+    # backend that is not FakeGPIO, as RPiGPIOBackend or PigpioBackend are
+    def __init__(self):
+        self.pins = {}
+
+    def setup(self, pins):
+        pass
+
+    def output(self, pin, value):
+        self.pins[pin] = value
+
+    def set_drive_strength(self, strength):
+        pass
+
+
+def test_default_calibrates_hardware(tmp_path, monkeypatch):
+    path = str(tmp_path/'cal.json')
+    calls = []
+    def fake_calibrate(gpio, pin):
+        calls.append(pin)
+        return {'slope': 0.25, 'offset': 1.5}
+    monkeypatch.setattr('wavegen.calibrate', fake_calibrate)
+    gen = WaveGen(backend=Hardware(), calibration_file=path)
+    assert gen.calibration == {'slope': 0.25, 'offset': 1.5} and calls == [gen.gpio_timer_pin]
+    assert load_calibration(host_key(gen.gpio), path) == gen.calibration
+    # the next start reuses the stored result, 'new' measures again
+    assert WaveGen(backend=Hardware(), calibration_file=path).calibration == gen.calibration and len(calls) == 1
+    WaveGen(backend=Hardware(), calibration='new', calibration_file=path)
+    assert len(calls) == 2
+
+
+def test_fake_backend_writes_nothing(tmp_path):
+    path = str(tmp_path/'cal.json')
+    gen = WaveGen(backend='fake', calibration_file=path)
+    assert gen.calibration == DEFAULT_CALIBRATION and not os.path.exists(path)
+    gen = WaveGen(backend='fake', calibration='new', calibration_file=path)
+    assert gen.calibration['slope'] > 0 and load_calibration(host_key(gen.gpio), path) == gen.calibration
+    assert WaveGen(backend='fake', calibration={'slope': 2., 'offset': 0.}).calibration == {'slope': 2., 'offset': 0.}
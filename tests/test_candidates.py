@@ -0,0 +1,29 @@
+import numpy as np
+from candidates import cluster_pixels, CandidateClusterer
+
+
+def test_cluster_pixels():
+    # two blobs, one linked through a chain of friends, and a lone pixel
+    t = np.array([10, 11, 13, 15, 10, 40, 80])
+    dm = np.array([5, 6, 6, 7, 30, 5, 5])
+    snr = np.array([8, 12, 9, 7.5, 20, 7.1, 9], dtype='float32')
+    labels, cands = cluster_pixels(t, dm, np.zeros(7, dtype='int64'), snr)
+    assert cands.size == 4
+    assert list(cands['snr']) == [20, 12, 9, np.float32(7.1)]
+    assert list(labels) == [1, 1, 1, 1, 0, 3, 2]
+    first = cands[1]
+    assert (first['t'], first['dm'], first['npix']) == (11, 6, 4)
+    assert (first['t_min'], first['t_max'], first['dm_min'], first['dm_max']) == (10, 15, 5, 7)
+
+
+def test_clusterer_across_blocks():
+    snr = np.zeros((200, 20), dtype='float32')
+    snr[95:105, 8:11] = 10
+    snr[100, 9] = 15
+    snr[20, 2] = 8
+    clusterer = CandidateClusterer(threshold=7.)
+    cands = [clusterer.add_block(snr[:100], 0), clusterer.add_block(snr[90:], 90, final=True)]
+    assert [c.size for c in cands] == [1, 1]
+    burst = cands[1][0]
+    assert (burst['snr'], burst['t'], burst['dm'], burst['npix']) == (15, 100, 9, 30)
+    assert cands[0][0]['t'] == 20
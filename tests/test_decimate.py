@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from decimate import decimate, decimate_axes
+
+
+@pytest.fixture
+def raw():
+    return np.random.default_rng(0).integers(0, 2**16, size=(1003, 2060), dtype='uint16')
+
+
+@pytest.mark.parametrize('tbin,fbin', [(1, 1), (4, 1), (1, 8), (3, 16), (16, 2048)])
+def test_decimate_vs_reshape(raw, tbin, fbin):
+    n = raw.shape[0] // tbin
+    spec = raw[:n*tbin, 12:].astype('float64')
+    expected = spec.reshape(n, tbin, 2048 // fbin, fbin).sum(axis=(1, 3))
+    out = decimate(raw, tbin, fbin)
+    assert out.shape == expected.shape and out.dtype == np.float32
+    assert np.allclose(out, expected, rtol=1e-6)
+    mean = decimate(raw[:, 12:], tbin, fbin, reduce='mean', dtype='float64')
+    assert np.allclose(mean, expected/(tbin*fbin), rtol=1e-12)
+
+
+def test_decimate_out(raw):
+    out = np.full((250, 256), np.nan, dtype='float32')
+    assert decimate(raw, 4, 8, out=out) is out
+    assert np.array_equal(out, decimate(raw, 4, 8))
+
+
+def test_decimate_axes():
+    freqs = np.linspace(1150e6, 1650e6, 2048)
+    times = np.arange(1003)*1e-4
+    f, t = decimate_axes(freqs, times, tbin=4, fbin=8)
+    assert np.allclose(f, freqs.reshape(256, 8).mean(axis=1))
+    assert t.size == 250 and np.isclose(t[0], 1.5e-4)
+
+
+def test_iter_blocks_decimated(tmp_path):
+    from reader import iter_blocks, memmap_file
+    from limbo_writer import write_recorder_file
+    path = str(tmp_path/'data.dat')
+    write_recorder_file(path, 3001, seed=0, start_time=0.)
+    full = decimate(memmap_file(path), 4, 8)
+    for start, block in iter_blocks(path, 128, overlap=16, tbin=4, fbin=8):
+        n = min(128, full.shape[0] - start)
+        assert np.array_equal(block[:n], full[start:start+n])
+        assert not block[n:].any() # zero-padded last block
+    assert start + 128 >= full.shape[0]
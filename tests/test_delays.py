@@ -0,0 +1,53 @@
+import numpy as np
+import delays
+from delays import DM_CONST, DelayTables, dm_delay
+
+
+def test_single_dispersion_constant():
+    import simfrb
+    import wavegen
+    from old import fdmt
+    sim = simfrb.SimFRB(seed=0)
+    assert sim.CONST == DM_CONST
+    assert sim.DM_delay(332.72, 1.4e9) == dm_delay(332.72, 1.4e9)
+    assert wavegen.CONST == DM_CONST
+    assert fdmt.DispersionConstant == DM_CONST/1e9 # [ms MHz^2]
+
+
+def test_dm_delay():
+    # 1 GHz at DM 1 is delayed by DM_CONST/1e18 s
+    assert np.isclose(dm_delay(1., 1e9), 4.148808e-3)
+    assert np.allclose(dm_delay(np.array([0., 100.]), 1.4e9), [0., 100*DM_CONST/1.4e9**2])
+
+
+def test_shift_table():
+    tables = DelayTables(maxsize=2)
+    freqs = np.linspace(1150e6, 1650e6, 64)
+    dms = np.linspace(0, 500, 11)
+    shifts = tables.table(freqs, 1e-3, dms)
+    expected = np.round((dm_delay(dms[:, None], freqs) - dm_delay(dms[:, None], freqs[-1]))/1e-3)
+    assert shifts.dtype == np.int16
+    assert np.array_equal(shifts, expected)
+    assert not shifts.flags.writeable
+    assert np.array_equal(tables.table(freqs, 1e-3, 250.), shifts[5])
+    bottom = tables.table(freqs, 1e-3, dms, ref='bottom')
+    expected = np.round((dm_delay(dms[:, None], freqs) - dm_delay(dms[:, None], freqs[0]))/1e-3)
+    assert np.array_equal(bottom, expected) and bottom.max() == 0
+
+
+def test_shift_table_cache():
+    tables = DelayTables(maxsize=2)
+    freqs = np.linspace(1150e6, 1650e6, 16)
+    a = tables.table(freqs, 1e-3, np.arange(4.))
+    assert tables.table(freqs.copy(), 1e-3, np.arange(4.)) is a
+    b = tables.table(freqs, 2e-3, np.arange(4.))
+    assert b is not a
+    tables.table(freqs, 1e-3, np.arange(5.)) # evicts the oldest grid
+    hits, misses, n, nbytes = tables.info()
+    assert (hits, misses, n) == (1, 3, 2)
+    assert tables.table(freqs, 1e-3, np.arange(4.)) is not a
+
+
+def test_shared_tables():
+    freqs = np.linspace(1150e6, 1650e6, 16)
+    assert delays.shift_table(freqs, 1e-3, np.arange(3.)) is delays.TABLES.table(freqs, 1e-3, np.arange(3.))
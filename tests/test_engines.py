@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from brute import BruteForceEngine, validate
+from dedisp_plan import TreeEngine, HomebrewEngine
+from simfrb import SimFRB
+
+NFREQS, NTIMES, T_SAMP = 64, 512, 1e-3
+FREQS = np.linspace(1150e6, 1650e6, NFREQS)
+TIMES = np.arange(NTIMES)*T_SAMP
+
+
+def burst(DM=60., t0=0.1):
+    block = np.zeros((NTIMES, NFREQS), dtype='float32')
+    SimFRB(seed=1).add_pulse(block, f_min=FREQS[0], f_max=FREQS[-1], DM=DM, pulse_width=2e-3, pulse_amp=10,
+                             t0=t0, t_samp=T_SAMP, noise=False)
+    return block
+
+
+def peak(dmt):
+    return np.unravel_index(np.argmax(dmt), dmt.shape)
+
+
+def test_brute_zero_dm():
+    block = np.random.default_rng(0).standard_normal((NTIMES, NFREQS)).astype('float32')
+    out = BruteForceEngine(FREQS, TIMES, dms=[0.]).apply(block)
+    assert np.allclose(out[:, 0], block.sum(axis=1), rtol=1e-5, atol=1e-4)
+
+
+def test_brute_direct_sum():
+    block = np.random.default_rng(1).standard_normal((NTIMES, NFREQS)).astype('float32')
+    engine = BruteForceEngine(FREQS, TIMES, dms=[0., 37.5, 90.])
+    out = engine.apply(block)
+    for d, delays in enumerate(engine.delays):
+        expected = np.zeros(NTIMES)
+        for c, s in enumerate(delays):
+            expected[:NTIMES - s] += block[s:, c]
+        assert np.allclose(out[:, d], expected, rtol=1e-4, atol=1e-3)
+
+
+def test_brute_tiling():
+    block = burst()
+    ref = BruteForceEngine(FREQS, TIMES, maxDM=100).apply(block)
+    out = BruteForceEngine(FREQS, TIMES, maxDM=100, tile=37, dm_chunk=5, nthreads=3).apply(block)
+    assert np.array_equal(out, ref)
+
+
+def test_tree_vs_brute():
+    DM, t0 = 60., 0.1
+    block = burst(DM, t0)
+    tree = TreeEngine(FREQS, TIMES, maxDM=100)
+    out = tree.apply(block)
+    ref = BruteForceEngine(FREQS, TIMES, dms=tree.dms).apply(block)
+    (t, d), (t_ref, d_ref) = peak(out), peak(ref)
+    assert d == d_ref
+    assert abs(tree.dms[d] - DM) <= tree.dms[1]
+    # the tree times arrivals at the bottom of the band, brute at the top
+    assert abs(t*T_SAMP + tree.t_offset[d] - t_ref*T_SAMP) < T_SAMP/2
+    assert abs(t_ref*T_SAMP - t0) <= T_SAMP
+    ratio = validate(tree, block, FREQS, T_SAMP)
+    assert ratio[d] > 0.9
+
+
+def test_tree_vs_brute_zero_dm():
+    block = np.zeros((NTIMES, NFREQS), dtype='float32')
+    block[100] = 1
+    tree = TreeEngine(FREQS, TIMES, maxDM=100)
+    ref = BruteForceEngine(FREQS, TIMES, dms=tree.dms[:1]).apply(block)
+    assert np.array_equal(tree.apply(block)[:, 0], ref[:, 0])
+
+
+def test_homebrew_vs_brute():
+    pytest.importorskip('fdmt_homebrew')
+    block = burst()
+    homebrew = HomebrewEngine(FREQS, TIMES, maxDM=100)
+    ref = BruteForceEngine(FREQS, TIMES, dms=homebrew.dms).apply(block)
+    (t, d), (t_ref, d_ref) = peak(homebrew.apply(block)), peak(ref)
+    assert abs(d - d_ref) <= 1 and abs(t - t_ref) <= 1
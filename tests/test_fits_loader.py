@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+fits = pytest.importorskip('astropy.io.fits')
+from fits_loader import load_fits_spectra, COL_NAMES
+
+
+def write_fits(path, nspec=7, nrows=16, nsub=1, pad_hdu=None, seed=0):
+    rng = np.random.default_rng(seed)
+    form = '{0}D'.format(nsub) if nsub > 1 else 'D'
+    hdus = [fits.PrimaryHDU()]
+    for i in range(nspec + 1): # the last HDU is not a spectrum
+        cols = [fits.Column(name=name, format=form, array=rng.standard_normal((nrows, nsub)).squeeze(axis=-1)
+                            if nsub == 1 else rng.standard_normal((nrows, nsub))) for name in COL_NAMES]
+        hdu = fits.BinTableHDU.from_columns(cols)
+        if i == pad_hdu: # a longer header moves the following HDUs off the regular spacing
+            for k in range(40):
+                hdu.header['PAD{0}'.format(k)] = k
+        hdus.append(hdu)
+    fits.HDUList(hdus).writeto(path)
+
+
+def reference(path, col_name):
+    # the list comprehension plot_from_fits.py used before load_fits_spectra
+    with fits.open(path) as F:
+        data = np.array([F[i].data[col_name] for i in range(1, len(F)-1)]) # ignore PrimaryHDU
+    return data.reshape(data.shape[0], -1)
+
+
+@pytest.mark.parametrize('nsub,pad_hdu,nthreads', [(1, None, 1), (1, 3, 1), (4, None, 3), (4, 2, 2)])
+def test_matches_hdu_loop(tmp_path, nsub, pad_hdu, nthreads):
+    path = str(tmp_path/'spectra.fits')
+    write_fits(path, nsub=nsub, pad_hdu=pad_hdu)
+    for col in COL_NAMES:
+        data = load_fits_spectra(path, col, nthreads=nthreads)
+        assert data.shape == (7, 16*nsub) and data.dtype.isnative
+        assert np.array_equal(data, reference(path, col))
+    both = load_fits_spectra(path, ['auto0_real', 'cross_imag'])
+    assert np.array_equal(both['cross_imag'], reference(path, 'cross_imag'))
+
+
+def test_missing_column(tmp_path):
+    path = str(tmp_path/'spectra.fits')
+    write_fits(path)
+    with pytest.raises(AssertionError):
+        load_fits_spectra(path, 'auto2_real')
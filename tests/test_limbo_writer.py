@@ -0,0 +1,45 @@
+import numpy as np
+import limbo_writer
+from limbo_writer import write_recorder_file, read_info
+from reader import memmap_file, iter_blocks
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path/'synthetic.dat')
+    nspec, t_samp, start = 3000, 1e-4, 1700000000.25
+    written, dropped = write_recorder_file(path, nspec, t_samp=t_samp, chunk=1024, start_time=start, seed=3)
+    assert (written, dropped) == (nspec, 0)
+    with open(path, 'rb') as f:
+        text = f.read(limbo_writer.header).rstrip(b'\0').decode('ascii')
+    meta = dict(line.split(' = ') for line in text.splitlines())
+    assert meta['nspec'] == str(nspec) and meta['seed'] == '3' and meta['tsamp'] == str(t_samp)
+    raw = memmap_file(path)
+    assert raw.shape == (nspec, 2060)
+    t, count = read_info(raw)
+    assert np.array_equal(count, np.arange(nspec))
+    assert np.allclose(t - start, np.arange(nspec)*t_samp, atol=1e-6)
+    spec = raw[:, 12:].astype('float64')
+    assert abs(spec.mean() - 1000) < 1 and abs(spec.std() - 30) < 1
+    # the same seed writes the same file, whatever the chunk size
+    again = str(tmp_path/'again.dat')
+    write_recorder_file(again, nspec, t_samp=t_samp, chunk=1024, start_time=start, seed=3)
+    assert np.array_equal(memmap_file(again), raw)
+
+
+def test_drops(tmp_path):
+    path = str(tmp_path/'drops.dat')
+    written, dropped = write_recorder_file(path, 4000, drop_rate=0.1, chunk=1000, start_time=0., seed=4)
+    assert written + dropped == 4000 and 200 < dropped < 600
+    t, count = read_info(memmap_file(path))
+    assert count.size == written
+    assert np.all(np.diff(count) >= 1) and np.diff(count).max() > 1
+    assert np.allclose(t, count*1e-4, atol=1e-6)
+
+
+def test_burst(tmp_path):
+    path = str(tmp_path/'burst.dat')
+    t_samp, t0 = 1e-3, 0.6
+    write_recorder_file(path, 1024, t_samp=t_samp, bursts=[(t0, 0., 2e-3, 10.)], start_time=0., seed=5)
+    (start, block), = iter_blocks(path, 1024)
+    series = block.sum(axis=1)
+    assert abs(np.argmax(series)*t_samp - t0) <= t_samp
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from old.fdmt import minimize_nspec
+
+
+def active_span(image, sigma, window):
+    # explicit loop over every run of window samples
+    runs = [i for i in range(image.shape[1] - window + 1) if image[:, i:i+window].mean() > sigma]
+    return runs[0], runs[-1] + window
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    im = rng.standard_normal((32, 4096)).astype('float32')
+    im[:, 1500:1530] += 3 # a burst in the middle of a power-of-two range
+    return im
+
+
+@pytest.mark.parametrize('window,margin', [(1, 0), (8, 0), (8, 20)])
+def test_span_vs_loop(image, window, margin):
+    start, stop = active_span(image, 1., window)
+    out, s = minimize_nspec(image, 1., window=window, margin=margin, pow2=False, return_start=True)
+    assert s == start - margin and out.shape[1] == stop - start + 2*margin
+    assert np.shares_memory(out, image) and np.array_equal(out, image[:, s:s+out.shape[1]])
+
+
+def test_pow2(image):
+    out, s = minimize_nspec(image, 1., return_start=True)
+    assert out.shape[1] == 32 and s == 1500
+    image[:, 4090:] += 3 # at the end: the power-of-two span is moved back inside the data
+    out, s = minimize_nspec(image, 1., return_start=True)
+    assert out.shape[1] == 4096 and s == 0
+    assert np.shares_memory(out, image)
+
+
+def test_pad_and_quiet():
+    im = np.zeros((4, 100), dtype='float32')
+    im[:, 10] = 5
+    out, s = minimize_nspec(im[:, :3], 1., return_start=True) # nothing active, shorter than a power of two
+    assert out.shape == (4, 4) and s == 0 and not out[:, 3].any()
+    assert minimize_nspec(np.zeros((4, 64)), 1.).shape == (4, 64) # nothing active: everything kept
+    assert minimize_nspec(im, 1.).shape == (4, 2)
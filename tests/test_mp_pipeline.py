@@ -0,0 +1,49 @@
+import time
+import numpy as np
+import pytest
+from mp_pipeline import run_pipeline
+from reader import iter_blocks
+from limbo_writer import write_recorder_file
+
+
+class SlowEngine:
+    # engine factory and engine: the time a block takes depends on its
+    # content, so the workers finish blocks out of order
+    def __call__(self):
+        return self
+
+    def apply(self, block):
+        time.sleep(0.03*(int(block[0, 0]) % 4))
+        return block[::-1] * 2
+
+
+def shift(block, start):
+    block += 1
+
+
+def summary(dmt, start):
+    return float(dmt.sum(dtype='float64')), float(dmt[-1, 0])
+
+
+@pytest.mark.parametrize('nworkers', [1, 3])
+def test_ordered_reassembly(tmp_path, nworkers):
+    path = str(tmp_path/'data.dat')
+    write_recorder_file(path, 3000, seed=0, start_time=0.)
+    expected = [(start, summary((block[::-1] + 1)*2, start))
+                for start, block in iter_blocks(path, 256, overlap=32, fbin=16)]
+    got = list(run_pipeline(path, SlowEngine(), 256, overlap=32, nworkers=nworkers, nslots=4,
+                            rfi=shift, find_candidates=summary, fbin=16))
+    assert [s for s, c in got] == [s for s, c in expected]
+    assert np.allclose([c for s, c in got], [c for s, c in expected], rtol=1e-6)
+
+
+def failing(block, start):
+    if start > 0:
+        raise ValueError('bad block')
+
+
+def test_stage_error(tmp_path):
+    path = str(tmp_path/'data.dat')
+    write_recorder_file(path, 1000, seed=0, start_time=0.)
+    with pytest.raises(RuntimeError, match='bad block'):
+        list(run_pipeline(path, SlowEngine(), 256, nworkers=1, normalize=failing, fbin=16))
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from normalize import BandpassNormalizer
+
+
+def stream(nblocks=6, nspec=200, nchans=32, seed=0):
+    rng = np.random.default_rng(seed)
+    bandpass = rng.uniform(10, 1000, nchans)
+    return [bandpass*(1 + 0.1*rng.standard_normal((nspec + 17*i, nchans))) for i in range(nblocks)]
+
+
+def test_welford_matches_numpy():
+    blocks = stream()
+    norm = BandpassNormalizer(nchans=32)
+    for i, block in enumerate(blocks):
+        norm.update(block)
+        seen = np.concatenate(blocks[:i + 1])
+        assert norm.count == seen.shape[0]
+        assert np.allclose(norm.mean, seen.mean(axis=0), rtol=1e-12)
+        assert np.allclose(norm.var, seen.var(axis=0), rtol=1e-9)
+
+
+def test_ema_matches_recursion():
+    blocks = stream()
+    alpha = 0.2
+    norm = BandpassNormalizer(nchans=32, mode='ema', alpha=alpha)
+    mean, var = blocks[0].mean(axis=0), blocks[0].var(axis=0)
+    norm.update(blocks[0])
+    for block in blocks[1:]:
+        norm.update(block)
+        # weighted mean and variance of the old statistics (1 - alpha) and the block (alpha)
+        b_mean = block.mean(axis=0)
+        new_mean = (1 - alpha)*mean + alpha*b_mean
+        var = (1 - alpha)*(var + (mean - new_mean)**2) + alpha*(block.var(axis=0) + (b_mean - new_mean)**2)
+        mean = new_mean
+        assert np.allclose(norm.mean, mean, rtol=1e-12)
+        assert np.allclose(norm.var, var, rtol=1e-9)
+
+
+def test_apply_in_place():
+    block = stream(nblocks=1)[0].astype('float32')
+    block[:, 3] = 5. # dead channel
+    norm = BandpassNormalizer(nchans=32)
+    out = norm.apply(block)
+    assert out is block
+    assert np.allclose(block.mean(axis=0), 0, atol=1e-4)
+    live = np.arange(32) != 3
+    assert np.allclose(block[:, live].std(axis=0), 1, rtol=1e-4)
+    assert not block[:, 3].any()
+
+
+def test_mode():
+    with pytest.raises(AssertionError):
+        BandpassNormalizer(mode='median')
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from prefetch import Prefetcher
+from reader import iter_blocks
+from limbo_writer import write_recorder_file
+
+
+def counting_blocks(out, nblocks=20, shape=(8, 4)):
+    for i in range(nblocks):
+        buf = out()
+        buf[...] = i
+        yield i*shape[0], buf
+
+
+def test_plain_iterable():
+    blocks = [(i, np.full(3, i)) for i in range(10)]
+    pre = Prefetcher(iter(blocks), depth=3)
+    got = [(start, block.copy()) for start, block in pre]
+    pre.close()
+    assert [s for s, b in got] == list(range(10))
+    assert all((b == s).all() for s, b in got)
+    stats = pre.stats()
+    assert stats['nblocks'] == 10 and pre.occupancy.sum() == 11 # one get per block and one for the end
+    assert 0 <= stats['mean_occupancy'] <= 3
+
+
+def test_buffer_recycling():
+    pre = Prefetcher(counting_blocks, depth=2, shape=(8, 4))
+    ids = set()
+    for i, (start, block) in enumerate(pre):
+        assert start == 8*i and (block == i).all() # not overwritten while held
+        ids.add(id(block))
+    pre.close()
+    assert i == 19
+    assert len(ids) <= 2 + 2 # depth+2 preallocated buffers, reused
+    assert pre._free.qsize() == 4 # every buffer went back to the pool
+
+
+def test_from_file(tmp_path):
+    path = str(tmp_path/'data.dat')
+    write_recorder_file(path, 5000, seed=0, start_time=0.)
+    expected = [(s, b.copy()) for s, b in iter_blocks(path, 1024, overlap=100, fbin=4)]
+    pre = Prefetcher.from_file(path, 1024, overlap=100, fbin=4)
+    got = [(s, b.copy()) for s, b in pre]
+    pre.close()
+    assert [s for s, b in got] == [s for s, b in expected]
+    assert all(np.array_equal(a, b) for (s, a), (t, b) in zip(got, expected))
+
+
+def test_close_early():
+    # the reader is blocked on a full queue and on an empty buffer pool
+    pre = Prefetcher(lambda out: counting_blocks(out, nblocks=1000), depth=2, shape=(8, 4))
+    it = iter(pre)
+    next(it)
+    pre.close()
+    assert not pre._thread.is_alive()
+
+
+def test_reader_error():
+    def failing():
+        yield 0, np.zeros(3)
+        raise IOError('truncated file')
+    pre = Prefetcher(failing())
+    with pytest.raises(IOError):
+        for block in pre:
+            pass
+    pre.close()
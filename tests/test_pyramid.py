@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pytest
+from pyramid import build_pyramid, Pyramid
+
+
+@pytest.fixture
+def dat_file(tmp_path):
+    path = str(tmp_path/'data.dat')
+    raw = np.random.default_rng(0).integers(0, 2**16, size=(5003, 2060), dtype='uint16')
+    with open(path, 'wb') as f:
+        f.write(b'\0'*1024)
+        raw.tofile(f)
+    return path, raw[:, 12:].astype('float64')
+
+
+def test_levels_vs_reshape(dat_file):
+    path, spec = dat_file
+    # blocks of 1000 spectra are not a multiple of any bin, so every level carries rows over
+    build_pyramid(path, factor=4, max_cols=64, block_spec=1000)
+    pyr = Pyramid(path, factor=4, max_cols=64)
+    assert pyr.nlevels == 4 # 5003 // 4**4 = 19 is the first level with at most 64 spectra
+    for k in range(1, pyr.nlevels + 1):
+        b = 4**k
+        n = spec.shape[0] // b
+        binned = spec[:n*b].reshape(n, b, -1)
+        assert np.array_equal(pyr.levels[k]['min'], binned.min(axis=1))
+        assert np.array_equal(pyr.levels[k]['max'], binned.max(axis=1))
+        assert np.allclose(pyr.levels[k]['mean'], binned.mean(axis=1), rtol=1e-6)
+
+
+def test_tile(dat_file):
+    path, spec = dat_file
+    pyr = Pyramid(path, factor=4, max_cols=64)
+    data, extent, level = pyr.tile(10, 50)
+    assert level == 0 and extent == (10, 50) and np.array_equal(data, spec[10:50])
+    data, extent, level = pyr.tile(100.5, 900, stat='min')
+    assert level == 2 and extent == (96, 912)
+    assert np.array_equal(data, spec[96:912].reshape(-1, 16, 2048).min(axis=1))
+    assert pyr.tile(0, 5003)[2] == pyr.nlevels
+
+
+def test_rebuild_when_stale(dat_file):
+    path, spec = dat_file
+    Pyramid(path, factor=4, max_cols=64)
+    meta = os.path.join(path + '.pyramid', 'meta.json')
+    mtime = os.stat(meta).st_mtime_ns
+    Pyramid(path, factor=4, max_cols=64)
+    assert os.stat(meta).st_mtime_ns == mtime # reused
+    Pyramid(path, factor=2, max_cols=64)
+    assert os.stat(meta).st_mtime_ns != mtime # other factor: rebuilt
@@ -0,0 +1,40 @@
+import numpy as np
+from rfi import RFIFilter
+
+
+def block(nspec=2048, nchans=256, seed=0):
+    rng = np.random.default_rng(seed)
+    return (100 + 5*rng.standard_normal((nspec, nchans))).astype('float32')
+
+
+def test_rfi_masks():
+    data = block()
+    data[:, 40] += 50*np.sin(np.arange(2048)) # noisy channel
+    data[:, 41] = 100 # dead channel
+    data[1000] += 20 # broadband burst of RFI
+    data[500, 7] += 100 # single-sample spike, too weak to show at zero DM
+    rfi = RFIFilter(nchans=256)
+    chan_mask, time_mask = rfi.apply(data)
+    assert set(np.flatnonzero(chan_mask)) == {40, 41}
+    assert list(np.flatnonzero(time_mask)) == [1000]
+    assert rfi.nclipped >= 1
+    assert data[500, 7] == rfi.median[7]
+    # flagged channels and spectra hold the running median
+    assert np.allclose(data[:, 40], rfi.median[40])
+    assert np.allclose(data[1000, ~chan_mask], rfi.median[~chan_mask])
+
+
+def test_zero_dm():
+    data = block()
+    data += 10*np.random.default_rng(1).standard_normal((2048, 1)).astype('float32') # common-mode drift
+    before = data.mean(axis=1).std()
+    RFIFilter(nchans=256, time_sigma=1e9).apply(data)
+    assert data.mean(axis=1).std() < before/5
+
+
+def test_clean_data_untouched():
+    data = block(seed=2)
+    original = data.copy()
+    chan_mask, time_mask = RFIFilter(nchans=256, clip_sigma=10, zero_dm=False).apply(data)
+    assert not chan_mask.any() and not time_mask.any()
+    assert np.array_equal(data, original)
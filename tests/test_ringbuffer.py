@@ -0,0 +1,58 @@
+import json
+import numpy as np
+from ringbuffer import SpectraRing, CutoutWriter
+
+NCHANS = 8
+
+
+def stream(n, seed=0):
+    return np.random.default_rng(seed).integers(0, 2**16, size=(n, NCHANS), dtype='uint16')
+
+
+def test_ring_wraparound():
+    data = stream(1000)
+    ring = SpectraRing(100, nchans=NCHANS)
+    pos = 0
+    for n in [30, 70, 45, 1, 250, 99, 5, 100, 400]: # blocks larger than the ring too
+        ring.append(data[pos:pos+n])
+        pos += n
+        assert ring.count == pos and ring.oldest() == max(0, pos - 100)
+        for start, stop in [(pos - 100, pos), (pos - 37, pos - 3), (pos - 150, pos + 10)]:
+            out, s, e = ring.get(start, stop)
+            assert (s, e) == (max(start, ring.oldest()), min(stop, pos))
+            assert np.array_equal(out, data[s:e])
+    assert ring.get(pos - 300, pos - 200)[0].shape == (0, NCHANS)
+
+
+def load(path):
+    with open(path + '.json') as f:
+        return np.load(path + '.npy'), json.load(f)
+
+
+def test_cutouts(tmp_path):
+    data = stream(20000)
+    freqs = np.linspace(1150e6, 1650e6, NCHANS)
+    ring = SpectraRing(4096, nchans=NCHANS)
+    writer = CutoutWriter(ring, freqs, 1e-3, str(tmp_path), pad=64)
+    sweep = writer.sweep_length(300.)
+    triggers = {5000: True, 12000: True, 19990: False} # t_index: sweep complete before the end of the stream
+    for i0 in range(0, 20000, 1500):
+        writer.append(data[i0:i0+1500])
+        for t in triggers:
+            if i0 <= t < i0 + 1500:
+                writer.trigger(t, 300., snr=9.)
+    writer.trigger(100, 0.) # starts before the first spectrum ever held
+    writer.close()
+    assert len(writer.written) == 4
+    cuts = {meta['t_index']: (cut, meta) for cut, meta in map(load, writer.written)}
+    for t, complete in triggers.items():
+        cut, meta = cuts[t]
+        assert meta['start'] == t - 64 and meta['snr'] == 9.
+        assert meta['clipped'] == (not complete)
+        if complete:
+            assert meta['stop'] == t + sweep + 64 and 'stop_requested' not in meta
+        else:
+            assert meta['stop'] == 20000 and meta['stop_requested'] == t + sweep + 64
+        assert np.array_equal(cut, data[meta['start']:meta['stop']])
+    cut, meta = cuts[100]
+    assert meta['clipped'] and meta['start'] == 20000 - 4096 and cut.shape[0] == 0
@@ -0,0 +1,85 @@
+import tracemalloc
+import numpy as np
+from simfrb import SimFRB
+
+
+def burst_params(n, seed=3):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(50, 1000, n), rng.uniform(1e-3, 5e-3, n), rng.uniform(1, 5, n), rng.uniform(0, 1, n)
+
+
+def test_make_frbs_vs_make_frb_loop():
+    DM, width, amp, t0 = burst_params(7)
+    sim = SimFRB(seed=1)
+    loop = np.array([sim.make_frb(1024, 256, DM=DM[i], pulse_width=width[i], pulse_amp=amp[i], t0=t0[i])
+                     for i in range(7)])
+    chunks = list(SimFRB(seed=1).make_frbs(DM, width, amp, t0, 1024, 256, max_bytes=2**22))
+    assert [i0 for i0, p in chunks] == list(range(0, 7, chunks[0][1].shape[0]))
+    assert len(chunks) > 1
+    batch = np.concatenate([p for i0, p in chunks])
+    assert batch.shape == (7, 1024, 256) and batch.dtype == np.float32
+    assert np.allclose(batch, loop, atol=1e-4)
+
+
+def test_make_frbs_broadcast():
+    DM, width, amp, t0 = burst_params(4)
+    (i0, a), = SimFRB(seed=0).make_frbs(DM, 2e-3, 3., 0.1, 512, 64, noise=False)
+    (i0, b), = SimFRB(seed=0).make_frbs(DM, np.full(4, 2e-3), np.full(4, 3.), np.full(4, 0.1), 512, 64, noise=False)
+    assert a.shape == (4, 512, 64) and np.array_equal(a, b)
+
+
+def test_make_frbs_bounded_memory():
+    DM, width, amp, t0 = burst_params(40)
+    max_bytes = 2**23
+    tracemalloc.start()
+    try:
+        n = 0
+        for i0, profiles in SimFRB(seed=0).make_frbs(DM, width, amp, t0, 1024, 256, max_bytes=max_bytes):
+            n += profiles.shape[0]
+            del profiles
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert n == 40
+    all_bursts = 40*1024*256*4
+    assert peak < 2*max_bytes < all_bursts
+
+
+def test_add_pulse_sweep():
+    sim = SimFRB(seed=0)
+    f_min, f_max, t_samp, t0, DM = 1150e6, 1650e6, 1e-3, 0.05, 100.
+    frb = np.zeros((512, 32), dtype='float32')
+    sim.add_pulse(frb, f_min=f_min, f_max=f_max, DM=DM, pulse_width=2e-3, pulse_amp=1, t0=t0, t_samp=t_samp,
+                  noise=False)
+    freqs = np.linspace(f_min, f_max, 32)
+    arrival = t0 + sim.DM_delay(DM, freqs) - sim.DM_delay(DM, f_max)
+    assert np.all(np.abs(np.argmax(frb, axis=0)*t_samp - arrival) <= t_samp)
+
+
+def test_add_pulse_into_data():
+    # added in place into existing data, only around the sweep
+    sim = SimFRB(seed=0)
+    data = np.ones((512, 32), dtype='float32')
+    out = sim.add_pulse(data, f_min=1150e6, f_max=1650e6, DM=100., pulse_width=1e-3, pulse_amp=5, t0=0.05,
+                        t_samp=1e-3)
+    assert out is data
+    assert np.all(data[:40] == 1) and np.all(data[-100:] == 1)
+    assert np.isclose(data[50, -1], 6., atol=0.01)
+
+
+def test_noise_same_for_any_nthreads():
+    ref = SimFRB(seed=7).noise((1000, 64), loc=5., scale=2.)
+    for nthreads in (2, 3):
+        assert np.array_equal(SimFRB(seed=7).noise((1000, 64), loc=5., scale=2., nthreads=nthreads), ref)
+    out = np.empty((1000, 64), dtype='float32')
+    assert SimFRB(seed=7, nthreads=4).noise(out.shape, loc=5., scale=2., out=out) is out
+    assert np.array_equal(out, ref)
+    assert abs(ref.mean() - 5) < 0.05 and abs(ref.std() - 2) < 0.05
+
+
+def test_noise_from_rng():
+    a = SimFRB(rng=np.random.default_rng(5)).noise((300, 8), dtype='float64')
+    b = SimFRB(seed=5).noise((300, 8), dtype='float64')
+    assert np.array_equal(a, b) and a.dtype == np.float64
+    sim = SimFRB(seed=5)
+    assert not np.array_equal(sim.noise((300, 8)), sim.noise((300, 8))) # consecutive draws differ
@@ -0,0 +1,63 @@
+import numpy as np
+from rfi import SpectralKurtosis, sk_flag_file
+from limbo_writer import write_recorder_file
+
+M, NCHANS = 64, 16
+
+
+def power(nspec=1000, seed=2):
+    # single FFT powers: exponentially distributed, SK = 1 in expectation
+    x = np.random.default_rng(seed).exponential(100., size=(nspec, NCHANS)).astype('float32')
+    x[320:330, 5] += 5000 # bursty RFI in window 5 of channel 5
+    return x
+
+
+def reference(x):
+    n = x.shape[0] // M
+    w = x[:n*M].astype('float64').reshape(n, M, -1)
+    s1, s2 = w.sum(axis=1), (w**2).sum(axis=1)
+    return M*np.arange(n), (M + 1)/(M - 1)*(M*s2/s1**2 - 1)
+
+
+def test_window_carry_over():
+    x = power()
+    starts, sk = reference(x)
+    flagger = SpectralKurtosis(NCHANS, M=M)
+    got = [flagger.update(x[a:b]) for a, b in zip([0, 10, 11, 200, 263, 700], [10, 11, 200, 263, 700, 1000])]
+    assert np.array_equal(np.concatenate([g[0] for g in got]), starts)
+    assert np.allclose(np.concatenate([g[1] for g in got]), sk, rtol=1e-6)
+    mask = np.concatenate([g[2] for g in got])
+    assert mask[5, 5] and mask.sum() == 1
+    assert flagger.count == 1000 % M and flagger.nseen == 1000
+    # the same result in one block
+    s, k, m = SpectralKurtosis(NCHANS, M=M).update(x)
+    assert np.array_equal(m, mask) and np.allclose(k, sk, rtol=1e-6)
+
+
+def test_apply_across_blocks():
+    x = power()
+    flagger = SpectralKurtosis(NCHANS, M=M)
+    a, b = x[:300].copy(), x[300:].copy()
+    flagger.apply(a)
+    starts, sk, mask = flagger.apply(b)
+    assert np.array_equal(a, x[:300]) # no flagged window ended in the first block
+    assert list(starts[:2]) == [256, 320] # window 4 started in the first block and ends in this one
+    assert mask[1, 5] and mask.sum() == 1
+    assert b[20:30, 5].max() < 1000 # the burst is blanked
+    assert np.array_equal(np.delete(b, 5, axis=1), np.delete(x[300:], 5, axis=1))
+
+
+def test_time_flag():
+    x = power()
+    x[640:704] *= np.random.default_rng(1).exponential(1., size=(64, 1)).astype('float32')**4 # broadband bursts
+    starts, sk, mask = SpectralKurtosis(NCHANS, M=M, time_frac=0.2).update(x)
+    assert mask[10].all()
+
+
+def test_sk_flag_file(tmp_path):
+    path = str(tmp_path/'data.dat')
+    write_recorder_file(path, 2000, seed=0, start_time=0.)
+    starts, mask = sk_flag_file(path, M=M, block_size=300)
+    from reader import memmap_file
+    ref_starts, ref_mask = SpectralKurtosis(2048, M=M).update(memmap_file(path)[:, 12:])[::2]
+    assert np.array_equal(starts, ref_starts) and np.array_equal(mask, ref_mask)
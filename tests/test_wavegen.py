@@ -0,0 +1,128 @@
+import sys
+import types
+import time as Time
+import numpy as np
+import pytest
+from gpio_backends import FakeGPIO, PigpioBackend, LOW, HIGH
+from wavegen import WaveGen
+
+FREQS = np.linspace(1150e6, 1650e6, 37)
+
+
+def fake_gen(calibration=None, **kwargs):
+    fake = FakeGPIO(clock=lambda: 0)
+    gen = WaveGen(backend=fake, calibration=calibration, **kwargs)
+    fake.clear() # forget the pin setup
+    return gen, fake
+
+
+def test_compile_wave():
+    gen, fake = fake_gen()
+    bits = gen.compile_sweep(FREQS)
+    fake.send_wave(gen.compile_wave(bits, 1e-3))
+    sends = fake.edges(gen.gpio_pclk_pin, LOW)
+    assert sends.size == FREQS.size
+    assert np.all(np.diff(sends) == 1000000) # [ns]
+    # the data pin is sampled on each rising serial clock edge
+    t_data, _, v_data = fake.writes(gen.gpio_data_pin)
+    t_sclk, _, v_sclk = fake.writes(gen.gpio_sclk_pin)
+    rising = t_sclk[v_sclk == HIGH]
+    sampled = v_data[np.searchsorted(t_data, rising, side='right') - 1]
+    assert np.array_equal(sampled.reshape(-1, 40), bits)
+    with pytest.raises(AssertionError):
+        gen.compile_wave(bits, 300e-6)
+
+
+def test_dma_sweep_on_fake():
+    gen, fake = fake_gen(dma=True)
+    gen.dm_sweep(DM=100., dt=1e-3)
+    t, intervals, loads = gen.sweep_timing()
+    assert np.all(intervals == 1000.)
+    assert not fake_gen()[0].dma # Python timing unless asked for
+
+
+class FakePi:
+    # pigpio.pi stand-in: a wave plays for two polls of wave_tx_at
+    def __init__(self, host, port):
+        self.connected = True
+        self.waves, self.sent, self.deleted = {}, [], []
+        self.pending = []
+        self.most = 0
+        self.polls = 0
+
+    def write(self, pin, level):
+        pass
+
+    def wave_clear(self):
+        pass
+
+    def wave_add_generic(self, pulses):
+        self.pending = list(pulses)
+
+    def wave_create(self):
+        wid = len(self.waves)
+        self.waves[wid], self.pending = self.pending, []
+        self.most = max(self.most, len(self.waves) - len(self.deleted))
+        return wid
+
+    def wave_send_using_mode(self, wid, mode):
+        assert mode == 'sync'
+        self.sent.append(wid)
+
+    def wave_tx_at(self):
+        self.polls += 1
+        playing = [w for w in self.sent if w not in self.deleted]
+        return playing[0] if self.polls % 3 else 9999
+
+    def wave_tx_busy(self):
+        return False
+
+    def wave_delete(self, wid):
+        self.deleted.append(wid)
+
+
+def test_pigpio_send_wave_chunks(monkeypatch):
+    pigpio = types.SimpleNamespace(pi=FakePi, pulse=lambda on, off, delay: (on, off, delay),
+                                   WAVE_MODE_ONE_SHOT_SYNC='sync', OUTPUT=1)
+    monkeypatch.setitem(sys.modules, 'pigpio', pigpio)
+    backend = PigpioBackend()
+    edges = [(23, i % 2, 3 + i % 5) for i in range(10500)]
+    backend.send_wave(edges, max_pulses=4000)
+    pi = backend.pi
+    assert [len(pi.waves[w]) for w in pi.sent] == [4000, 4000, 2500]
+    assert sum((pi.waves[w] for w in pi.sent), []) == [(1 << 23 if v else 0, 0 if v else 1 << 23, d)
+                                                        for p, v, d in edges]
+    assert pi.most <= 2 and sorted(pi.deleted) == pi.sent
+
+
+def test_run_schedule_grid():
+    gen = WaveGen(backend='fake', calibration=None) # perf_counter_ns timestamps
+    steps = gen.compile_sweep(FREQS[:20]).tolist()
+    t_start = Time.perf_counter_ns() + 2000000
+    t_next = gen._run_schedule(steps, 1e-3, t_start=t_start)
+    assert t_next == t_start + 20*1000000
+    assert gen._run_schedule(steps, 1e-3, t_start=t_next) == t_start + 40*1000000 # a repeat stays on the grid
+    late = gen.gpio.edges(gen.gpio_pclk_pin, LOW)[-40:] - (t_start + np.arange(40)*1000000)
+    assert np.all(late >= 0) and np.median(late) < 200000
+    assert gen.lateness.size == 20 and np.all(gen.lateness <= late[20:])
+
+
+def test_sweep_timing_loads():
+    gen = WaveGen(backend='fake', calibration=None)
+    gen.gpio.clear()
+    gen.dm_sweep(DM=30., dt=2e-3)
+    t, intervals, loads = gen.sweep_timing()
+    assert np.median(intervals) == pytest.approx(2000., abs=100)
+    # the load ends where the wait for the deadline starts, well before the send
+    assert np.median(loads) < 1000 and np.all(loads > 0) and np.all(loads < intervals.max())
+    t_all, pins, level = gen.gpio.writes()
+    waits = t_all[(pins == gen.gpio_timer_pin) & (level == HIGH)]
+    first_data = t_all[pins == gen.gpio_data_pin][0]
+    assert loads[0] == (waits[waits > first_data][0] - first_data)/1e3
+
+
+def test_sweep_timing_dma():
+    gen, fake = fake_gen(dma=True)
+    gen.dm_sweep(DM=30., dt=1e-3)
+    t, intervals, loads = gen.sweep_timing()
+    assert np.all(loads == 40*9 + 3) # the whole serial load, no wait